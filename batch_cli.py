@@ -0,0 +1,193 @@
+"""
+Generación masiva de facturas sin interfaz.
+
+Uso:
+    python batch_cli.py pedidos.csv -o facturas/ -w 4
+    python batch_cli.py pedidos.jsonl --logo logo.jpeg
+    python batch_cli.py pedidos.csv --combined corrida.pdf   # todas en un solo PDF para imprimir
+"""
+import os
+import sys
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from invoice_io import load_invoices, build_invoice_filename
+
+DEFAULT_LOGO = "logo.jpeg"
+
+# Logo cargado una sola vez por proceso de trabajo (ver _init_worker)
+_worker_logo = None
+
+
+def _init_worker(logo_bytes):
+    global _worker_logo
+    _worker_logo = logo_bytes
+
+
+def _render_one(invoice_data, output_dir):
+    """Renderiza una factura en el proceso de trabajo. Nunca lanza: retorna (ruta, segundos, error)."""
+    from pdf_generator import generate_pdf_file
+
+    path = os.path.join(output_dir, build_invoice_filename(invoice_data))
+    start = time.perf_counter()
+    try:
+        generate_pdf_file(invoice_data, path, logo_bytes=_worker_logo)
+    except Exception as e:
+        return path, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return path, time.perf_counter() - start, None
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano (values no necesita estar ordenado)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def run_batch(input_path, output_dir, workers=None, logo_bytes=None):
+    """
+    Renderiza todas las facturas del archivo en un pool de procesos.
+    Retorna un dict con conteos, fallos y estadísticas de rendimiento.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4  # Limita la memoria: no encolamos todo el archivo de golpe
+
+    render_times = []
+    failures = []
+    ok = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(logo_bytes,)) as pool:
+        pending = {}
+
+        def collect(done):
+            nonlocal ok
+            for future in done:
+                ref = pending.pop(future)
+                try:
+                    path, elapsed, error = future.result()
+                except Exception as e:  # El proceso de trabajo murió
+                    path, elapsed, error = None, 0.0, f"{type(e).__name__}: {e}"
+                if error:
+                    failures.append((ref, error))
+                    print(f"❌ {ref}: {error}", file=sys.stderr)
+                else:
+                    ok += 1
+                    render_times.append(elapsed)
+
+        for ref, invoice in load_invoices(input_path):
+            if isinstance(invoice, Exception):
+                failures.append((ref, str(invoice)))
+                print(f"❌ {ref}: {invoice}", file=sys.stderr)
+                continue
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[pool.submit(_render_one, invoice, output_dir)] = f"factura {invoice['number']}"
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    wall = time.perf_counter() - start
+    return {
+        "ok": ok,
+        "failed": len(failures),
+        "failures": failures,
+        "wall_seconds": wall,
+        "invoices_per_second": ok / wall if wall > 0 else 0.0,
+        "p50_ms": percentile(render_times, 50) * 1000,
+        "p99_ms": percentile(render_times, 99) * 1000,
+    }
+
+
+def run_combined(input_path, output_path, logo_bytes=None):
+    """
+    Renderiza todas las facturas válidas del archivo en un solo PDF, en orden.
+    Las filas inválidas se informan y se saltan; el archivo se escribe a medida que
+    avanza (en `output_path`.tmp) y sólo reemplaza a `output_path` al terminar.
+    """
+    from pdf_generator import generate_combined_pdf_file
+
+    failures = []
+
+    def valid_invoices():
+        for ref, invoice in load_invoices(input_path):
+            if isinstance(invoice, Exception):
+                failures.append((ref, str(invoice)))
+                print(f"❌ {ref}: {invoice}", file=sys.stderr)
+                continue
+            yield invoice
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = output_path + ".tmp"
+    start = time.perf_counter()
+    try:
+        ok = generate_combined_pdf_file(valid_invoices(), tmp, logo_bytes=logo_bytes)
+        if not ok:
+            raise ValueError(f"{input_path} no tiene facturas válidas")
+        os.replace(tmp, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    wall = time.perf_counter() - start
+    return {
+        "ok": ok,
+        "failed": len(failures),
+        "failures": failures,
+        "wall_seconds": wall,
+        "invoices_per_second": ok / wall if wall > 0 else 0.0,
+        "pdf_bytes": os.path.getsize(output_path),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera facturas PDF en lote desde CSV o JSONL.")
+    parser.add_argument("input", help="Archivo .csv o .jsonl con las facturas")
+    parser.add_argument("-o", "--output-dir", default="facturas", help="Carpeta de salida (default: facturas)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos de render (default: núcleos del CPU)")
+    parser.add_argument("--logo", default=DEFAULT_LOGO, help=f"Logo a incluir (default: {DEFAULT_LOGO})")
+    parser.add_argument("--combined", metavar="ARCHIVO.pdf",
+                        help="Generar todas las facturas en un solo PDF (en vez de un archivo por factura)")
+    args = parser.parse_args(argv)
+
+    logo_bytes = None
+    if args.logo and os.path.exists(args.logo):
+        with open(args.logo, "rb") as f:
+            logo_bytes = f.read()
+    elif args.logo != DEFAULT_LOGO:
+        parser.error(f"No se encontró el logo {args.logo}")
+
+    if args.combined:
+        try:
+            stats = run_combined(args.input, args.combined, logo_bytes=logo_bytes)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Error: {e}", file=sys.stderr)
+            return 2
+        print(f"\n✅ {stats['ok']} facturas en {args.combined} ({stats['pdf_bytes'] / 1024:.0f} KB)"
+              f"   ❌ Fallidas: {stats['failed']}")
+        print(f"⏱️  {stats['wall_seconds']:.2f}s total | {stats['invoices_per_second']:.1f} facturas/s")
+        return 1 if stats["failed"] else 0
+
+    try:
+        stats = run_batch(args.input, args.output_dir, workers=args.workers, logo_bytes=logo_bytes)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return 2
+
+    print(f"\n✅ Generadas: {stats['ok']}   ❌ Fallidas: {stats['failed']}")
+    print(f"⏱️  {stats['wall_seconds']:.2f}s total | {stats['invoices_per_second']:.1f} facturas/s "
+          f"| p50 {stats['p50_ms']:.1f} ms | p99 {stats['p99_ms']:.1f} ms")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Compara el extractor local (client_parser) con la IA sobre el corpus de fixtures.
+
+Uso:
+    python benchmark_client_parser.py                 # sólo extractor local (offline)
+    python benchmark_client_parser.py --llm           # también consulta a Gemini (usa cuota)
+    python benchmark_client_parser.py --threshold 0.8
+"""
+import sys
+import json
+import time
+import argparse
+import unicodedata
+from batch_cli import percentile
+from client_parser import extract_client_info, normalize_phone, CONFIDENCE_THRESHOLD
+
+DEFAULT_CORPUS = "fixtures/client_texts.jsonl"
+FIELDS = ["fullName", "address", "phone", "transportProvider"]
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _canon(field, value):
+    """Forma canónica para comparar respuestas que sólo difieren en formato."""
+    value = value or ""
+    if field == "phone":
+        return normalize_phone(value).replace(" ", "")
+    decomposed = unicodedata.normalize("NFKD", value)
+    value = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return " ".join(value.replace(",", " ").replace(".", " ").split())
+
+
+def _score(results, corpus):
+    field_ok = {f: 0 for f in FIELDS}
+    exact = 0
+    for result, case in zip(results, corpus):
+        matches = [_canon(f, result.get(f)) == _canon(f, case["expected"][f]) for f in FIELDS]
+        for f, ok in zip(FIELDS, matches):
+            field_ok[f] += ok
+        exact += all(matches)
+    n = len(corpus) or 1
+    return {f: field_ok[f] / n for f in FIELDS}, exact / n
+
+
+def _print_report(title, results, corpus, latencies):
+    per_field, exact = _score(results, corpus)
+    print(f"\n== {title} ({len(corpus)} textos) ==")
+    print("Precisión por campo: " + " | ".join(f"{f} {per_field[f]:.0%}" for f in FIELDS))
+    print(f"Coincidencia exacta: {exact:.0%}")
+    print(f"Latencia: p50 {percentile(latencies, 50) * 1000:.3f} ms | p99 {percentile(latencies, 99) * 1000:.3f} ms")
+
+
+def run_local(corpus, threshold, repeat):
+    results, confidences, latencies = [], [], []
+    for case in corpus:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data, confidence = extract_client_info(case["text"])
+            latencies.append(time.perf_counter() - start)
+        results.append(data)
+        confidences.append(confidence)
+
+    _print_report("Extractor local", results, corpus, latencies)
+
+    accepted = [(r, c) for r, c, conf in zip(results, corpus, confidences) if conf >= threshold]
+    _, accepted_exact = _score([r for r, _ in accepted], [c for _, c in accepted])
+    print(f"Resueltos sin IA (confianza >= {threshold}): {len(accepted)}/{len(corpus)} "
+          f"— exactos entre ellos: {accepted_exact:.0%}")
+    for case, data, confidence in zip(corpus, results, confidences):
+        if confidence >= threshold and any(_canon(f, data[f]) != _canon(f, case["expected"][f]) for f in FIELDS):
+            print(f"  ⚠️ Aceptado con error ({confidence}): {case['text'][:60]!r}")
+
+
+def run_llm(corpus):
+    from gemini_service import parse_client_info
+
+    results, latencies, errors = [], [], 0
+    for case in corpus:
+        start = time.perf_counter()
+        data = parse_client_info(case["text"], use_cache=False, use_local=False)
+        latencies.append(time.perf_counter() - start)
+        if "error" in data:
+            errors += 1
+            data = {}
+        results.append(data)
+    _print_report("Gemini", results, corpus, latencies)
+    if errors:
+        print(f"Errores de la IA: {errors}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del extractor local de datos del cliente.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD,
+                        help=f"Umbral de confianza (default: {CONFIDENCE_THRESHOLD}, ver LOCAL_PARSER_THRESHOLD)")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones por texto para medir latencia local")
+    parser.add_argument("--llm", action="store_true", help="Comparar también contra Gemini (requiere GEMINI_API_KEY)")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    run_local(corpus, args.threshold, args.repeat)
+    if args.llm:
+        run_llm(corpus)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
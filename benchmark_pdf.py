@@ -0,0 +1,261 @@
+"""
+Benchmark de pdf_generator: tiempo, memoria pico y tamaño del PDF.
+
+Recorre escenarios sintéticos (cantidad de productos, fotos, tamaño de foto y
+largo de la nota) armados con PRODUCT_CATALOG, así que corre sin red ni datos
+reales. Compara contra los umbrales guardados en fixtures/ y sale con código 1
+si algún escenario empeora más de la tolerancia.
+
+Uso:
+    python benchmark_pdf.py                       # todos los escenarios, compara con la línea base
+    python benchmark_pdf.py --only items          # escenarios cuyo nombre contiene "items"
+    python benchmark_pdf.py --update-baseline     # guarda los resultados actuales como línea base
+"""
+import io
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import datetime
+import tracemalloc
+from PIL import Image
+from constants import PRODUCT_CATALOG, DEFAULT_EXCHANGE_RATE
+from batch_cli import percentile
+import image_cache
+from pdf_generator import generate_pdf_file
+
+DEFAULT_BASELINE = "fixtures/pdf_benchmark_baseline.json"
+DEFAULT_LOGO = "logo.jpeg"
+
+# Tolerancias sobre la línea base. El tiempo depende de la máquina, por eso es más holgado.
+DEFAULT_TIME_TOLERANCE = 0.5
+DEFAULT_MEMORY_TOLERANCE = 0.2
+DEFAULT_SIZE_TOLERANCE = 0.05
+# Diferencias de tiempo menores a esto son ruido en escenarios de pocos milisegundos
+MIN_TIME_DELTA_MS = 5.0
+
+METRICS = ["ms", "peak_kb", "pdf_kb"]
+
+# (nombre, productos, fotos, lado de la foto en px, caracteres de la nota)
+SCENARIOS = [
+    ("items-1", 1, 0, 0, 0),
+    ("items-10", 10, 0, 0, 0),
+    ("items-50", 50, 0, 0, 0),
+    ("items-100", 100, 0, 0, 0),
+    ("items-250", 250, 0, 0, 0),
+    ("items-500", 500, 0, 0, 0),
+    ("photos-5x800", 10, 5, 800, 0),
+    ("photos-20x800", 20, 20, 800, 0),
+    ("photos-5x3000", 10, 5, 3000, 0),
+    ("photos-20x3000", 20, 20, 3000, 0),
+    ("note-500", 5, 0, 0, 500),
+    ("note-2000", 5, 0, 0, 2000),
+    ("mixed-100-10x1600-800", 100, 10, 1600, 800),
+]
+
+_NOTE_WORDS = (
+    "entrega pago contra envío revisar producto antes de firmar garantía de treinta días "
+    "por defectos de fábrica no cubre golpes ni humedad favor conservar la caja original"
+).split()
+
+
+# ==========================================
+# GENERADORES SINTÉTICOS
+# ==========================================
+
+def make_photo(side, seed=0):
+    """JPEG cuadrado de `side` px con ruido (no comprime trivialmente, como una foto real)."""
+    rng = random.Random(seed)
+    small = Image.new("RGB", (32, 32))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(32 * 32)])
+    image = small.resize((side, side), Image.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def make_note(length, seed=0):
+    rng = random.Random(seed)
+    words = []
+    while sum(len(w) + 1 for w in words) < length:
+        words.append(rng.choice(_NOTE_WORDS))
+    return " ".join(words)[:length]
+
+
+def make_invoice(items, photos=0, photo_side=800, note_chars=0, seed=0):
+    """`invoice_data` sintético con `items` productos del catálogo; las primeras `photos` llevan foto."""
+    rng = random.Random(seed)
+    invoice_items = []
+    for i in range(items):
+        product = PRODUCT_CATALOG[rng.randrange(len(PRODUCT_CATALOG))]
+        price_c = round(rng.uniform(150, 25000), 2)
+        invoice_items.append({
+            "product": dict(product),
+            "quantity": rng.randint(1, 5),
+            "priceCordobas": price_c,
+            "priceDollars": price_c / DEFAULT_EXCHANGE_RATE,
+            "custom_image_data": make_photo(photo_side, seed=seed * 1000 + i) if i < photos else None,
+        })
+    return {
+        "number": f"B{seed:06d}",
+        "date": datetime.date(2024, 1, 15),
+        "client": {
+            "fullName": "Cliente de Prueba",
+            "address": "Reparto San Juan, Managua",
+            "phone": "+505 8888 0000",
+            "transportProvider": "Cargotrans",
+        },
+        "items": invoice_items,
+        "shippingCost": 150.0,
+        "discount": 0.0,
+        "note": make_note(note_chars, seed) if note_chars else "",
+    }
+
+
+# ==========================================
+# MEDICIÓN
+# ==========================================
+
+def _render(invoice_data, logo_bytes):
+    buffer = io.BytesIO()
+    generate_pdf_file(invoice_data, buffer, logo_bytes=logo_bytes)
+    return buffer.getvalue()
+
+
+def measure(invoice_data, logo_bytes=None, repeat=3):
+    """
+    Mide un escenario con la caché de imágenes vacía en cada corrida (peor caso:
+    fotos nuevas). El tiempo es la mediana de `repeat` corridas; la memoria pico se
+    mide aparte con tracemalloc porque lo vuelve más lento (sólo cuenta memoria de
+    Python: los búferes internos de Pillow no aparecen).
+    """
+    _render(invoice_data, logo_bytes)  # Calentamiento: fuentes, estilos y renderer del logo
+    times = []
+    for _ in range(repeat):
+        image_cache.clear_cache()
+        start = time.perf_counter()
+        pdf = _render(invoice_data, logo_bytes)
+        times.append(time.perf_counter() - start)
+
+    image_cache.clear_cache()
+    tracemalloc.start()
+    try:
+        _render(invoice_data, logo_bytes)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ms": round(percentile(times, 50) * 1000, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "pdf_kb": round(len(pdf) / 1024, 1),
+    }
+
+
+def logo_cycles(logo_bytes):
+    """
+    Objetos que deja en ciclos una factura sin fotos (sólo el logo y la tabla). Debe
+    ser 0: si una versión nueva de ReportLab vuelve a atar el ImageReader del logo a
+    sí mismo, la imagen decodificada quedaría viva hasta el recolector de ciclos.
+    """
+    invoice_data = make_invoice(1)
+    _render(invoice_data, logo_bytes)
+    gc.collect()
+    gc.disable()
+    try:
+        _render(invoice_data, logo_bytes)
+        return gc.collect()
+    finally:
+        gc.enable()
+
+
+def compare(results, baseline, tolerances):
+    """Lista de (escenario, métrica, actual, línea base) que superan la tolerancia."""
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric in METRICS:
+            if metric not in reference:
+                continue
+            if metric == "ms" and current[metric] - reference[metric] < MIN_TIME_DELTA_MS:
+                continue
+            if current[metric] > reference[metric] * (1 + tolerances[metric]):
+                regressions.append((name, metric, current[metric], reference[metric]))
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("scenarios", {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"scenarios": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de tiempo, memoria y tamaño de los PDFs.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--only", help="Correr sólo los escenarios cuyo nombre contiene este texto")
+    parser.add_argument("--repeat", type=int, default=3, help="Corridas por escenario (se reporta la mediana)")
+    parser.add_argument("--logo", default=DEFAULT_LOGO, help="Logo a usar (default: logo.jpeg, si existe)")
+    parser.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    parser.add_argument("--size-tolerance", type=float, default=DEFAULT_SIZE_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    logo_bytes = None
+    if args.logo and os.path.exists(args.logo):
+        with open(args.logo, "rb") as f:
+            logo_bytes = f.read()
+
+    if logo_bytes:
+        cycles = logo_cycles(logo_bytes)
+        if cycles:
+            print(f"❌ Renderizar el logo deja {cycles} objetos en ciclos (¿cambió ReportLab?)")
+            return 1
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    print(f"{'escenario':<24}{'ms':>10}{'pico KB':>12}{'PDF KB':>10}")
+    for name, items, photos, side, note_chars in SCENARIOS:
+        if args.only and args.only not in name:
+            continue
+        invoice_data = make_invoice(items, photos, side, note_chars)
+        results[name] = measure(invoice_data, logo_bytes, repeat=args.repeat)
+        r = results[name]
+        print(f"{name:<24}{r['ms']:>10.1f}{r['peak_kb']:>12.1f}{r['pdf_kb']:>10.1f}")
+
+    if args.update_baseline:
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f"\n✅ Línea base actualizada en {args.baseline}")
+        return 0
+
+    if not baseline:
+        print(f"\n⚠️ No hay línea base en {args.baseline} (use --update-baseline)")
+        return 0
+
+    tolerances = {"ms": args.time_tolerance, "peak_kb": args.memory_tolerance, "pdf_kb": args.size_tolerance}
+    regressions = compare(results, baseline, tolerances)
+    if regressions:
+        print("\n❌ Regresiones respecto a la línea base:")
+        for name, metric, current, reference in regressions:
+            print(f"  {name}: {metric} {current} > {reference} (+{tolerances[metric]:.0%})")
+        return 1
+    print("\n✅ Sin regresiones respecto a la línea base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Almacén de imágenes en disco direccionado por contenido.
+
+Cada foto subida se escribe una sola vez en BLOB_STORE_DIR con su SHA-256 como
+nombre; las sesiones de Streamlit y los items de la factura guardan sólo ese hash
+("custom_image_ref"). La lectura es por mmap: el sistema operativo comparte las
+páginas entre sesiones y procesos en vez de tener una copia por sesión. Cada get()
+entrega su propio mapeo, que se cierra cuando quien lo pidió lo suelta.
+
+Limpieza de blobs sin referencias (los de facturas registradas se conservan):
+    python blob_store.py gc                  # borra los no usados hace más de 24 h
+    python blob_store.py gc --dry-run
+"""
+import os
+import re
+import sys
+import mmap
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from lru import LRUCache
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")
+
+# Un blob sin referencias en el registro se conserva este tiempo desde su último uso:
+# cubre las fotos de facturas que todavía se están armando en alguna sesión.
+BLOB_GC_GRACE_SECONDS = 24 * 3600
+
+# Cada cuánto get() vuelve a marcar como usado un blob que se sigue leyendo (la
+# miniatura de la sesión lo lee en cada recarga): basta con que sea menor que la gracia.
+BLOB_TOUCH_INTERVAL_SECONDS = 3600
+
+# Blobs de los que se recuerda el último touch (por proceso)
+TOUCHED_BLOBS_MAX = 1024
+
+_REF_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _check_ref(ref):
+    if not isinstance(ref, str) or not _REF_RE.match(ref):
+        raise ValueError(f"Referencia de imagen inválida: {ref!r}")
+    return ref
+
+
+class BlobStore:
+    def __init__(self, root=BLOB_STORE_DIR):
+        self.root = root
+        self._touched = LRUCache(max_entries=TOUCHED_BLOBS_MAX)  # ref -> time.monotonic() del último touch
+
+    def path(self, ref):
+        _check_ref(ref)
+        return os.path.join(self.root, ref[:2], ref)
+
+    def __contains__(self, ref):
+        return os.path.exists(self.path(ref))
+
+    def put(self, data):
+        """Guarda los bytes (si no estaban ya) y retorna su referencia (SHA-256 en hex)."""
+        if not data:
+            raise ValueError("No se puede guardar una imagen vacía")
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.path(ref)
+        if os.path.exists(path):
+            self.touch(ref)
+            return ref
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: otra sesión nunca mapea un archivo a medio escribir
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return ref
+
+    def get(self, ref):
+        """
+        Contenido del blob como mmap de sólo lectura (acepta el protocolo de buffer:
+        hashlib, io.BytesIO, bytes(...)). El mapeo es sólo de quien llama: nadie más
+        lo cierra mientras lo usa, y se libera al soltarlo. Lanza KeyError si no existe.
+        """
+        try:
+            with open(self.path(ref), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise KeyError(ref)
+        now = time.monotonic()
+        last = self._touched.get(ref)
+        if last is None or now - last >= BLOB_TOUCH_INTERVAL_SECONDS:
+            # Una foto que sigue en uso en una sesión (todavía sin factura registrada)
+            # no debe caer en gc por el tiempo desde que se subió
+            self._touched.put(ref, now)
+            self.touch(ref)
+        return mapped
+
+    def touch(self, ref):
+        """Marca el blob como usado ahora (lo protege de gc durante el período de gracia)."""
+        try:
+            os.utime(self.path(ref))
+        except OSError:
+            pass
+
+    def iter_refs(self):
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if _REF_RE.match(name):
+                    yield name
+
+    def gc(self, keep=(), grace_seconds=BLOB_GC_GRACE_SECONDS, dry_run=False):
+        """
+        Borra los blobs que no están en `keep` y no se usaron en los últimos
+        `grace_seconds` (put y get los marcan como usados). Retorna (cantidad
+        borrada, bytes liberados).
+        """
+        keep = set(keep)
+        limit = time.time() - grace_seconds
+        removed = freed = 0
+        for ref in list(self.iter_refs()):
+            if ref in keep:
+                continue
+            path = self.path(ref)
+            try:
+                st = os.stat(path)
+                if st.st_mtime > limit:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+            except OSError:
+                continue  # Borrado por otro proceso, o todavía mapeado (Windows)
+            removed += 1
+            freed += st.st_size
+        return removed, freed
+
+
+def item_image(item):
+    """
+    Foto de un item de factura: (datos, clave) con los bytes en "custom_image_data"
+    o el blob de "custom_image_ref" (clave = su hash, para no volver a calcularlo).
+    Retorna (None, None) si el item no tiene foto.
+    """
+    if item.get("custom_image_data"):
+        return item["custom_image_data"], None
+    ref = item.get("custom_image_ref")
+    if ref:
+        return get_blob_store().get(ref), ref
+    return None, None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    """Almacén compartido por el proceso (BLOB_STORE_DIR, por defecto ./blobs)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del almacén de imágenes.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc_parser = sub.add_parser("gc", help="Borrar imágenes sin referencias")
+    gc_parser.add_argument("--grace-hours", type=float, default=BLOB_GC_GRACE_SECONDS / 3600,
+                           help="Conservar las usadas en las últimas N horas (default: 24)")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Sólo informar, sin borrar")
+    args = parser.parse_args(argv)
+
+    from ledger import get_ledger
+
+    store = get_blob_store()
+    keep = get_ledger().image_refs()
+    removed, freed = store.gc(keep, grace_seconds=args.grace_hours * 3600, dry_run=args.dry_run)
+    action = "Se borrarían" if args.dry_run else "Borrados"
+    print(f"✅ {action} {removed} blobs ({freed / 1024:.0f} KB); {len(keep)} referenciados por facturas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
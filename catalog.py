@@ -0,0 +1,195 @@
+"""
+Catálogo de productos indexado.
+
+Se carga una vez por proceso desde CATALOG_PATH (CSV con columnas id,description
+o SQLite con una tabla products(id, description)). Si no hay archivo se usa
+PRODUCT_CATALOG de constants.py. El archivo se vuelve a leer cuando cambia.
+"""
+import os
+import csv
+import time
+import bisect
+import difflib
+import sqlite3
+import threading
+import unicodedata
+from constants import PRODUCT_CATALOG
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", "catalog.csv")
+CATALOG_TABLE = os.getenv("CATALOG_TABLE", "products")
+
+# Cada cuántos segundos, como máximo, se revisa si el archivo cambió
+RELOAD_CHECK_INTERVAL = 2.0
+DEFAULT_SEARCH_LIMIT = 50
+
+_SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def normalize(text):
+    """Minúsculas, sin tildes y con espacios simples: forma usada por los índices."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return " ".join(folded.replace(",", " ").split())
+
+
+class Catalog:
+    """Índices por id y por descripción normalizada, con búsqueda por prefijo y difusa."""
+
+    def __init__(self, products):
+        self.products = []
+        self._by_id = {}
+        token_postings = {}
+        for product in products:
+            product_id = str(product["id"]).strip()
+            if not product_id or product_id in self._by_id:
+                continue  # ids vacíos o duplicados: gana la primera aparición
+            product = {"id": product_id, "description": str(product["description"]).strip()}
+            index = len(self.products)
+            self.products.append(product)
+            self._by_id[product_id] = index
+            for token in set(normalize(product["description"]).split()):
+                token_postings.setdefault(token, []).append(index)
+
+        self._norm = [normalize(p["description"]) for p in self.products]
+        # Tokens ordenados para buscar por prefijo con bisect
+        self._tokens = sorted(token_postings)
+        self._postings = [token_postings[t] for t in self._tokens]
+        # Para la búsqueda aproximada sólo se comparan palabras con la misma inicial
+        self._tokens_by_initial = {}
+        for token in self._tokens:
+            self._tokens_by_initial.setdefault(token[0], []).append(token)
+        self._ids = sorted(self._by_id)
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id):
+        index = self._by_id.get(str(product_id).strip())
+        return None if index is None else self.products[index]
+
+    def _token_prefix_matches(self, prefix):
+        start = bisect.bisect_left(self._tokens, prefix)
+        matches = set()
+        for pos in range(start, len(self._tokens)):
+            if not self._tokens[pos].startswith(prefix):
+                break
+            matches.update(self._postings[pos])
+        return matches
+
+    def _fuzzy_token_matches(self, token):
+        matches = set()
+        if len(token) < 4 or token.isdigit():
+            return matches  # Palabras cortas y códigos no se corrigen
+        for close in difflib.get_close_matches(token, self._tokens_by_initial.get(token[0], ()), n=5, cutoff=0.75):
+            matches.update(self._postings[bisect.bisect_left(self._tokens, close)])
+        return matches
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Busca por id (exacto o prefijo) y por palabras de la descripción.
+        Cada palabra de la consulta debe coincidir como prefijo de alguna palabra
+        de la descripción; si no alcanza el límite, se completan resultados con
+        coincidencias aproximadas (errores de tipeo). Sin consulta retorna los primeros.
+        """
+        q = normalize(query)
+        if not q:
+            return self.products[:limit]
+
+        results = []
+        seen = set()
+
+        def add(indices):
+            for index in sorted(indices, key=lambda i: (not self._norm[i].startswith(q), i)):
+                if index not in seen and len(results) < limit:
+                    seen.add(index)
+                    results.append(self.products[index])
+
+        # 1. Ids (los códigos son cortos; prefijo por bisect sobre los ids ordenados)
+        start = bisect.bisect_left(self._ids, q)
+        id_hits = []
+        for pos in range(start, len(self._ids)):
+            if not self._ids[pos].startswith(q):
+                break
+            id_hits.append(self._by_id[self._ids[pos]])
+        add(id_hits)
+
+        # 2. Todas las palabras como prefijos
+        tokens = q.split()
+        candidates = None
+        for token in tokens:
+            hits = self._token_prefix_matches(token)
+            candidates = hits if candidates is None else candidates & hits
+            if not candidates:
+                break
+        add(candidates or ())
+
+        # 3. Aproximada: tolera errores de tipeo en cada palabra
+        if len(results) < limit:
+            candidates = None
+            for token in tokens:
+                hits = self._token_prefix_matches(token) | self._fuzzy_token_matches(token)
+                candidates = hits if candidates is None else candidates & hits
+                if not candidates:
+                    break
+            add(candidates or ())
+        return results
+
+
+def _load_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return [row for row in csv.DictReader(f) if row.get("id") and row.get("description")]
+
+
+def _load_sqlite(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(f'SELECT id, description FROM "{CATALOG_TABLE}"').fetchall()
+    finally:
+        conn.close()
+    return [{"id": r[0], "description": r[1]} for r in rows]
+
+
+def load_catalog(path=None):
+    """Construye un Catalog desde `path` (CSV o SQLite) o desde PRODUCT_CATALOG si no existe."""
+    if path and os.path.exists(path):
+        if path.lower().endswith(_SQLITE_EXTENSIONS):
+            return Catalog(_load_sqlite(path))
+        return Catalog(_load_csv(path))
+    return Catalog(PRODUCT_CATALOG)
+
+
+_catalog = None
+_catalog_mtime = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def _source_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_catalog(path=None):
+    """
+    Catálogo compartido por todo el proceso. Se recarga si el archivo fuente cambió
+    (revisado como máximo cada RELOAD_CHECK_INTERVAL segundos).
+    """
+    global _catalog, _catalog_mtime, _last_check
+    path = path or CATALOG_PATH
+    now = time.monotonic()
+    with _lock:
+        if _catalog is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+            return _catalog
+        _last_check = now
+        mtime = _source_mtime(path)
+        if _catalog is None or mtime != _catalog_mtime:
+            try:
+                _catalog = load_catalog(path)
+                _catalog_mtime = mtime
+            except (OSError, csv.Error, sqlite3.Error, KeyError) as e:
+                print(f"❌ Error cargando el catálogo {path}: {e}")
+                if _catalog is None:
+                    _catalog = Catalog(PRODUCT_CATALOG)
+        return _catalog
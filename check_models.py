@@ -9,7 +9,13 @@ if not api_key:
     print("❌ Error: No se encontró la API KEY en .env")
 else:
     print(f"✅ API KEY encontrada (empieza con {api_key[:5]}...)")
-    genai.configure(api_key=api_key)
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if endpoint:
+        # Backend alternativo por REST (p. ej. fake_gemini.py)
+        print(f"🔌 Usando el endpoint {endpoint}")
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=api_key)
     
     print("\n🔍 Buscando modelos disponibles...")
     try:
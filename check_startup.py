@@ -0,0 +1,112 @@
+"""
+Verifica el tiempo de arranque de la app: cuánto cuesta importar los módulos
+propios que main.py importa al inicio, y que los backends pesados (SDK de Gemini,
+reportlab, dotenv) no se carguen hasta su primer uso.
+
+Streamlit ya está cargado cuando el servidor ejecuta main.py, así que se importa
+primero y su costo no cuenta para el presupuesto. Sale con código 1 si se supera.
+
+Uso:
+    python check_startup.py                 # presupuesto por defecto
+    python check_startup.py --budget-ms 80 --runs 5
+"""
+import os
+import ast
+import sys
+import argparse
+import subprocess
+
+APP_FILE = "main.py"
+DEFAULT_BUDGET_MS = 60
+DEFAULT_RUNS = 3
+
+# Módulos que no deben importarse al arrancar (se cargan en el primer uso)
+LAZY_MODULES = ["google.generativeai", "grpc", "reportlab", "dotenv", "pdf_generator"]
+
+
+def top_level_imports(path):
+    """Módulos importados en el nivel superior del script (no dentro de funciones o ramas)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def local_modules(modules, base_dir):
+    """Los módulos propios del repositorio (archivos .py junto a main.py)."""
+    return [m for m in modules if os.path.exists(os.path.join(base_dir, m.split(".")[0] + ".py"))]
+
+
+def measure_imports(modules, preload, base_dir):
+    """
+    Importa `preload` y luego `modules` en un intérprete nuevo con -X importtime.
+    Retorna ({módulo de primer nivel: µs acumulados}, {todos los módulos importados}).
+    """
+    code = "; ".join(f"import {m}" for m in preload + modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=base_dir, capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falló la importación:\n{proc.stderr[-2000:]}")
+
+    top_level, loaded = {}, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # Línea de encabezado
+        loaded.add(name.strip())
+        if not name.startswith("  "):  # Sin sangría extra: importado directamente por el comando
+            top_level[name.strip()] = int(cumulative)
+    return top_level, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Presupuesto de tiempo de arranque de main.py.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"Máximo para los módulos propios (default: {DEFAULT_BUDGET_MS} ms)")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Se toma la mejor de N corridas (ruido)")
+    args = parser.parse_args(argv)
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    imports = top_level_imports(os.path.join(base_dir, APP_FILE))
+    app_modules = local_modules(imports, base_dir)
+    preload = [m for m in imports if m not in app_modules]
+
+    best = None
+    for _ in range(max(1, args.runs)):
+        top_level, loaded = measure_imports(app_modules, preload, base_dir)
+        app_us = {m: top_level.get(m, 0) for m in app_modules}
+        if best is None or sum(app_us.values()) < sum(best[0].values()):
+            best = (app_us, top_level, loaded)
+    app_us, top_level, loaded = best
+
+    print(f"Precargado (no cuenta): {', '.join(preload)} — "
+          f"{sum(top_level.get(m, 0) for m in preload) / 1000:.0f} ms")
+    for module, us in sorted(app_us.items(), key=lambda kv: -kv[1]):
+        print(f"  {module:<20}{us / 1000:>8.1f} ms")
+    total_ms = sum(app_us.values()) / 1000
+    print(f"Total módulos propios: {total_ms:.1f} ms (presupuesto {args.budget_ms:.0f} ms)")
+
+    failed = False
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    if eager:
+        print(f"❌ Se importan al arrancar (deberían cargarse en el primer uso): {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"❌ El arranque supera el presupuesto por {total_ms - args.budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print("✅ Arranque dentro del presupuesto")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Extractor local (sin IA) de los datos del cliente.
+
+Cubre el caso típico de WhatsApp: una línea con el nombre, un teléfono de
+Nicaragua (+505), la dirección y uno de los proveedores de transporte conocidos.
+Devuelve los mismos campos que el contrato JSON de gemini_service más un
+puntaje de confianza; si el puntaje es bajo, el llamador recurre al modelo.
+"""
+import os
+import re
+import unicodedata
+from constants import TRANSPORT_PROVIDERS
+from extraction_cache import normalize_text
+
+# Confianza mínima para usar el resultado local sin consultar a la IA
+CONFIDENCE_THRESHOLD = float(os.getenv("LOCAL_PARSER_THRESHOLD", "0.85"))
+
+# Pesos de cada campo en el puntaje de confianza (suman 1.0)
+WEIGHT_NAME = 0.30
+WEIGHT_PHONE = 0.30
+WEIGHT_ADDRESS = 0.25
+WEIGHT_PROVIDER = 0.15
+
+# Etiquetas que suelen anteponerse a cada dato ("Nombre: ...", "Cel: ...")
+_LABELS = {
+    "fullName": ("nombre completo", "nombre", "cliente", "name"),
+    "phone": ("telefono", "tel", "celular", "cel", "whatsapp", "numero", "phone"),
+    "address": ("direccion de entrega", "direccion", "dir", "domicilio", "address"),
+    "transportProvider": ("transporte", "proveedor de transporte", "proveedor", "envio por", "envio",
+                          "agencia", "delivery", "courier"),
+}
+
+# Palabras que delatan una dirección nicaragüense
+_ADDRESS_HINTS = (
+    "barrio", "bo.", "b°", "reparto", "rpto", "residencial", "res.", "colonia", "col.", "villa",
+    "km", "kilometro", "carretera", "calle", "avenida", "ave", "semaforo", "semaforos", "rotonda",
+    "frente", "contiguo", "costado", "cuadra", "cuadras", "c/", "vrs", "varas", "al lago", "arriba",
+    "abajo", "al sur", "al norte", "al este", "al oeste", "casa", "iglesia", "parque", "mercado",
+)
+# Ciudades: indican dirección, pero también son apellidos comunes (Rivas, León, Granada)
+_CITY_HINTS = (
+    "managua", "masaya", "granada", "leon", "chinandega", "esteli", "matagalpa", "jinotega",
+    "carazo", "jinotepe", "rivas", "boaco", "chontales", "juigalpa", "bluefields", "tipitapa",
+    "ciudad sandino", "nicaragua",
+)
+
+# Teléfonos de Nicaragua: 8 dígitos empezando en 2 (fijo) o 5/7/8 (celular), con o sin +505
+_PHONE_RE = re.compile(r"(?<!\d)(?:\(?\+?\s*505\)?[\s.-]*)?([2578]\d{3})[\s.-]*(\d{4})(?!\d)")
+_NAME_RE = re.compile(r"^[^\W\d_]+(?:[\s'.-]+[^\W\d_]+){1,5}$")
+
+
+def _hint_re(hints):
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(h) for h in hints) + r")(?!\w)")
+
+_ADDRESS_RE = _hint_re(_ADDRESS_HINTS)
+_CITY_RE = _hint_re(_CITY_HINTS)
+
+
+def _fold(text):
+    """Minúsculas y sin tildes, para comparar sin importar cómo se escribió."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def default_providers():
+    """Lista de proveedores: variable de entorno TRANSPORT_PROVIDERS o la de constants.py."""
+    env = os.getenv("TRANSPORT_PROVIDERS")
+    if env:
+        return [p.strip() for p in env.split(",") if p.strip()]
+    return list(TRANSPORT_PROVIDERS)
+
+
+def normalize_phone(text):
+    """
+    Normaliza un teléfono de Nicaragua al formato "+505 8888 1111".
+    Si no se reconoce, retorna el texto original sin espacios sobrantes.
+    """
+    if not text:
+        return ""
+    match = _PHONE_RE.search(text)
+    if not match:
+        return " ".join(text.split())
+    return f"+505 {match.group(1)} {match.group(2)}"
+
+
+def _split_label(line):
+    """Separa "Etiqueta: valor". Retorna (campo, valor) o (None, línea)."""
+    head, sep, tail = line.partition(":")
+    if not sep:
+        return None, line
+    folded = _fold(head).strip(" -*•")
+    for field, labels in _LABELS.items():
+        if folded in labels:
+            return field, tail.strip()
+    return None, line
+
+
+def _match_provider(text, providers):
+    folded = _fold(text)
+    for provider in providers:
+        if _fold(provider) in folded:
+            return provider
+    return None
+
+
+def _looks_like_address(text):
+    folded = _fold(text)
+    return bool(_ADDRESS_RE.search(folded) or _CITY_RE.search(folded))
+
+
+def _looks_like_name(text):
+    return bool(_NAME_RE.match(text)) and not _ADDRESS_RE.search(_fold(text))
+
+
+def extract_client_info(raw_text, providers=None):
+    """
+    Extrae fullName, address, phone y transportProvider con reglas locales.
+    Retorna (datos, confianza) con confianza entre 0 y 1.
+    """
+    providers = providers if providers is not None else default_providers()
+    data = {"fullName": "", "address": "", "phone": "", "transportProvider": ""}
+    scores = {"fullName": 0.0, "address": 0.0, "phone": 0.0, "transportProvider": 0.0}
+    leftovers = []
+
+    for line in normalize_text(raw_text).split("\n"):
+        if not line:
+            continue
+        field, value = _split_label(line)
+
+        # Teléfono: puede venir solo o mezclado con otra información en la línea
+        phone_match = _PHONE_RE.search(value)
+        if phone_match and not data["phone"]:
+            data["phone"] = normalize_phone(phone_match.group(0))
+            scores["phone"] = 1.0
+            value = (value[:phone_match.start()] + " " + value[phone_match.end():]).strip(" ,;-/")
+            if field == "phone" or not value:
+                continue
+
+        provider = _match_provider(value, providers)
+        if field == "transportProvider" or (provider and len(value) <= len(provider) + 12):
+            if value and not data["transportProvider"]:
+                data["transportProvider"] = provider or value
+                scores["transportProvider"] = 1.0 if provider else 0.6
+            continue
+
+        if field == "fullName" and not data["fullName"]:
+            data["fullName"] = value
+            scores["fullName"] = 1.0
+        elif field == "address" and not data["address"]:
+            data["address"] = value
+            scores["address"] = 1.0
+        elif value:
+            leftovers.append(value)
+
+    # Líneas sin etiqueta: la primera con forma de nombre es el nombre; el resto, dirección
+    if not data["fullName"]:
+        for i, value in enumerate(leftovers):
+            if _looks_like_name(value):
+                data["fullName"] = value
+                # Más confianza si está al principio del mensaje, como es habitual
+                scores["fullName"] = 1.0 if i == 0 else 0.7
+                del leftovers[i]
+                break
+
+    if leftovers:
+        address_lines = [v for v in leftovers if _looks_like_address(v)]
+        if not data["address"]:
+            data["address"] = ", ".join(leftovers)
+            scores["address"] = 1.0 if len(address_lines) == len(leftovers) else (0.6 if address_lines else 0.3)
+        else:
+            # Texto que no supimos ubicar: bajamos la confianza
+            scores["address"] *= 0.7
+
+    confidence = (
+        WEIGHT_NAME * scores["fullName"]
+        + WEIGHT_PHONE * scores["phone"]
+        + WEIGHT_ADDRESS * scores["address"]
+        + WEIGHT_PROVIDER * scores["transportProvider"]
+    )
+    return data, round(confidence, 3)
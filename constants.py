@@ -2,6 +2,9 @@
 
 DEFAULT_EXCHANGE_RATE = 36.6243
 
+# Primer número de la serie de facturas (el registro en ledger.py continúa desde aquí)
+INVOICE_NUMBER_SEED = "A001197"
+
 PANDA_STORE_INFO = {
     "name": "PandaStore",
     "address": ["Reparto San Juan,", "Managua,", "Nicaragua - 11027"],
@@ -9,6 +12,19 @@ PANDA_STORE_INFO = {
     "phone": "+505 8372 5528"
 }
 
+# Proveedores de transporte reconocidos por el extractor local (client_parser.py).
+# Se puede reemplazar con la variable de entorno TRANSPORT_PROVIDERS="Uno,Dos,Tres".
+TRANSPORT_PROVIDERS = [
+    "Cargotrans",
+    "Correos de Nicaragua",
+    "Pronto Encomiendas",
+    "Transporte Ruta",
+    "Uber Flash",
+    "InDrive",
+    "Delivery PandaStore",
+    "Retiro en tienda",
+]
+
 # Catálogo de productos (Simplificado del tuyo)
 PRODUCT_CATALOG = [
 {"id": "1001", "description": "Xiaomi Mi Band 8"},
@@ -0,0 +1,123 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from lru import LRUCache
+
+
+def normalize_text(raw_text):
+    """
+    Normaliza el texto pegado para que variantes triviales compartan entrada de caché:
+    Unicode NFC, saltos de línea uniformes, espacios repetidos colapsados y líneas vacías fuera.
+    """
+    text = unicodedata.normalize("NFC", raw_text or "")
+    lines = (" ".join(line.split()) for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+class _SQLiteBackend:
+    """Segundo nivel en disco para que los aciertos sobrevivan a reinicios del proceso."""
+
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            # Limpieza de entradas vencidas al abrir
+            self._conn.execute("DELETE FROM extraction_cache WHERE created_at < ?", (time.time() - ttl,))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM extraction_cache WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+
+
+class ExtractionCache:
+    """
+    Caché de respuestas de extracción de datos del cliente.
+
+    Nivel 1: LRU en memoria con TTL. Nivel 2 (opcional): SQLite en `db_path`.
+    Las claves se calculan sobre el texto normalizado más una `namespace`
+    (modelo + versión del prompt) para no mezclar respuestas de prompts distintos.
+    Los valores se entregan como copias porque main.py modifica el dict devuelto.
+    """
+
+    def __init__(self, namespace, max_entries=512, ttl=24 * 3600, db_path=None):
+        self.namespace = namespace
+        self._memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._disk = None
+        if db_path:
+            try:
+                self._disk = _SQLiteBackend(db_path, ttl)
+            except sqlite3.Error as e:
+                print(f"⚠️ Caché en disco deshabilitada ({db_path}): {e}")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def key_for(self, raw_text):
+        payload = f"{self.namespace}\n{normalize_text(raw_text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, raw_text):
+        key = self.key_for(raw_text)
+        value = self._memory.get(key)
+        if value is not None:
+            with self._stats_lock:
+                self.hits += 1
+            return dict(value)
+        if self._disk is not None:
+            try:
+                value = self._disk.get(key)
+            except sqlite3.Error as e:
+                print(f"⚠️ Error leyendo caché en disco: {e}")
+                value = None
+            if value is not None:
+                self._memory.put(key, value)
+                with self._stats_lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return dict(value)
+        with self._stats_lock:
+            self.misses += 1
+        return None
+
+    def put(self, raw_text, value):
+        key = self.key_for(raw_text)
+        value = dict(value)
+        self._memory.put(key, value)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, value)
+            except sqlite3.Error as e:
+                print(f"⚠️ Error escribiendo caché en disco: {e}")
+
+    def clear(self):
+        self._memory.clear()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "disk": self._disk is not None,
+            }
@@ -0,0 +1,279 @@
+"""
+Servidor local que imita la API REST de Gemini (generateContent), para pruebas de
+carga de la extracción de clientes sin gastar cuota.
+
+Respuestas:
+    - Grabadas: un JSONL con {"text": ..., "response": {...}} (o "expected", como
+      fixtures/client_texts.jsonl); se busca por texto normalizado.
+    - Plantilla: si el texto no está grabado, la respuesta se arma con el extractor
+      local (client_parser) en el formato JSON que pide el prompt.
+Los prompts en lote de gemini_batch reciben un arreglo JSON con "index".
+
+Latencia (--latency, en ms):
+    200                 constante
+    uniform:100,400     uniforme entre 100 y 400
+    normal:300,50       normal (media, desvío), nunca negativa
+    lognormal:800,0.5   log-normal (mediana, sigma): cola larga como la API real
+Errores (--errors): probabilidad por código HTTP, o "malformed" para un 200 con
+texto que no es JSON. Ej: --errors 429=0.05,500=0.01,malformed=0.02
+
+Uso:
+    python fake_gemini.py --port 8765 --latency lognormal:800,0.5 --errors 429=0.02
+    GEMINI_API_ENDPOINT=http://localhost:8765 GEMINI_API_KEY=fake streamlit run main.py
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from extraction_cache import normalize_text
+from client_parser import extract_client_info
+import metrics
+
+DEFAULT_PORT = int(os.getenv("FAKE_GEMINI_PORT", "8765"))
+DEFAULT_RECORDINGS = "fixtures/client_texts.jsonl"
+MODELS = ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-2.0-flash"]
+FIELDS = ["fullName", "address", "phone", "transportProvider"]
+
+_SINGLE_RE = re.compile(r'Text to parse: "(.*)"\s*$', re.S)
+_BATCH_ITEM_RE = re.compile(r'^\s*(\d+): "(.*?)"(?=\n\s*\d+: "|\s*$)', re.S | re.M)
+
+_STATUS_NAMES = {400: "INVALID_ARGUMENT", 403: "PERMISSION_DENIED", 429: "RESOURCE_EXHAUSTED",
+                 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+
+def parse_latency(spec):
+    """Convierte la especificación de latencia en una función rng -> segundos."""
+    kind, _, args = str(spec).partition(":")
+    try:
+        if not args:
+            value = float(kind) / 1000
+            return lambda rng: value
+        params = [float(p) for p in args.split(",")]
+        if kind == "uniform":
+            low, high = params
+            return lambda rng: rng.uniform(low, high) / 1000
+        if kind == "normal":
+            mean, std = params
+            return lambda rng: max(0.0, rng.gauss(mean, std)) / 1000
+        if kind == "lognormal":
+            median, sigma = params
+            mu = math.log(median / 1000)
+            return lambda rng: rng.lognormvariate(mu, sigma)
+    except ValueError:
+        pass
+    raise ValueError(f"Latencia inválida: {spec!r} (ej: 200, uniform:100,400, lognormal:800,0.5)")
+
+
+def parse_errors(spec):
+    """'429=0.05,malformed=0.01' -> [(429, 0.05), ('malformed', 0.01)]."""
+    errors = []
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, rate = part.partition("=")
+        try:
+            kind = name if name == "malformed" else int(name)
+            errors.append((kind, float(rate)))
+        except ValueError:
+            raise ValueError(f"Error inválido: {part!r} (ej: 429=0.05, malformed=0.01)")
+    if sum(rate for _, rate in errors) > 1:
+        raise ValueError("La suma de las tasas de error supera 1")
+    return errors
+
+
+def load_recordings(path):
+    """Respuestas grabadas por texto normalizado."""
+    recordings = {}
+    if not path:
+        return recordings
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                response = record.get("response", record.get("expected"))
+                if response is not None:
+                    recordings[normalize_text(record["text"])] = response
+    return recordings
+
+
+class FakeBackend:
+    def __init__(self, latency="0", errors="", recordings=None, markdown=False, seed=None):
+        self.latency = parse_latency(latency)
+        self.errors = parse_errors(errors)
+        self.recordings = recordings or {}
+        self.markdown = markdown
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _draw(self):
+        """(segundos de latencia, error o None) para una solicitud."""
+        with self._rng_lock:
+            delay = self.latency(self._rng)
+            roll = self._rng.random()
+        for kind, rate in self.errors:
+            if roll < rate:
+                return delay, kind
+            roll -= rate
+        return delay, None
+
+    def _answer(self, text):
+        text = normalize_text(text)
+        recorded = self.recordings.get(text)
+        if recorded is not None:
+            return dict(recorded)
+        result, _ = extract_client_info(text)
+        return {field: result.get(field, "") for field in FIELDS}
+
+    def respond_text(self, prompt):
+        """Texto que devolvería el modelo para el prompt."""
+        batch = prompt.split("Texts to parse:", 1)
+        if len(batch) == 2:
+            answers = [dict(self._answer(text), index=int(i)) for i, text in _BATCH_ITEM_RE.findall(batch[1])]
+            text = json.dumps(answers, ensure_ascii=False)
+        else:
+            match = _SINGLE_RE.search(prompt)
+            text = json.dumps(self._answer(match.group(1) if match else prompt), ensure_ascii=False)
+        return f"```json\n{text}\n```" if self.markdown else text
+
+    def generate(self, model, body):
+        """(status, payload) de un generateContent; duerme la latencia simulada."""
+        delay, error = self._draw()
+        if error == 429:
+            # La API real rechaza por cuota enseguida, sin procesar la solicitud
+            return 429, _error_payload(429, "Resource has been exhausted (e.g. check quota).")
+        time.sleep(delay)
+        if isinstance(error, int):
+            return error, _error_payload(error, "Simulated failure from fake_gemini")
+
+        prompt = "".join(part.get("text", "") for content in body.get("contents", [])
+                         for part in content.get("parts", []))
+        text = "{not json" if error == "malformed" else self.respond_text(prompt)
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        return 200, {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                              "totalTokenCount": prompt_tokens + output_tokens},
+            "modelVersion": model,
+        }
+
+
+def _error_payload(status, message):
+    return {"error": {"code": status, "message": message, "status": _STATUS_NAMES.get(status, "UNKNOWN")}}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    server_version = "FakeGemini/1.0"
+    backend = None  # Asignado por make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente se cansó de esperar (timeout): no es un error del servidor
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/models"):
+            self._json(200, {"models": [
+                {"name": f"models/{name}", "displayName": name,
+                 "supportedGenerationMethods": ["generateContent", "countTokens"]} for name in MODELS
+            ]})
+        elif path == "/metrics":
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._json(404, _error_payload(404, f"Unknown path {path}"))
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        match = re.fullmatch(r"/v1(?:beta)?/models/([^/:]+):generateContent", path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if not match:
+            self._json(404, _error_payload(404, f"Unknown path {path}"))
+            return
+        try:
+            body = json.loads(raw or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self._json(400, _error_payload(400, f"Invalid JSON payload: {e}"))
+            return
+        with metrics.span("fake_gemini.generate"):
+            status, payload = self.backend.generate(match.group(1), body)
+        metrics.inc("fake_gemini.responses", status=status)
+        self._json(status, payload)
+
+
+def make_server(host, port, backend):
+    handler = type("Handler", (FakeGeminiHandler,), {"backend": backend})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(backend, host="127.0.0.1", port=0):
+    """Levanta el servidor en un hilo de fondo (port=0: puerto libre). Retorna (server, url)."""
+    server = make_server(host, port, backend)
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_backend_arguments(parser):
+    """Opciones del backend falso (compartidas con load_test_ai.py)."""
+    parser.add_argument("--latency", default="0", help="Latencia simulada en ms (ver el docstring del módulo)")
+    parser.add_argument("--errors", default="", help="Tasas de error, ej: 429=0.05,500=0.01,malformed=0.02")
+    parser.add_argument("--recordings", default=DEFAULT_RECORDINGS,
+                        help=f"JSONL con respuestas grabadas (default: {DEFAULT_RECORDINGS}; vacío = ninguna)")
+    parser.add_argument("--markdown", action="store_true", help="Envolver el JSON en ```json como hace a veces Gemini")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para latencias y errores reproducibles")
+
+
+def backend_from_args(args):
+    return FakeBackend(latency=args.latency, errors=args.errors, recordings=load_recordings(args.recordings),
+                       markdown=args.markdown, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Gemini.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_backend_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        backend = backend_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    server = make_server(args.host, args.port, backend)
+    print(f"✅ Gemini falso en http://{args.host}:{args.port} "
+          f"({len(backend.recordings)} respuestas grabadas, latencia {args.latency} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Extracción concurrente de datos del cliente para muchos mensajes a la vez.
+
+Por defecto se empaquetan DEFAULT_PACK_SIZE textos por prompt: con el límite de
+DEFAULT_REQUESTS_PER_MINUTE, 200 mensajes son 20 solicitudes (unos segundos) en
+lugar de 200 (más de 3 minutos sólo por el limitador). --pack-size 1 manda uno por
+prompt; conviene subir --rpm hasta la cuota real de la cuenta.
+
+Uso:
+    python gemini_batch.py mensajes.txt > clientes.jsonl      # mensajes separados por una línea en blanco
+    python gemini_batch.py mensajes.jsonl --pack-size 5        # JSONL con {"text": "..."}
+    python gemini_batch.py mensajes.txt --pack-size 1 --rpm 1000
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import gemini_service
+from client_parser import extract_client_info, CONFIDENCE_THRESHOLD
+from extraction_cache import normalize_text
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 60  # Conservador: por debajo de la cuota de cualquier cuenta
+DEFAULT_PACK_SIZE = 10            # Textos por prompt (ver el docstring del módulo)
+
+
+class TokenBucket:
+    """Limitador de tasa: `rate` solicitudes por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _clean(result):
+    return {k: result.get(k, "") or "" for k in ("fullName", "address", "phone", "transportProvider")}
+
+
+async def _call_model(model, prompt):
+    # El cliente síncrono es seguro entre hilos; correrlo en hilos evita atar el
+    # canal gRPC asíncrono a un event loop concreto (asyncio.run crea uno por lote).
+    # Pasa por los plazos, reintentos y el circuito de gemini_service.
+    text = await asyncio.to_thread(gemini_service.generate_text, model, prompt)
+    if not text:
+        raise ValueError("La IA no devolvió texto en la respuesta")
+    return gemini_service.parse_model_text(text)
+
+
+async def _extract_single(model, text):
+    result = await _call_model(model, gemini_service.build_prompt(text))
+    if not isinstance(result, dict):
+        raise ValueError("La IA no devolvió un objeto JSON")
+    return result
+
+
+async def _extract_pack(model, texts):
+    """Un solo prompt para varios textos; retorna {posición: resultado}."""
+    result = await _call_model(model, gemini_service.build_batch_prompt(texts))
+    if not isinstance(result, list):
+        raise ValueError("La IA no devolvió un arreglo JSON")
+    by_index = {}
+    for entry in result:
+        if isinstance(entry, dict) and isinstance(entry.get("index"), int) and 0 <= entry["index"] < len(texts):
+            by_index[entry["index"]] = _clean(entry)
+    return by_index
+
+
+async def parse_client_info_batch(texts, concurrency=DEFAULT_CONCURRENCY,
+                                  requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                                  pack_size=DEFAULT_PACK_SIZE, use_cache=True, use_local=True):
+    """
+    Versión por lotes de gemini_service.parse_client_info.
+
+    Retorna una lista alineada con `texts`: cada elemento es el dict de datos del
+    cliente o un dict con clave 'error'. Los textos se resuelven primero con el
+    extractor local y la caché; los restantes (sin duplicados) van a la IA con a lo
+    sumo `concurrency` solicitudes en vuelo y `requests_per_minute` de tasa. Con
+    `pack_size` > 1 se envían varios textos por prompt; si la respuesta de un
+    paquete no se puede interpretar, sus textos se reintentan uno por uno.
+
+    Si la IA no está disponible (circuito abierto o errores pasajeros, como en
+    parse_client_info) no se reintenta nada: cada texto recibe el resultado del
+    extractor local con la clave 'warning', o el error si no encontró nada.
+    """
+    results = [None] * len(texts)
+    pending = {}  # texto normalizado -> posiciones de entrada
+
+    for i, raw in enumerate(texts):
+        if use_local:
+            data, confidence = extract_client_info(raw)
+            if confidence >= CONFIDENCE_THRESHOLD:
+                results[i] = data
+                continue
+        if use_cache:
+            cached = gemini_service.cached_result(raw)
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.setdefault(normalize_text(raw), []).append(i)
+
+    if not pending:
+        return results
+
+    try:
+        model = gemini_service.get_configured_model()
+    except Exception as e:
+        for positions in pending.values():
+            for i in positions:
+                results[i] = {"error": str(e)}
+        return results
+
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(requests_per_minute / 60.0, capacity=concurrency)
+
+    def resolve(text, result):
+        if use_cache:
+            gemini_service.remember_result(text, result)
+        for n, i in enumerate(pending[text]):
+            results[i] = result if n == 0 else dict(result)
+
+    def fail(text, error):
+        fallback = gemini_service.fallback_result(text) if gemini_service.is_unavailable(error) else None
+        for n, i in enumerate(pending[text]):
+            if fallback is not None:
+                results[i] = fallback if n == 0 else dict(fallback)
+            else:
+                results[i] = {"error": f"Fallo en el servicio de IA: {error}"}
+
+    async def run_single(text):
+        async with semaphore:
+            await bucket.acquire()
+            try:
+                resolve(text, await _extract_single(model, text))
+            except Exception as e:
+                fail(text, e)
+
+    async def run_pack(pack):
+        async with semaphore:
+            await bucket.acquire()
+            try:
+                by_index = await _extract_pack(model, pack)
+            except ValueError as e:
+                # Respuesta que no se pudo interpretar (JSON o forma): uno por uno sí puede salir
+                print(f"⚠️ Paquete de {len(pack)} textos inválido ({e}); se reintenta uno por uno")
+                by_index = {}
+            except Exception as e:
+                # IA no disponible u otro error de la solicitud: repetirla por texto sólo
+                # multiplicaría las llamadas fallidas
+                for text in pack:
+                    fail(text, e)
+                return
+        missing = []
+        for n, text in enumerate(pack):
+            if n in by_index:
+                resolve(text, by_index[n])
+            else:
+                missing.append(text)
+        await asyncio.gather(*(run_single(text) for text in missing))
+
+    unique = list(pending)
+    if pack_size <= 1:
+        await asyncio.gather(*(run_single(text) for text in unique))
+    else:
+        packs = [unique[i:i + pack_size] for i in range(0, len(unique), pack_size)]
+        await asyncio.gather(*(run_pack(pack) for pack in packs))
+    return results
+
+
+def parse_client_info_many(texts, **kwargs):
+    """Envoltura síncrona de parse_client_info_batch (para código que no usa asyncio)."""
+    return asyncio.run(parse_client_info_batch(texts, **kwargs))
+
+
+def _read_texts(path):
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    if path.endswith((".jsonl", ".ndjson")):
+        return [json.loads(line)["text"] for line in content.splitlines() if line.strip()]
+    # Texto plano: los mensajes se separan con una línea en blanco
+    blocks, current = [], []
+    for line in content.splitlines():
+        if line.strip():
+            current.append(line)
+        elif current:
+            blocks.append("\n".join(current))
+            current = []
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extrae datos de clientes de muchos mensajes en paralelo.")
+    parser.add_argument("input", help="Archivo .txt (mensajes separados por línea en blanco) o .jsonl")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"Solicitudes por minuto a la IA (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument("--pack-size", type=int, default=DEFAULT_PACK_SIZE,
+                        help=f"Textos por prompt (default: {DEFAULT_PACK_SIZE}; 1 = uno por solicitud)")
+    args = parser.parse_args(argv)
+
+    texts = _read_texts(args.input)
+    start = time.perf_counter()
+    results = parse_client_info_many(texts, concurrency=args.concurrency,
+                                     requests_per_minute=args.rpm, pack_size=args.pack_size)
+    elapsed = time.perf_counter() - start
+
+    for text, result in zip(texts, results):
+        print(json.dumps({"text": text, "result": result}, ensure_ascii=False))
+    errors = sum(1 for r in results if "error" in r)
+    print(f"✅ {len(texts) - errors} extraídos, ❌ {errors} con error en {elapsed:.1f}s", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
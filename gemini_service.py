@@ -1,41 +1,177 @@
 import os
 import json
-import google.generativeai as genai
-from dotenv import load_dotenv
+import threading
+from extraction_cache import ExtractionCache, normalize_text
+from client_parser import extract_client_info, CONFIDENCE_THRESHOLD
+from resilience import ResilientCaller, CircuitBreaker, CircuitOpenError
+import metrics
 
-# Cargar variables de entorno del archivo .env
-load_dotenv()
+# USAMOS EL MODELO QUE APARECIÓ EN TU LISTA
+# 'gemini-2.5-flash' es rápido y está disponible en tu cuenta
+MODEL_NAME = 'gemini-2.5-flash'
 
-def parse_client_info(raw_text):
+# Cambiar cuando se modifique el prompt, para no servir respuestas del prompt anterior
+PROMPT_VERSION = 1
+
+# Nada pesado se carga al importar este módulo: el .env, la caché y el SDK de
+# Google (grpc, protobuf: ~1 s) se cargan en el primer uso.
+_env_loaded = False
+_cache = None
+_model = None
+_model_api_key = None
+_model_lock = threading.Lock()
+_caller = None
+
+# Errores HTTP de la API que vale la pena reintentar (cuota, sobrecarga, plazos)
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Aviso que acompaña al resultado del extractor local cuando la IA no está disponible
+FALLBACK_WARNING = "IA no disponible: datos extraídos sin IA, revíselos"
+
+
+def load_env():
+    """Carga las variables del archivo .env (una sola vez por proceso)."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def _get_cache():
+    """Caché de respuestas, configurable desde .env (GEMINI_CACHE_SIZE, GEMINI_CACHE_TTL, GEMINI_CACHE_DB)."""
+    global _cache
+    with _model_lock:
+        if _cache is None:
+            load_env()
+            _cache = ExtractionCache(
+                namespace=f"{MODEL_NAME}:v{PROMPT_VERSION}",
+                max_entries=int(os.getenv("GEMINI_CACHE_SIZE", "512")),
+                ttl=int(os.getenv("GEMINI_CACHE_TTL", str(24 * 3600))),
+                db_path=os.getenv("GEMINI_CACHE_DB") or None,  # Ej: gemini_cache.sqlite3
+            )
+        return _cache
+
+
+def is_transient(error):
+    """¿Es un error pasajero de la API (vale la pena reintentar)?"""
+    # Timeouts y fallas de conexión (requests y socket heredan de OSError)
+    if isinstance(error, OSError):
+        return True
+    return getattr(error, "code", None) in TRANSIENT_STATUS
+
+
+def is_unavailable(error):
+    """¿La IA no está disponible (circuito abierto o errores pasajeros sin resolver)?"""
+    return isinstance(error, CircuitOpenError) or is_transient(error)
+
+
+def _get_caller():
     """
-    Envía el texto sin procesar a Gemini para extraer nombre, dirección, etc.
-    Retorna un diccionario con los datos o un diccionario con clave 'error' si falla.
+    Reintentos, plazos, hedging y circuito de las llamadas a Gemini, configurables
+    desde .env (ver resilience.py):
+        GEMINI_DEADLINE=20          plazo total por extracción, en segundos
+        GEMINI_TIMEOUT=10           plazo de cada intento
+        GEMINI_MAX_ATTEMPTS=3       intentos ante errores pasajeros (429, 5xx, timeouts)
+        GEMINI_HEDGE=0              1 = réplica de la solicitud si supera el p95 reciente
+        GEMINI_BREAKER_FAILURES=5   fallos seguidos que abren el circuito
+        GEMINI_BREAKER_RESET=30     segundos antes de volver a probar la API
     """
-    
-    # 1. Verificación de la API Key
+    global _caller
+    with _model_lock:
+        if _caller is None:
+            load_env()
+            _caller = ResilientCaller(
+                "ai.gemini",
+                deadline=float(os.getenv("GEMINI_DEADLINE", "20")),
+                attempt_timeout=float(os.getenv("GEMINI_TIMEOUT", "10")),
+                max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+                hedge=os.getenv("GEMINI_HEDGE", "0") == "1",
+                is_transient=is_transient,
+                breaker=CircuitBreaker(
+                    "ai.gemini",
+                    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET", "30")),
+                ),
+            )
+        return _caller
+
+
+def generate_text(model, prompt):
+    """
+    Texto de la respuesta del modelo, con plazos, reintentos y circuito. Sin el
+    `retry=None` el SDK reintenta por su cuenta los 503/504 durante minutos.
+    """
+    def request(timeout):
+        response = model.generate_content(prompt, request_options={"timeout": timeout, "retry": None})
+        return response.text
+
+    return _get_caller().call(request)
+
+
+def resilience_stats():
+    """
+    Estado del circuito de Gemini, reintentos y réplicas (para monitoreo). Antes de la
+    primera llamada a la IA retorna todo en cero sin crear el caller (ni leer el .env).
+    """
+    caller = _caller
+    if caller is None:
+        return {"state": CircuitBreaker.CLOSED, "consecutive_failures": 0, "rejected": 0,
+                "calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "p95_ms": None}
+    return caller.stats()
+
+
+def _get_model(api_key):
+    """
+    Configura genai y crea el GenerativeModel una sola vez (o de nuevo si cambia la
+    API Key o el endpoint). GEMINI_API_ENDPOINT apunta a otro backend compatible por
+    REST, p. ej. fake_gemini.py (http://localhost:8765) para pruebas de carga.
+    """
+    global _model, _model_api_key
+    endpoint = os.getenv("GEMINI_API_ENDPOINT") or None
+    with _model_lock:
+        if _model is None or _model_api_key != (api_key, endpoint):
+            import google.generativeai as genai
+
+            if endpoint:
+                genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+            else:
+                genai.configure(api_key=api_key)
+            _model = genai.GenerativeModel(MODEL_NAME)
+            _model_api_key = (api_key, endpoint)
+        return _model
+
+
+def get_configured_model():
+    """Modelo listo para usar con la API Key del .env. Lanza RuntimeError si falta la clave."""
+    load_env()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        print("❌ Error Crítico: No se encontró la variable GEMINI_API_KEY en el archivo .env")
-        return {"error": "Falta la API Key en el archivo .env"}
+        raise RuntimeError("Falta la API Key en el archivo .env")
+    return _get_model(api_key)
 
-    try:
-        # 2. Configuración del cliente de Google
-        genai.configure(api_key=api_key)
-        
-        # USAMOS EL MODELO QUE APARECIÓ EN TU LISTA
-        # 'gemini-2.5-flash' es rápido y está disponible en tu cuenta
-        model_name = 'gemini-2.5-flash' 
-        
-        model = genai.GenerativeModel(model_name)
-
-        # 3. Prompt (Instrucciones precisas)
-        prompt = f"""
-        Extract the client information from the following text. 
+
+def cached_result(raw_text):
+    """Respuesta en caché para este texto (copia) o None."""
+    return _get_cache().get(raw_text)
+
+
+def remember_result(raw_text, result):
+    """Guarda una respuesta exitosa de la IA en la caché."""
+    if isinstance(result, dict) and "error" not in result:
+        _get_cache().put(raw_text, result)
+
+
+def build_prompt(raw_text):
+    # 3. Prompt (Instrucciones precisas)
+    return f"""
+        Extract the client information from the following text.
         The text typically contains a Name, Phone Number, Address, and a Transport/Delivery Provider.
-        
-        If a field is missing, leave it as an empty string. 
+
+        If a field is missing, leave it as an empty string.
         Normalize the phone number to include country code if possible.
-        
+
         Return ONLY a valid JSON object with this exact structure (no markdown code blocks):
         {{
             "fullName": "string",
@@ -47,18 +183,124 @@ def parse_client_info(raw_text):
         Text to parse: "{raw_text}"
         """
 
+
+def build_batch_prompt(texts):
+    """Prompt que empaqueta varios textos y pide un arreglo JSON con un objeto por texto."""
+    numbered = "\n".join(f'{i}: "{text}"' for i, text in enumerate(texts))
+    return f"""
+        Extract the client information from each of the following numbered texts.
+        Each text typically contains a Name, Phone Number, Address, and a Transport/Delivery Provider.
+
+        If a field is missing, leave it as an empty string.
+        Normalize the phone number to include country code if possible.
+
+        Return ONLY a valid JSON array (no markdown code blocks) with one object per text,
+        in any order, each with this exact structure:
+        {{
+            "index": number,
+            "fullName": "string",
+            "address": "string",
+            "phone": "string",
+            "transportProvider": "string"
+        }}
+
+        Texts to parse:
+        {numbered}
+        """
+
+
+def parse_model_text(text):
+    """Limpia el formato markdown que la IA pueda agregar y decodifica el JSON."""
+    clean_text = text.replace("```json", "").replace("```", "").strip()
+    return json.loads(clean_text)
+
+
+def cache_stats():
+    """
+    Contadores de la caché de respuestas (aciertos, fallos, entradas). Mientras nadie
+    la haya usado retorna ceros sin crearla: main.py la consulta en cada ejecución.
+    """
+    cache = _cache
+    if cache is None:
+        return {"hits": 0, "disk_hits": 0, "misses": 0, "entries": 0, "disk": False}
+    return cache.stats()
+
+
+def parse_client_info(raw_text, use_cache=True, use_local=True):
+    """
+    Envía el texto sin procesar a Gemini para extraer nombre, dirección, etc.
+    Retorna un diccionario con los datos o un diccionario con clave 'error' si falla.
+
+    Primero se intenta el extractor local (client_parser); sólo si su confianza es
+    baja se consulta la caché y luego la IA. Las respuestas exitosas de la IA se
+    guardan en caché por texto normalizado.
+    Los tiempos de cada etapa se registran en metrics (spans "ai.*") y el origen de
+    la respuesta en el contador "ai.result".
+
+    Si la IA no está disponible (circuito abierto, o errores pasajeros hasta agotar los
+    reintentos o el plazo) y el extractor local encontró algo, se retorna su resultado
+    con la clave 'warning' (FALLBACK_WARNING) en lugar de un error.
+    """
+    with metrics.span("ai.parse_client_info"):
+        result, source = _parse_client_info(raw_text, use_cache, use_local)
+    metrics.inc("ai.result", source=source)
+    return result
+
+
+def _parse_client_info(raw_text, use_cache, use_local):
+    if use_local:
+        with metrics.span("ai.local"):
+            local_result, confidence = extract_client_info(raw_text)
+        if confidence >= CONFIDENCE_THRESHOLD:
+            return local_result, "local"
+
+    if use_cache:
+        cached = _get_cache().get(raw_text)
+        if cached is not None:
+            return cached, "cache"
+
+    # 1. Verificación de la API Key
+    load_env()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("❌ Error Crítico: No se encontró la variable GEMINI_API_KEY en el archivo .env")
+        return {"error": "Falta la API Key en el archivo .env"}, "error"
+
+    try:
+        # 2. Configuración del cliente de Google (reutilizado entre llamadas)
+        with metrics.span("ai.configure"):
+            model = _get_model(api_key)
+
         # 4. Llamada a la API
-        response = model.generate_content(prompt)
+        # (se envía el texto normalizado: es exactamente lo que identifica la entrada de caché)
+        with metrics.span("ai.request"):
+            text = generate_text(model, build_prompt(normalize_text(raw_text)))
 
         # 5. Procesar respuesta (Limpieza de Markdown)
-        if response.text:
-            # Limpiamos cualquier formato markdown que la IA pueda agregar
-            clean_text = response.text.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_text)
+        if text:
+            with metrics.span("ai.json_parse"):
+                result = parse_model_text(text)
+            if use_cache and isinstance(result, dict):
+                _get_cache().put(raw_text, result)
+            return result, "model"
         else:
-            return {"error": "La IA no devolvió texto en la respuesta"}
+            return {"error": "La IA no devolvió texto en la respuesta"}, "error"
 
     except Exception as e:
         # 6. Captura de errores
-        print(f"❌ Error en gemini_service: {e}")
-        return {"error": f"Fallo en el servicio de IA: {str(e)}"}
\ No newline at end of file
+        if not isinstance(e, CircuitOpenError):
+            print(f"❌ Error en gemini_service: {e}")
+        if is_unavailable(e):
+            fallback = fallback_result(raw_text)
+            if fallback is not None:
+                return fallback, "fallback"
+        return {"error": f"Fallo en el servicio de IA: {str(e)}"}, "error"
+
+
+def fallback_result(raw_text):
+    """Resultado del extractor local aunque su confianza sea baja; None si no encontró nada."""
+    with metrics.span("ai.local"):
+        result, _ = extract_client_info(raw_text)
+    if not any(result.get(field) for field in ("fullName", "address", "phone")):
+        return None
+    return dict(result, warning=FALLBACK_WARNING)
@@ -0,0 +1,85 @@
+import io
+import hashlib
+from collections import namedtuple
+from PIL import Image, ImageOps
+from lru import LRUCache
+
+# Resolución a la que se re-muestrean las imágenes según su tamaño de dibujo en el PDF.
+# 200 DPI se ve nítido impreso y mantiene las fotos de producto en pocas decenas de KB.
+IMAGE_DPI = 200
+JPEG_QUALITY = 85
+
+# Límite de memoria de la caché de imágenes ya normalizadas (por proceso)
+IMAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+NormalizedImage = namedtuple("NormalizedImage", ["data", "width", "height", "format"])
+
+_cache = LRUCache(max_bytes=IMAGE_CACHE_MAX_BYTES, sizeof=lambda img: len(img.data))
+
+
+def content_hash(data):
+    """Hash de contenido usado como clave de caché."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _target_size(width, height, max_width_pt, max_height_pt, dpi):
+    """Tamaño en píxeles para que la imagen quepa en la caja de dibujo a `dpi` (sólo reduce)."""
+    max_w = max(1, int(round(max_width_pt * dpi / 72)))
+    max_h = max(1, int(round(max_height_pt * dpi / 72)))
+    scale = min(1.0, max_w / width, max_h / height)
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def _encode(data, max_width_pt, max_height_pt, dpi):
+    with Image.open(io.BytesIO(data)) as src:
+        # draft() permite al decodificador JPEG reducir mientras decodifica (mucho más rápido en fotos grandes)
+        # (se usa la caja más grande en ambos ejes porque la rotación EXIF se aplica después)
+        if src.format == "JPEG":
+            box = max(max_width_pt, max_height_pt)
+            src.draft("RGB", _target_size(src.width, src.height, box, box, dpi))
+        img = ImageOps.exif_transpose(src)  # Respeta la orientación de la cámara antes de quitar el EXIF
+        img.load()
+
+    size = _target_size(img.width, img.height, max_width_pt, max_height_pt, dpi)
+    if size != img.size:
+        img = img.resize(size, Image.LANCZOS)
+
+    out = io.BytesIO()
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha:
+        # PNG para conservar la transparencia (p. ej. logos)
+        img = img.convert("RGBA")
+        img.save(out, format="PNG", optimize=True)
+        fmt = "PNG"
+    else:
+        # Guardar sin exif/icc_profile elimina los metadatos
+        img = img.convert("RGB")
+        img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        fmt = "JPEG"
+    return NormalizedImage(out.getvalue(), img.width, img.height, fmt)
+
+
+def normalize_image(data, max_width_pt, max_height_pt, dpi=IMAGE_DPI, key=None):
+    """
+    Re-muestrea y re-comprime una imagen para la caja en la que se dibujará
+    (en puntos PDF), quitando metadatos. El resultado se guarda en una caché LRU
+    por hash de contenido, así el logo o una foto repetida se procesan una sola vez.
+
+    `key` permite pasar un hash ya calculado del contenido.
+    Lanza las excepciones de Pillow si los bytes no son una imagen válida.
+    """
+    cache_key = (key or content_hash(data), round(max_width_pt, 2), round(max_height_pt, 2), dpi)
+    cached = _cache.get(cache_key)
+    if cached is not None:
+        return cached
+    result = _encode(data, max_width_pt, max_height_pt, dpi)
+    _cache.put(cache_key, result)
+    return result
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def clear_cache():
+    _cache.clear()
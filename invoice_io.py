@@ -0,0 +1,178 @@
+import os
+import csv
+import json
+import base64
+from constants import DEFAULT_EXCHANGE_RATE
+from catalog import get_catalog
+
+# Columnas aceptadas en el CSV (una fila por línea de producto)
+CSV_COLUMNS = [
+    "number", "date", "fullName", "address", "phone", "transportProvider",
+    "product_id", "description", "quantity", "priceCordobas", "priceDollars",
+    "image", "shippingCost", "discount", "note",
+]
+
+
+def _safe_filename_part(text, default):
+    """Texto usable dentro de un nombre de archivo: sin separadores de ruta ni caracteres de control."""
+    text = str(text or "").strip().replace(" ", "_")
+    text = "".join("_" if ch in "/\\" or ord(ch) < 32 else ch for ch in text)
+    return text or default
+
+
+def build_invoice_filename(invoice_data):
+    """
+    Nombre de archivo estándar: factura_<numero>_<cliente>.pdf
+    El número y el cliente pueden venir de un JSON externo: ninguno puede sacar el
+    archivo de la carpeta de salida (sin "/" ni "\\", así ".." queda como texto).
+    """
+    client = invoice_data.get("client") or {}
+    safe_number = _safe_filename_part(invoice_data.get("number"), "SN")
+    safe_name = _safe_filename_part(client.get("fullName"), "Cliente")
+    return f"factura_{safe_number}_{safe_name}.pdf"
+
+
+def _to_float(value, field, default=0.0):
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Valor inválido para '{field}': {value!r}")
+
+
+def _resolve_product(raw_item):
+    """Obtiene el producto del item: dict 'product', 'product_id' del catálogo o 'description' libre."""
+    product = raw_item.get("product")
+    if isinstance(product, dict) and product.get("description"):
+        return {"id": str(product.get("id", "")), "description": product["description"]}
+
+    product_id = str(raw_item.get("product_id") or "").strip()
+    description = (raw_item.get("description") or "").strip()
+    if product_id:
+        p = get_catalog().get(product_id)
+        if p is not None:
+            return {"id": p["id"], "description": description or p["description"]}
+    if description:
+        return {"id": product_id, "description": description}
+    raise ValueError(f"Producto desconocido: id={product_id!r}")
+
+
+def _load_image(raw_item, base_dir):
+    """Lee la foto del item desde una ruta ('image') o desde base64 ('custom_image_b64')."""
+    if raw_item.get("custom_image_data"):
+        return raw_item["custom_image_data"]
+    if raw_item.get("custom_image_b64"):
+        try:
+            return base64.b64decode(raw_item["custom_image_b64"])
+        except (ValueError, TypeError):
+            raise ValueError("Imagen base64 inválida")
+    path = raw_item.get("image")
+    if path:
+        if not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError as e:
+            raise ValueError(f"No se pudo leer la imagen {path}: {e}")
+    return None
+
+
+def normalize_invoice(raw, base_dir="."):
+    """
+    Convierte un registro de entrada al mismo formato de `invoice_data` que arma main.py.
+    Lanza ValueError con un mensaje legible si el registro no es válido.
+    """
+    if not raw.get("number"):
+        raise ValueError("Falta el número de factura ('number')")
+
+    client = raw.get("client") or {}
+    client = {
+        "fullName": client.get("fullName", raw.get("fullName", "")) or "",
+        "address": client.get("address", raw.get("address", "")) or "",
+        "phone": client.get("phone", raw.get("phone", "")) or "",
+        "transportProvider": client.get("transportProvider", raw.get("transportProvider", "")) or "",
+    }
+
+    items = []
+    for raw_item in raw.get("items") or []:
+        quantity = int(_to_float(raw_item.get("quantity"), "quantity", 1))
+        if quantity <= 0:
+            raise ValueError(f"Cantidad inválida: {quantity}")
+        price_c = _to_float(raw_item.get("priceCordobas"), "priceCordobas")
+        price_d = raw_item.get("priceDollars")
+        items.append({
+            "product": _resolve_product(raw_item),
+            "quantity": quantity,
+            "priceCordobas": price_c,
+            "priceDollars": _to_float(price_d, "priceDollars") if price_d not in (None, "") else price_c / DEFAULT_EXCHANGE_RATE,
+            "custom_image_data": _load_image(raw_item, base_dir),
+        })
+    if not items:
+        raise ValueError("La factura no tiene productos")
+
+    return {
+        "number": str(raw["number"]).strip(),
+        "date": str(raw.get("date") or ""),
+        "client": client,
+        "items": items,
+        "shippingCost": _to_float(raw.get("shippingCost"), "shippingCost"),
+        "discount": _to_float(raw.get("discount"), "discount"),
+        "note": raw.get("note") or "",
+    }
+
+
+def _iter_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield f"línea {line_no}", json.loads(line)
+            except json.JSONDecodeError as e:
+                yield f"línea {line_no}", e
+
+
+def _iter_csv(path):
+    # Agrupamos las filas por número de factura conservando el orden de aparición
+    invoices = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            number = (row.get("number") or "").strip()
+            invoice = invoices.get(number)
+            if invoice is None:
+                invoice = {k: row.get(k, "") for k in ("number", "date", "fullName", "address", "phone",
+                                                        "transportProvider", "shippingCost", "discount", "note")}
+                invoice["items"] = []
+                invoices[number] = invoice
+            invoice["items"].append({k: row.get(k, "") for k in ("product_id", "description", "quantity",
+                                                                  "priceCordobas", "priceDollars", "image")})
+    for number, invoice in invoices.items():
+        yield f"factura {number or '(sin número)'}", invoice
+
+
+def load_invoices(path):
+    """
+    Lee facturas desde un archivo CSV o JSONL.
+    Genera tuplas (referencia, invoice_data | Exception) para que el llamador
+    pueda reportar registros inválidos sin detener la corrida.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        records = _iter_csv(path)
+    elif ext in (".jsonl", ".ndjson", ".json"):
+        records = _iter_jsonl(path)
+    else:
+        raise ValueError(f"Formato no soportado: {ext} (use .csv o .jsonl)")
+
+    for ref, raw in records:
+        if isinstance(raw, Exception):
+            yield ref, ValueError(f"JSON inválido: {raw}")
+            continue
+        try:
+            yield ref, normalize_invoice(raw, base_dir)
+        except (ValueError, TypeError, AttributeError) as e:
+            yield ref, e
@@ -0,0 +1,251 @@
+"""
+Registro persistente de facturas emitidas (SQLite en modo WAL).
+
+Asigna los números consecutivos de forma atómica entre sesiones de Streamlit,
+hilos y procesos, y guarda el `invoice_data` de cada factura emitida.
+"""
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import datetime
+import threading
+import unicodedata
+from constants import INVOICE_NUMBER_SEED
+
+LEDGER_PATH = os.getenv("LEDGER_DB", "facturas.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    series      TEXT PRIMARY KEY,
+    next_value  INTEGER NOT NULL,
+    width       INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS invoices (
+    number       TEXT PRIMARY KEY,
+    issued_date  TEXT NOT NULL,
+    client_name  TEXT NOT NULL,
+    client_key   TEXT NOT NULL,
+    total        REAL NOT NULL,
+    created_at   TEXT NOT NULL,
+    updated_at   TEXT NOT NULL,
+    data         TEXT NOT NULL,
+    owner        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (issued_date, number);
+CREATE INDEX IF NOT EXISTS idx_invoices_client ON invoices (client_key, issued_date);
+"""
+
+_NUMBER_RE = re.compile(r"^(\D*)(\d+)$")
+
+
+class InvoiceNumberTaken(ValueError):
+    """El número ya está registrado por otra factura (otra sesión, otro render o a mano)."""
+
+
+def split_number(number):
+    """'A001197' -> ('A', 1197, 6). Retorna None si el número no sigue el formato serie+dígitos."""
+    match = _NUMBER_RE.match((number or "").strip())
+    if not match:
+        return None
+    return match.group(1), int(match.group(2)), len(match.group(2))
+
+
+def client_key(name):
+    """Nombre del cliente normalizado para búsquedas (minúsculas, sin tildes)."""
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    return " ".join("".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold().split())
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _serializable(invoice_data):
+    """
+    Copia de invoice_data apta para JSON: las fotos se guardan como hash, no como bytes.
+    El hash es el mismo que usa blob_store, así las fotos registradas se pueden recuperar.
+    """
+    data = dict(invoice_data)
+    items = []
+    for item in invoice_data.get("items", []):
+        item = dict(item)
+        image = item.pop("custom_image_data", None)
+        ref = item.pop("custom_image_ref", None)
+        if image:
+            item["custom_image_sha256"] = hashlib.sha256(image).hexdigest()
+        elif ref:
+            item["custom_image_sha256"] = ref
+        items.append(item)
+    data["items"] = items
+    return data
+
+
+def invoice_total(invoice_data):
+    subtotal = sum(i["priceCordobas"] * i["quantity"] for i in invoice_data.get("items", []))
+    return subtotal + invoice_data.get("shippingCost", 0) - invoice_data.get("discount", 0)
+
+
+class Ledger:
+    def __init__(self, path=LEDGER_PATH, seed=INVOICE_NUMBER_SEED):
+        self.path = path
+        self.series, self._seed_value, self._width = split_number(seed)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        # Registros creados antes de la columna owner (CREATE TABLE IF NOT EXISTS no la agrega)
+        if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(invoices)")}:
+            conn.execute("ALTER TABLE invoices ADD COLUMN owner TEXT")
+        conn.execute(
+            "INSERT OR IGNORE INTO counters (series, next_value, width) VALUES (?, ?, ?)",
+            (self.series, self._seed_value, self._width),
+        )
+
+    def _conn(self):
+        # Una conexión por hilo: sqlite3 no comparte conexiones entre hilos de forma segura
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _format(self, value, width):
+        return f"{self.series}{value:0{width}d}"
+
+    def peek_next_number(self):
+        """Próximo número que se asignaría (sólo informativo: no lo reserva)."""
+        row = self._conn().execute(
+            "SELECT next_value, width FROM counters WHERE series = ?", (self.series,)
+        ).fetchone()
+        return self._format(row[0], row[1])
+
+    def allocate_number(self):
+        """Reserva y retorna el siguiente número consecutivo. Atómico entre procesos."""
+        conn = self._conn()
+        # BEGIN IMMEDIATE toma el candado de escritura antes de leer: dos procesos
+        # nunca pueden leer el mismo valor.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value, width = conn.execute(
+                "SELECT next_value, width FROM counters WHERE series = ?", (self.series,)
+            ).fetchone()
+            conn.execute("UPDATE counters SET next_value = ? WHERE series = ?", (value + 1, self.series))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self._format(value, width)
+
+    def record_invoice(self, invoice_data, owner=None):
+        """
+        Guarda la factura emitida. Si el número fue escrito a mano dentro de la serie,
+        el contador avanza para que no se vuelva a asignar.
+
+        `owner` identifica a quien emitió el número (p. ej. la sesión de Streamlit):
+        sólo ese mismo owner puede volver a generarla y actualizar el registro. Sin owner,
+        o si el número ya pertenece a otra factura, lanza InvoiceNumberTaken sin tocar nada.
+        """
+        number = str(invoice_data["number"]).strip()
+        client_name = (invoice_data.get("client") or {}).get("fullName", "")
+        now = _now()
+        payload = json.dumps(_serializable(invoice_data), ensure_ascii=False, default=str)
+        parts = split_number(number)
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner FROM invoices WHERE number = ?", (number,)).fetchone()
+            if row and (owner is None or row[0] != owner):
+                raise InvoiceNumberTaken(f"La factura {number} ya fue emitida")
+            conn.execute(
+                "INSERT INTO invoices"
+                " (number, issued_date, client_name, client_key, total, created_at, updated_at, data, owner)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(number) DO UPDATE SET issued_date = excluded.issued_date,"
+                " client_name = excluded.client_name, client_key = excluded.client_key,"
+                " total = excluded.total, updated_at = excluded.updated_at, data = excluded.data",
+                (number, str(invoice_data.get("date", "")), client_name, client_key(client_name),
+                 invoice_total(invoice_data), now, now, payload, owner),
+            )
+            if parts and parts[0] == self.series:
+                conn.execute(
+                    "UPDATE counters SET next_value = MAX(next_value, ?) WHERE series = ?",
+                    (parts[1] + 1, self.series),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def is_issued(self, number):
+        """¿Ya hay una factura registrada con ese número?"""
+        return self._conn().execute(
+            "SELECT 1 FROM invoices WHERE number = ?", (str(number).strip(),)
+        ).fetchone() is not None
+
+    def get_invoice(self, number):
+        """invoice_data guardado para ese número, o None."""
+        row = self._conn().execute("SELECT data FROM invoices WHERE number = ?", (number,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_invoices(self):
+        """Todas las facturas guardadas (invoice_data), en orden de número."""
+        for (data,) in self._conn().execute("SELECT data FROM invoices ORDER BY number"):
+            yield json.loads(data)
+
+    def image_refs(self):
+        """Hashes de todas las fotos usadas en facturas registradas (para blob_store.gc)."""
+        rows = self._conn().execute(
+            "SELECT DISTINCT json_extract(item.value, '$.custom_image_sha256')"
+            " FROM invoices, json_each(invoices.data, '$.items') AS item"
+            " WHERE json_extract(item.value, '$.custom_image_sha256') IS NOT NULL"
+        )
+        return {r[0] for r in rows}
+
+    def list_invoices(self, start_date=None, end_date=None, client=None, limit=50, before=None):
+        """
+        Lista resumida (número, fecha, cliente, total), de la más reciente a la más antigua.
+        `client` filtra por prefijo del nombre normalizado. Para paginar, pase en `before`
+        el par (issued_date, number) de la última fila recibida: la consulta usa el índice
+        y no se degrada con OFFSET en tablas grandes.
+        """
+        where, params = [], []
+        if client:
+            where.append("client_key >= ? AND client_key < ?")
+            key = client_key(client)
+            params += [key, key + "￿"]
+        if start_date:
+            where.append("issued_date >= ?")
+            params.append(str(start_date))
+        if end_date:
+            where.append("issued_date <= ?")
+            params.append(str(end_date))
+        if before:
+            where.append("(issued_date, number) < (?, ?)")
+            params += [str(before[0]), before[1]]
+        sql = "SELECT number, issued_date, client_name, total FROM invoices"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY issued_date DESC, number DESC LIMIT ?"
+        params.append(limit)
+        return [
+            {"number": r[0], "date": r[1], "client": r[2], "total": r[3]}
+            for r in self._conn().execute(sql, params)
+        ]
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Registro compartido por el proceso (LEDGER_DB, por defecto facturas.sqlite3)."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger()
+        return _ledger
@@ -0,0 +1,203 @@
+"""
+Prueba de carga de la extracción de clientes (gemini_service.parse_client_info)
+contra el Gemini falso (fake_gemini.py), para dimensionar el servicio sin usar cuota.
+
+Por defecto levanta el servidor falso en este mismo proceso con las opciones de
+latencia y errores dadas; con --endpoint usa uno ya levantado (mejor para muchas
+solicitudes concurrentes: no comparte el GIL con el generador de carga).
+
+Los reintentos, plazos, réplicas y el circuito de gemini_service se configuran con
+las variables GEMINI_* (ver gemini_service._get_caller) o con las opciones
+--max-attempts, --attempt-timeout, --deadline y --hedge; el resumen incluye sus
+contadores. Las respuestas del extractor local por IA no disponible se cuentan
+como "fallback".
+
+Uso:
+    python load_test_ai.py -c 16 -n 500 --latency lognormal:800,0.5 --errors 429=0.05,500=0.01
+    python load_test_ai.py -c 64 --duration 60 --endpoint http://127.0.0.1:8765
+    python load_test_ai.py -c 16 -n 500 --latency lognormal:800,0.8 --hedge
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from batch_cli import percentile
+import fake_gemini
+
+DEFAULT_CORPUS = "fixtures/client_texts.jsonl"
+
+_STATUS_RE = re.compile(r"\b([45]\d\d)\b")
+
+
+def classify_error(message):
+    """Categoría de un error de parse_client_info: http_<código>, json, timeout u other."""
+    match = _STATUS_RE.search(message)
+    if match:
+        return f"http_{match.group(1)}"
+    lowered = message.lower()
+    if "expecting" in lowered or "json" in lowered:
+        return "json"
+    if "timeout" in lowered or "timed out" in lowered or "deadline" in lowered:
+        return "timeout"
+    return "other"
+
+
+def load_texts(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line in f if line.strip()]
+
+
+def run_load(texts, concurrency, requests=None, duration=None, use_local=False):
+    """
+    Lanza extracciones desde `concurrency` hilos (lazo cerrado: cada hilo manda la
+    siguiente apenas recibe respuesta) hasta completar `requests` o `duration` segundos.
+    Retorna un dict con latencias, conteos por resultado y tiempo total.
+    """
+    from gemini_service import parse_client_info
+
+    lock = threading.Lock()
+    latencies = {"ok": [], "error": []}
+    outcomes = {}
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_index():
+        nonlocal issued
+        with lock:
+            if requests is not None and issued >= requests:
+                return None
+            if deadline is not None and time.perf_counter() >= deadline:
+                return None
+            issued += 1
+            return issued - 1
+
+    def worker():
+        while True:
+            index = next_index()
+            if index is None:
+                return
+            start = time.perf_counter()
+            try:
+                result = parse_client_info(texts[index % len(texts)], use_cache=False, use_local=use_local)
+                if "error" in result:
+                    outcome = classify_error(result["error"])
+                else:
+                    outcome = "fallback" if "warning" in result else "ok"
+            except Exception as e:  # parse_client_info no debería lanzar; se cuenta igual
+                outcome = f"exception_{type(e).__name__}"
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies["ok" if outcome == "ok" else "error"].append(elapsed)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - start
+    total = sum(outcomes.values())
+    ok = latencies["ok"]
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput": total / wall if wall > 0 else 0.0,
+        "ok_throughput": len(ok) / wall if wall > 0 else 0.0,
+        "p50_ms": percentile(ok, 50) * 1000,
+        "p95_ms": percentile(ok, 95) * 1000,
+        "p99_ms": percentile(ok, 99) * 1000,
+        "max_ms": max(ok, default=0.0) * 1000,
+        "error_p50_ms": percentile(latencies["error"], 50) * 1000,
+        "outcomes": dict(sorted(outcomes.items(), key=lambda kv: -kv[1])),
+    }
+
+
+def resilience_summary(before, after):
+    """Contadores de reintentos/réplicas de la corrida (diferencia) y estado del circuito."""
+    summary = {key: after[key] - before.get(key, 0) for key in ("calls", "attempts", "retries", "hedges",
+                                                                 "hedge_wins", "rejected")}
+    summary["breaker_state"] = after["state"]
+    return summary
+
+
+def print_report(stats):
+    total = stats["requests"] or 1
+    print(f"\n== {stats['requests']} solicitudes, {stats['concurrency']} concurrentes, {stats['wall_seconds']:.1f} s ==")
+    print(f"Throughput: {stats['throughput']:.1f} req/s ({stats['ok_throughput']:.1f} exitosas/s)")
+    print(f"Latencia (exitosas): p50 {stats['p50_ms']:.0f} ms | p95 {stats['p95_ms']:.0f} ms "
+          f"| p99 {stats['p99_ms']:.0f} ms | máx {stats['max_ms']:.0f} ms")
+    print("Resultados: " + " | ".join(f"{name} {count} ({count / total:.1%})" for name, count in stats["outcomes"].items()))
+    if stats["outcomes"].keys() - {"ok"}:
+        print(f"Latencia de los errores: p50 {stats['error_p50_ms']:.0f} ms")
+    resilience = stats.get("resilience")
+    if resilience:
+        print(f"Resiliencia: {resilience['attempts']} intentos | {resilience['retries']} reintentos | "
+              f"{resilience['hedges']} réplicas ({resilience['hedge_wins']} ganaron) | "
+              f"{resilience['rejected']} rechazadas por el circuito | circuito {resilience['breaker_state']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la extracción con IA contra un Gemini falso.")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Solicitudes simultáneas (default: 8)")
+    parser.add_argument("-n", "--requests", type=int, default=None, help="Total de solicitudes (default: 200)")
+    parser.add_argument("--duration", type=float, default=None, help="Duración en segundos (en vez de -n)")
+    parser.add_argument("--endpoint", default=None,
+                        help="URL de un fake_gemini ya levantado (default: se levanta uno en este proceso)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help=f"Textos de entrada (default: {DEFAULT_CORPUS})")
+    parser.add_argument("--use-local", action="store_true", help="Probar primero el extractor local (como en producción)")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen en JSON")
+    parser.add_argument("--max-attempts", type=int, default=None, help="Intentos por extracción (GEMINI_MAX_ATTEMPTS)")
+    parser.add_argument("--attempt-timeout", type=float, default=None, help="Plazo de cada intento en s (GEMINI_TIMEOUT)")
+    parser.add_argument("--deadline", type=float, default=None, help="Plazo total por extracción en s (GEMINI_DEADLINE)")
+    parser.add_argument("--hedge", action="store_true", help="Réplica de la solicitud al superar el p95 (GEMINI_HEDGE)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostrar los mensajes de error de cada solicitud")
+    fake_gemini.add_backend_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.requests is None and args.duration is None:
+        args.requests = 200
+
+    try:
+        texts = load_texts(args.corpus)
+        server = None
+        endpoint = args.endpoint
+        if not endpoint:
+            server, endpoint = fake_gemini.start_in_thread(fake_gemini.backend_from_args(args))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    # Nunca contra la API real: el endpoint se fija antes del primer uso de gemini_service
+    os.environ["GEMINI_API_ENDPOINT"] = endpoint
+    os.environ.setdefault("GEMINI_API_KEY", "fake-load-test")
+    for option, variable in (("max_attempts", "GEMINI_MAX_ATTEMPTS"), ("attempt_timeout", "GEMINI_TIMEOUT"),
+                             ("deadline", "GEMINI_DEADLINE")):
+        if getattr(args, option) is not None:
+            os.environ[variable] = str(getattr(args, option))
+    if args.hedge:
+        os.environ["GEMINI_HEDGE"] = "1"
+
+    # gemini_service imprime cada error: con miles de solicitudes taparía el resumen
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+        # Calentamiento (importa el SDK y abre la conexión); no cuenta en los resultados
+        run_load(texts, 1, requests=1, use_local=args.use_local)
+        from gemini_service import resilience_stats
+        before = resilience_stats()
+        stats = run_load(texts, args.concurrency, requests=args.requests, duration=args.duration,
+                         use_local=args.use_local)
+        stats["resilience"] = resilience_summary(before, resilience_stats())
+    if server is not None:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_report(stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
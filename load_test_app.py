@@ -0,0 +1,439 @@
+"""
+Prueba de carga de la interfaz (main.py) con muchas sesiones simultáneas, para
+saber cuántos vendedores aguanta un proceso de Streamlit antes de que las
+reejecuciones se vuelvan lentas.
+
+Cada sesión es un AppTest de Streamlit que recorre una venta real: pegar el texto
+del cliente y autocompletar con IA, buscar en el catálogo, agregar items (algunos
+con foto), borrar uno, poner el envío, generar el PDF y empezar una factura nueva.
+Todas corren en hilos de este proceso, igual que las sesiones de `streamlit run`,
+así que compiten por el mismo GIL, la misma caché y los mismos pre-renders.
+
+Reporta percentiles de latencia por interacción y el crecimiento de session_state
+de cada sesión (tamaño serializado), más la memoria máxima del proceso.
+
+Backends:
+    --ai fake      Gemini falso en este proceso (mismas opciones que fake_gemini.py)
+    --ai real      La API configurada en GEMINI_API_KEY / GEMINI_API_ENDPOINT
+    --pdf real     ReportLab de verdad
+    --pdf stub:80  Render simulado de 80 ms (mide la interfaz sin el costo del PDF)
+
+Uso:
+    python load_test_app.py -s 20 --invoices 3 --latency lognormal:800,0.5
+    python load_test_app.py -s 50 -c 25 --pdf stub:100 --think 500 --json
+
+El ledger, las fotos y el archivo de ventas van a un directorio temporal
+(--workdir), nunca a los de producción.
+"""
+import os
+import sys
+import json
+import time
+import random
+import pickle
+import argparse
+import resource
+import tempfile
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from batch_cli import percentile
+import fake_gemini
+
+APP_SCRIPT = "main.py"
+DEFAULT_CORPUS = "fixtures/client_texts.jsonl"
+
+# Orden en que se muestran las interacciones en el reporte
+INTERACTIONS = ["abrir", "autocompletar", "buscar", "agregar", "agregar_foto",
+                "eliminar", "envio", "generar_pdf", "nueva_factura"]
+
+# PDF mínimo que devuelve el render simulado
+_STUB_PDF = b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n"
+
+
+# ==========================================
+# PREPARACIÓN DEL ENTORNO
+# ==========================================
+
+def _use_workdir(workdir):
+    """Redirige los datos de la app a `workdir`. Debe llamarse antes de importar main.py."""
+    os.environ["LEDGER_DB"] = os.path.join(workdir, "facturas.sqlite3")
+    os.environ["BLOB_STORE_DIR"] = os.path.join(workdir, "blobs")
+    os.environ["SALES_ARCHIVE_DIR"] = os.path.join(workdir, "ventas")
+    os.environ.pop("RENDER_CACHE_DIR", None)
+    os.environ.pop("GEMINI_CACHE_DB", None)
+
+
+def _allow_concurrent_apptests():
+    """
+    AppTest está pensado para una prueba a la vez: en cada run() pone un Runtime
+    falso en Runtime._instance (y lo borra al terminar) y parchea config.get_option.
+    Con varias sesiones en paralelo una borraría el Runtime de otra a mitad de su
+    ejecución, así que se comparte un único Runtime falso (y una caché del script)
+    y la opción se fija una vez.
+    """
+    from unittest.mock import MagicMock
+    from streamlit import config, logger as st_logger
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    # Como en `streamlit run`, el script se compila una vez para todas las sesiones
+    # (compilarlo en varios hilos a la vez falla en Python 3.11 con SystemError)
+    script_cache = ScriptCache()
+    script_cache.get_bytecode(APP_SCRIPT)
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+
+    config.set_option("global.appTest", True)
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+    # Cada hilo sin ScriptRunContext (los del pool) avisaría en cada acceso al estado
+    st_logger.set_log_level("error")
+
+
+def _stub_pdf(milliseconds):
+    """Reemplaza el render de ReportLab por una espera fija."""
+    import pdf_generator
+
+    def render_pdf_bytes(invoice_data, logo_bytes=None):
+        time.sleep(milliseconds / 1000)
+        return _STUB_PDF
+
+    pdf_generator.render_pdf_bytes = render_pdf_bytes
+
+
+def make_photos(count, seed=0):
+    """Fotos JPEG distintas entre sí (el almacén deduplica por contenido), del tamaño de una foto de celular."""
+    from io import BytesIO
+    from PIL import Image
+
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(count):
+        image = Image.effect_noise((1600, 1200), rng.uniform(20, 80)).convert("RGB")
+        image = Image.blend(image, Image.new("RGB", image.size, tuple(rng.randrange(256) for _ in range(3))), 0.6)
+        buffer = BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def load_texts(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line in f if line.strip()]
+
+
+def catalog_queries(count, seed=0):
+    """Búsquedas como las de un vendedor: un código o la primera palabra de una descripción."""
+    from catalog import get_catalog
+
+    products = get_catalog().products
+    rng = random.Random(seed)
+    queries = []
+    for product in rng.sample(products, min(count, len(products))):
+        words = product["description"].split()
+        queries.append(product["id"] if rng.random() < 0.3 or not words else words[0][:6])
+    return queries
+
+
+# ==========================================
+# SESIÓN SIMULADA
+# ==========================================
+
+def _find(widgets, label):
+    for widget in widgets:
+        if widget.label and widget.label.startswith(label):
+            return widget
+    raise LookupError(f"No se encontró el control {label!r}")
+
+
+def state_size(at):
+    """Bytes de session_state serializado (lo que la sesión retiene entre reejecuciones)."""
+    state = at.session_state.filtered_state
+    try:
+        return len(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return len(repr(state).encode("utf-8"))
+
+
+class Recorder:
+    """Latencias y errores por interacción, compartidos por todas las sesiones."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.messages = []
+        self.sessions = []
+
+    def add(self, name, seconds, error=None):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                if len(self.messages) < 20:
+                    self.messages.append(f"{name}: {error}")
+
+    def add_session(self, sizes):
+        with self._lock:
+            self.sessions.append(sizes)
+
+
+class Session:
+    def __init__(self, index, args, texts, queries, photos, recorder):
+        from streamlit.testing.v1 import AppTest
+
+        self.args = args
+        self.texts = texts
+        self.queries = queries
+        self.photos = photos
+        self.recorder = recorder
+        self.rng = random.Random((args.seed or 0) * 100003 + index)
+        self.at = AppTest.from_file(APP_SCRIPT, default_timeout=args.timeout)
+
+    def _think(self):
+        if self.args.think:
+            time.sleep(self.args.think / 1000 * self.rng.uniform(0.5, 1.5))
+
+    def _step(self, name, action=None):
+        """Ejecuta la acción y la reejecución que provoca; registra su latencia y si falló."""
+        self._think()
+        start = time.perf_counter()
+        error = None
+        try:
+            if action is not None:
+                action()
+            self.at.run()
+            if not self.at.main.children:
+                error = "La app no produjo ningún elemento"
+            elif self.at.exception:
+                error = self.at.exception[0].message
+            elif self.at.error:
+                error = self.at.error[0].value
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.recorder.add(name, time.perf_counter() - start, error)
+        return error is None
+
+    def _add_photo_item(self, product, quantity, price):
+        # AppTest no maneja file_uploader: se hace lo mismo que el botón con una foto subida
+        from blob_store import get_blob_store
+        from constants import DEFAULT_EXCHANGE_RATE
+
+        state = self.at.session_state
+        item = {
+            "product": product,
+            "quantity": quantity,
+            "priceCordobas": price,
+            "priceDollars": price / DEFAULT_EXCHANGE_RATE,
+            "custom_image_ref": get_blob_store().put(self.rng.choice(self.photos)),
+        }
+        state["invoice_items"] = state["invoice_items"] + [item]
+        state["subtotal"] = round(state["subtotal"] + quantity * price, 2)
+
+    def _add_item(self):
+        at, rng = self.at, self.rng
+        self._step("buscar", lambda: _find(at.text_input, "Buscar en el Catálogo").set_value(rng.choice(self.queries)))
+        product = _find(at.selectbox, "Seleccionar del Catálogo").value
+        quantity = rng.randint(1, 4)
+        price = float(rng.randrange(50, 3000, 10))
+
+        if product is not None and self.photos and rng.random() < self.args.photo_rate:
+            self._step("agregar_foto", lambda: self._add_photo_item(product, quantity, price))
+            return
+
+        def fill_and_click():
+            _find(at.number_input, "Cant.").set_value(quantity)
+            _find(at.number_input, "Precio C$").set_value(price)
+            _find(at.button, "➕ Agregar Item").click()
+        self._step("agregar", fill_and_click)
+
+    def run(self):
+        at, rng, args = self.at, self.rng, self.args
+        if not self._step("abrir"):
+            self.recorder.add_session([])
+            return
+        sizes = [state_size(at)]
+        for _ in range(args.invoices):
+            def autocomplete():
+                _find(at.text_area, "Pegue texto aquí").set_value(rng.choice(self.texts))
+                _find(at.button, "✨ Autocompletar").click()
+            self._step("autocompletar", autocomplete)
+
+            for _ in range(rng.randint(args.items, args.items * 2)):
+                self._add_item()
+
+            if len(at.session_state["invoice_items"]) > 1 and rng.random() < args.delete_rate:
+                self._step("eliminar", lambda: at.button(key="del_0").click())
+
+            self._step("envio", lambda: _find(at.number_input, "Envío (C$)").set_value(float(rng.randrange(0, 200, 10))))
+            self._step("generar_pdf", lambda: _find(at.button, "🖨️ Generar PDF").click())
+            sizes.append(state_size(at))
+            self._step("nueva_factura", lambda: _find(at.button, "🆕 Nueva Factura").click())
+        self.recorder.add_session(sizes)
+
+
+# ==========================================
+# EJECUCIÓN Y REPORTE
+# ==========================================
+
+def _counters(prefix):
+    import metrics
+
+    counters = {}
+    for (name, labels), value in metrics.snapshot()["counters"].items():
+        if name.startswith(prefix):
+            label = ",".join(f"{k}={v}" for k, v in labels)
+            counters[f"{name}{{{label}}}" if label else name] = value
+    return counters
+
+
+def run_session(index, args, texts, queries, photos, recorder):
+    """Una sesión completa; si la interfaz cambió y falta un control, la sesión se cuenta como error."""
+    try:
+        Session(index, args, texts, queries, photos, recorder).run()
+    except Exception as e:
+        recorder.add("sesion_abortada", 0.0, f"{type(e).__name__}: {e}")
+
+
+def run_load(args, texts, queries, photos):
+    recorder = Recorder()
+    concurrency = args.concurrency or args.sessions
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_session, i, args, texts, queries, photos, recorder) for i in range(args.sessions)]
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - start
+
+    interactions = {}
+    for name in INTERACTIONS + sorted(recorder.latencies.keys() - set(INTERACTIONS)):
+        values = recorder.latencies.get(name)
+        if not values:
+            continue
+        interactions[name] = {
+            "count": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": max(values) * 1000,
+        }
+
+    growth = [sizes[-1] - sizes[0] for sizes in recorder.sessions if sizes]
+    per_invoice = [(sizes[-1] - sizes[0]) / (len(sizes) - 1) for sizes in recorder.sessions if len(sizes) > 1]
+    total = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "sessions": args.sessions,
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "interactions_total": total,
+        "throughput": total / wall if wall > 0 else 0.0,
+        "interactions": interactions,
+        "state_initial_bytes": percentile([sizes[0] for sizes in recorder.sessions if sizes], 50),
+        "state_growth_p50_bytes": percentile(growth, 50),
+        "state_growth_max_bytes": max(growth, default=0),
+        "state_growth_per_invoice_bytes": percentile(per_invoice, 50),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "counters": {**_counters("ai.result"), **_counters("prerender.result")},
+        "error_samples": recorder.messages,
+    }
+
+
+def print_report(stats):
+    print(f"\n== {stats['sessions']} sesiones, {stats['concurrency']} simultáneas, {stats['wall_seconds']:.1f} s ==")
+    print(f"{stats['interactions_total']} interacciones ({stats['throughput']:.1f}/s)\n")
+    print(f"{'Interacción':<15}{'n':>6}{'errores':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'máx ms':>9}")
+    for name, row in stats["interactions"].items():
+        print(f"{name:<15}{row['count']:>6}{row['errors']:>9}{row['p50_ms']:>9.0f}{row['p95_ms']:>9.0f}"
+              f"{row['p99_ms']:>9.0f}{row['max_ms']:>9.0f}")
+    print(f"\nsession_state: {stats['state_initial_bytes'] / 1024:.1f} KB al abrir, "
+          f"+{stats['state_growth_p50_bytes'] / 1024:.1f} KB por sesión (p50; máx "
+          f"+{stats['state_growth_max_bytes'] / 1024:.1f} KB), "
+          f"+{stats['state_growth_per_invoice_bytes'] / 1024:.1f} KB por factura")
+    print(f"Memoria máxima del proceso: {stats['max_rss_mb']:.0f} MB")
+    if stats["counters"]:
+        print("Contadores: " + " | ".join(f"{k} {v}" for k, v in sorted(stats["counters"].items())))
+    if stats["error_samples"]:
+        print("⚠️ Errores (muestra):")
+        for message in stats["error_samples"]:
+            print(f"   {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la interfaz con sesiones simultáneas.")
+    parser.add_argument("-s", "--sessions", type=int, default=10, help="Sesiones a simular (default: 10)")
+    parser.add_argument("-c", "--concurrency", type=int, default=None, help="Sesiones simultáneas (default: todas)")
+    parser.add_argument("--invoices", type=int, default=2, help="Facturas por sesión (default: 2)")
+    parser.add_argument("--items", type=int, default=3, help="Items mínimos por factura; se agregan hasta el doble (default: 3)")
+    parser.add_argument("--photo-rate", type=float, default=0.3, help="Fracción de items con foto (default: 0.3)")
+    parser.add_argument("--delete-rate", type=float, default=0.5, help="Probabilidad de borrar un item por factura (default: 0.5)")
+    parser.add_argument("--think", type=float, default=0, help="Pausa media entre interacciones, en ms (default: 0)")
+    parser.add_argument("--timeout", type=float, default=60, help="Tiempo máximo por reejecución, en s (default: 60)")
+    parser.add_argument("--ai", choices=["fake", "real"], default="fake", help="Backend de IA (default: fake)")
+    parser.add_argument("--skip-local", action="store_true", help="Consultar siempre la IA (ignorar el extractor local)")
+    parser.add_argument("--pdf", default="real", help="real o stub:<ms> (default: real)")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help=f"Textos de clientes (default: {DEFAULT_CORPUS})")
+    parser.add_argument("--workdir", default=None, help="Directorio para ledger, fotos y ventas (default: uno temporal)")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen en JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostrar lo que imprime la app")
+    fake_gemini.add_backend_arguments(parser)
+    args = parser.parse_args(argv)
+
+    stub_ms = None
+    if args.pdf != "real":
+        kind, _, value = args.pdf.partition(":")
+        try:
+            stub_ms = float(value) if kind == "stub" else None
+        except ValueError:
+            pass
+        if stub_ms is None:
+            parser.error(f"--pdf inválido: {args.pdf!r} (real o stub:<ms>)")
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory(prefix="pandastore_load_"))
+        _use_workdir(workdir)
+        if args.skip_local:
+            # Antes de que main.py importe gemini_service (que copia el umbral); la confianza nunca pasa de 1
+            import client_parser
+            client_parser.CONFIDENCE_THRESHOLD = 2.0
+
+        try:
+            texts = load_texts(args.corpus)
+            if args.ai == "fake":
+                server, endpoint = fake_gemini.start_in_thread(fake_gemini.backend_from_args(args))
+                stack.callback(server.shutdown)
+                os.environ["GEMINI_API_ENDPOINT"] = endpoint
+                os.environ["GEMINI_API_KEY"] = "fake-load-test"
+            elif not os.getenv("GEMINI_API_KEY"):
+                parser.error("--ai real necesita GEMINI_API_KEY")
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+        _allow_concurrent_apptests()
+        if stub_ms is not None:
+            _stub_pdf(stub_ms)
+        photos = make_photos(8, seed=args.seed or 0) if args.photo_rate > 0 else []
+        queries = catalog_queries(200, seed=args.seed or 0)
+
+        # La app imprime cada consulta y error: con muchas sesiones taparía el resumen
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            stats = run_load(args, texts, queries, photos)
+
+    if args.json:
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+    else:
+        print_report(stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
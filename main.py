@@ -1,16 +1,46 @@
 import streamlit as st
 import datetime
+import time
 import os  
-from constants import PRODUCT_CATALOG, DEFAULT_EXCHANGE_RATE
-from gemini_service import parse_client_info
-from pdf_generator import generate_pdf_file
+import uuid
+import metrics
+from constants import DEFAULT_EXCHANGE_RATE
+from catalog import get_catalog
+from ledger import get_ledger, InvoiceNumberTaken
+from gemini_service import parse_client_info, cache_stats, resilience_stats
+from prerender import get_prerenderer
+from invoice_io import build_invoice_filename
+from blob_store import get_blob_store
 
 # --- Configuración de Página ---
 st.set_page_config(page_title="PandaStore Facturación", layout="wide")
+_rerun_start = time.perf_counter()
+metrics.start_http_server()  # Sólo si METRICS_PORT está definido (una vez por proceso)
 
 # --- Constantes ---
 # CAMBIO AQUÍ: Ponemos el nombre exacto de tu archivo
 LOGO_FILENAME = "logo.jpeg"  
+CATALOG_RESULT_LIMIT = 50  # Opciones máximas en el selector de productos
+THUMBNAIL_WIDTH = 100      # Ancho de las fotos en el detalle (se guardan al doble para pantallas HiDPI)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_logo(path, mtime):
+    """Logo leído una vez por proceso y compartido por todas las sesiones (se relee si cambia el archivo)."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def item_thumbnail(ref):
+    """Miniatura JPEG de la foto de un item; la caché de image_cache la comparte entre sesiones."""
+    from image_cache import normalize_image  # Pillow sólo se carga con la primera foto
+
+    return normalize_image(get_blob_store().get(ref), THUMBNAIL_WIDTH, THUMBNAIL_WIDTH, dpi=144, key=ref).data
+
+
+def line_total(item):
+    return item['priceCordobas'] * item['quantity']
+
 
 # --- Inicialización de Estado ---
 if 'invoice_items' not in st.session_state:
@@ -18,7 +48,18 @@ if 'invoice_items' not in st.session_state:
 if 'client_data' not in st.session_state:
     st.session_state.client_data = {"fullName": "", "address": "", "phone": "", "transportProvider": ""}
 if 'consecutive' not in st.session_state:
-    st.session_state.consecutive = "A001197"
+    # Vacío = se asigna automáticamente desde el registro al generar el PDF
+    st.session_state.consecutive = ""
+if 'subtotal' not in st.session_state:
+    # Se actualiza al agregar o quitar items (ver add_item / remove_item), no se vuelve a sumar
+    st.session_state.subtotal = sum(line_total(item) for item in st.session_state.invoice_items)
+if 'traces' not in st.session_state:
+    st.session_state.traces = {}
+if 'prerender_owner' not in st.session_state:
+    st.session_state.prerender_owner = uuid.uuid4().hex
+if 'invoice_owner' not in st.session_state:
+    # Dueño del número en el registro: sólo esta factura puede volver a generarlo
+    st.session_state.invoice_owner = uuid.uuid4().hex
 
 # --- Sidebar (Configuración) ---
 with st.sidebar:
@@ -32,8 +73,7 @@ with st.sidebar:
     
     # Verificamos si existe el archivo logo.jpeg
     if os.path.exists(LOGO_FILENAME):
-        with open(LOGO_FILENAME, "rb") as f:
-            logo_bytes = f.read()
+        logo_bytes = load_logo(LOGO_FILENAME, os.path.getmtime(LOGO_FILENAME))
         st.image(logo_bytes, width=120, caption="Logo Actual")
     else:
         st.info(f"No se encontró {LOGO_FILENAME} en la carpeta.")
@@ -46,7 +86,20 @@ with st.sidebar:
 
     st.divider()
     
-    st.session_state.consecutive = st.text_input("No. Factura", st.session_state.consecutive)
+    ledger = get_ledger()
+    st.session_state.consecutive = st.text_input(
+        "No. Factura",
+        st.session_state.consecutive,
+        placeholder=f"Automático ({ledger.peek_next_number()})",
+        help="Déjelo vacío para asignar el siguiente número consecutivo al generar el PDF.",
+    )
+    if st.button("🆕 Nueva Factura"):
+        st.session_state.invoice_items = []
+        st.session_state.subtotal = 0.0
+        st.session_state.client_data = {"fullName": "", "address": "", "phone": "", "transportProvider": ""}
+        st.session_state.consecutive = ""
+        st.session_state.invoice_owner = uuid.uuid4().hex
+        st.rerun()
     invoice_date = st.date_input("Fecha", datetime.date.today())
     
     st.divider()
@@ -56,14 +109,28 @@ with st.sidebar:
     if st.button("✨ Autocompletar con IA"):
         if raw_text.strip():
             with st.spinner("Analizando..."):
-                result = parse_client_info(raw_text)
+                with metrics.trace() as trace:
+                    result = parse_client_info(raw_text)
+                st.session_state.traces["Autocompletar con IA"] = trace.sorted_spans()
                 if result and "error" not in result:
+                    warning = result.pop("warning", None)
                     st.session_state.client_data = result
-                    st.success("Datos extraídos!")
-                    st.rerun()
+                    if warning:
+                        # Sin IA (circuito abierto o API caída): se avisa y no se recarga, para que se vea
+                        st.warning(warning)
+                    else:
+                        st.success("Datos extraídos!")
+                        st.rerun()
                 else:
                     st.error(f"Error: {result.get('error')}")
 
+    ai_cache = cache_stats()
+    st.caption(f"Caché IA: {ai_cache['hits']} aciertos · {ai_cache['misses']} consultas")
+    ai_health = resilience_stats()
+    if ai_health["state"] != "closed":
+        st.caption(f"⚠️ IA en pausa tras {ai_health['consecutive_failures']} fallos seguidos "
+                   f"({ai_health['rejected']} consultas resueltas sin IA)")
+
 # --- Área Principal ---
 st.title("🧾 Generador de Facturas PandaStore")
 
@@ -82,98 +149,177 @@ st.session_state.client_data.update({
 
 st.divider()
 
+def current_invoice(number):
+    """invoice_data con el estado actual de la interfaz."""
+    return {
+        "number": number,
+        "date": str(invoice_date),
+        "client": st.session_state.client_data,
+        "items": st.session_state.invoice_items,
+        "shippingCost": st.session_state.shipping,
+        "discount": st.session_state.discount,
+        "note": st.session_state.note
+    }
+
+
 # 2. Agregar Productos
-st.subheader("Agregar Productos")
-
-with st.container(border=True):
-    col_prod, col_qty = st.columns([3, 1])
-    with col_prod:
-        product_options = {f"{p['id']} - {p['description']}": p for p in PRODUCT_CATALOG}
-        selected_option = st.selectbox("Seleccionar del Catálogo", options=list(product_options.keys()))
-        selected_product = product_options[selected_option]
-    with col_qty:
-        qty = st.number_input("Cant.", min_value=1, value=1)
-
-    col_price, col_img = st.columns([1, 2])
-    with col_price:
-        price_c = st.number_input("Precio C$", min_value=0.0, step=10.0, format="%.2f")
-        usd_val = price_c / DEFAULT_EXCHANGE_RATE if price_c else 0
-        st.caption(f"Aprox: ${usd_val:.2f}")
-    
-    with col_img:
-        item_image = st.file_uploader("Foto del Producto (Opcional)", type=['png', 'jpg', 'jpeg'], key="prod_img")
-
-    if st.button("➕ Agregar Item a Factura", type="primary"):
-        if price_c <= 0:
-            st.warning("Ingrese un precio válido.")
-        else:
-            img_data = None
-            if item_image:
-                img_data = item_image.getvalue()
-
-            new_item = {
-                "product": selected_product,
-                "quantity": qty,
-                "priceCordobas": price_c,
-                "priceDollars": price_c / DEFAULT_EXCHANGE_RATE,
-                "custom_image_data": img_data
-            }
-            st.session_state.invoice_items.append(new_item)
-            st.success("Agregado")
-            st.rerun()
-
-# 3. Lista de Items
-if st.session_state.invoice_items:
-    st.write("### Detalle")
-    for i, item in enumerate(st.session_state.invoice_items):
-        c1, c2, c3, c4 = st.columns([4, 1, 2, 1])
-        with c1: 
-            st.write(f"**{item['product']['description']}**")
-            if item.get('custom_image_data'):
-                st.image(item['custom_image_data'], width=100)
-        with c2: st.write(f"x{item['quantity']}")
-        with c3: st.write(f"C$ {item['priceCordobas'] * item['quantity']:.2f}")
-        with c4: 
-            if st.button("🗑️", key=f"del_{i}"):
-                st.session_state.invoice_items.pop(i)
+# Picker, detalle y totales son fragments: sus widgets sólo vuelven a ejecutar su
+# propia sección, no todo el script (buscar un producto no redibuja el carrito).
+def add_item(item):
+    st.session_state.invoice_items.append(item)
+    st.session_state.subtotal = round(st.session_state.subtotal + line_total(item), 2)
+
+
+def remove_item(index):
+    item = st.session_state.invoice_items.pop(index)
+    st.session_state.subtotal = round(st.session_state.subtotal - line_total(item), 2)
+    if not st.session_state.invoice_items:
+        # Carrito vacío: lo que se agregue después ya es otra factura y no puede
+        # reescribir la emitida con el mismo número
+        st.session_state.invoice_owner = uuid.uuid4().hex
+
+
+@st.fragment
+def product_picker():
+    st.subheader("Agregar Productos")
+
+    with st.container(border=True):
+        col_prod, col_qty = st.columns([3, 1])
+        with col_prod:
+            # El catálogo se indexa una vez por proceso; aquí sólo se consultan los resultados
+            catalog = get_catalog()
+            query = st.text_input("Buscar en el Catálogo", placeholder="Código o descripción (ej: 1059, mi band)")
+            matches = catalog.search(query, limit=CATALOG_RESULT_LIMIT)
+            selected_product = st.selectbox(
+                "Seleccionar del Catálogo",
+                options=matches,
+                format_func=lambda p: f"{p['id']} - {p['description']}",
+                placeholder="Sin resultados" if not matches else "Elija un producto",
+            )
+        with col_qty:
+            qty = st.number_input("Cant.", min_value=1, value=1)
+
+        col_price, col_img = st.columns([1, 2])
+        with col_price:
+            price_c = st.number_input("Precio C$", min_value=0.0, step=10.0, format="%.2f")
+            usd_val = price_c / DEFAULT_EXCHANGE_RATE if price_c else 0
+            st.caption(f"Aprox: ${usd_val:.2f}")
+
+        with col_img:
+            item_image = st.file_uploader("Foto del Producto (Opcional)", type=['png', 'jpg', 'jpeg'], key="prod_img")
+
+        if st.button("➕ Agregar Item a Factura", type="primary"):
+            if selected_product is None:
+                st.warning("Seleccione un producto del catálogo.")
+            elif price_c <= 0:
+                st.warning("Ingrese un precio válido.")
+            else:
+                # La foto se guarda una vez en el almacén compartido; la sesión sólo guarda su hash
+                img_ref = None
+                if item_image:
+                    img_ref = get_blob_store().put(item_image.getvalue())
+
+                add_item({
+                    "product": selected_product,
+                    "quantity": qty,
+                    "priceCordobas": price_c,
+                    "priceDollars": price_c / DEFAULT_EXCHANGE_RATE,
+                    "custom_image_ref": img_ref
+                })
+                st.success("Agregado")
+                # El detalle y los totales están en otros fragments: hay que redibujar la página
                 st.rerun()
 
-st.divider()
 
-# 4. Totales
-col_notes, col_totals = st.columns([2, 1])
-with col_notes:
-    note = st.text_area("Nota (Opcional)", placeholder="Ej: Se entrega Memoria MicroSD de regalo...")
-with col_totals:
-    subtotal = sum(item['priceCordobas'] * item['quantity'] for item in st.session_state.invoice_items)
-    shipping = st.number_input("Envío (C$)", min_value=0.0, step=10.0)
-    discount = st.number_input("Descuento (C$)", min_value=0.0, step=10.0)
-    total = subtotal + shipping - discount
-    st.markdown(f"<h3 style='text-align: right;'>Total: C$ {total:,.2f}</h3>", unsafe_allow_html=True)
+# 3. Lista de Items + 4. Totales
+@st.fragment
+def invoice_detail():
+    if st.session_state.invoice_items:
+        st.write("### Detalle")
+        for i, item in enumerate(st.session_state.invoice_items):
+            c1, c2, c3, c4 = st.columns([4, 1, 2, 1])
+            with c1:
+                st.write(f"**{item['product']['description']}**")
+                if item.get('custom_image_ref'):
+                    try:
+                        st.image(item_thumbnail(item['custom_image_ref']), width=THUMBNAIL_WIDTH)
+                    except Exception as e:
+                        st.caption(f"⚠️ Foto no disponible: {e}")
+            with c2: st.write(f"x{item['quantity']}")
+            with c3: st.write(f"C$ {line_total(item):.2f}")
+            with c4:
+                # El callback corre antes de redibujar: sólo se vuelve a ejecutar este fragment
+                st.button("🗑️", key=f"del_{i}", on_click=remove_item, args=(i,))
+
+    st.divider()
+    invoice_totals()
+
+
+@st.fragment
+def invoice_totals():
+    col_notes, col_totals = st.columns([2, 1])
+    with col_notes:
+        st.text_area("Nota (Opcional)", placeholder="Ej: Se entrega Memoria MicroSD de regalo...", key="note")
+    with col_totals:
+        shipping = st.number_input("Envío (C$)", min_value=0.0, step=10.0, key="shipping")
+        discount = st.number_input("Descuento (C$)", min_value=0.0, step=10.0, key="discount")
+        total = st.session_state.subtotal + shipping - discount
+        st.markdown(f"<h3 style='text-align: right;'>Total: C$ {total:,.2f}</h3>", unsafe_allow_html=True)
+
+    # Todo cambio de la factura pasa por aquí (también en las ejecuciones completas):
+    # se pre-renderiza en segundo plano para que "Generar PDF" sólo entregue los bytes.
+    # Sin número fijo se usa el próximo del registro, que es el que se reservará al generar.
+    if st.session_state.invoice_items:
+        number = st.session_state.consecutive.strip() or ledger.peek_next_number()
+        get_prerenderer().schedule(st.session_state.prerender_owner, current_invoice(number), logo_bytes)
+
+
+product_picker()
+invoice_detail()
 
 # 5. Generar PDF
 if st.button("🖨️ Generar PDF", type="secondary", use_container_width=True):
     if not st.session_state.invoice_items:
         st.warning("Factura vacía.")
     else:
-        invoice_data = {
-            "number": st.session_state.consecutive,
-            "date": str(invoice_date),
-            "client": st.session_state.client_data,
-            "items": st.session_state.invoice_items,
-            "shippingCost": shipping,
-            "discount": discount,
-            "note": note
-        }
+        # El número se reserva una sola vez; volver a generar reutiliza el mismo
+        if not st.session_state.consecutive.strip():
+            st.session_state.consecutive = ledger.allocate_number()
+
+        invoice_data = current_invoice(st.session_state.consecutive.strip())
         
-        safe_name = st.session_state.client_data.get('fullName', 'Cliente').strip().replace(" ", "_")
-        filename = f"factura_{st.session_state.consecutive}_{safe_name}.pdf"
+        filename = build_invoice_filename(invoice_data)
         
         try:
-            # Pasamos el logo que ya leímos arriba
-            generate_pdf_file(invoice_data, filename, logo_bytes=logo_bytes)
-            
-            with open(filename, "rb") as f:
-                st.download_button("⬇️ Descargar PDF Final", f, file_name=filename, mime="application/pdf")
+            # Normalmente el pre-render ya terminó (o está por terminar) con este mismo estado;
+            # si algo no coincide se renderiza aquí
+            with metrics.trace() as trace:
+                with metrics.span("pdf.cached"):
+                    pdf_bytes = get_prerenderer().result(
+                        st.session_state.prerender_owner, invoice_data, logo_bytes=logo_bytes
+                    )
+                with metrics.span("ledger.record"):
+                    ledger.record_invoice(invoice_data, owner=st.session_state.invoice_owner)
+                with metrics.span("sales.archive"):
+                    # Import diferido: pyarrow no se carga hasta la primera factura
+                    from sales_archive import record_sale
+                    record_sale(invoice_data)
+            st.session_state.traces["Generar PDF"] = trace.sorted_spans()
+            st.download_button("⬇️ Descargar PDF Final", pdf_bytes, file_name=filename, mime="application/pdf")
+        except InvoiceNumberTaken as e:
+            st.error(f"❌ {e}. Use '🆕 Nueva Factura' o deje el número vacío para asignar uno nuevo.")
         except Exception as e:
-            st.error(f"Error PDF: {e}")
\ No newline at end of file
+            st.error(f"Error PDF: {e}")
+
+# 6. Trazas de tiempo (opcional, al final para incluir todo lo que pasó en esta ejecución)
+rerun_seconds = time.perf_counter() - _rerun_start
+metrics.observe("app.rerun", rerun_seconds)
+with st.sidebar:
+    st.divider()
+    if st.checkbox("⏱️ Mostrar tiempos", help="Desglose de la última generación de PDF y consulta a la IA"):
+        st.caption(f"Esta ejecución del script: {rerun_seconds * 1000:.0f} ms")
+        for title, spans in st.session_state.traces.items():
+            st.markdown(f"**{title}**")
+            st.code("\n".join(
+                f"{'  ' * s['depth']}{s['name']:<{28 - 2 * s['depth']}}{s['ms']:>9.1f} ms" for s in spans
+            ) or "(sin spans)", language=None)
@@ -0,0 +1,262 @@
+"""
+Métricas de tiempo del proceso: contadores, histogramas y trazas por solicitud.
+
+    with metrics.span("pdf.table"):
+        ...
+
+Cada span suma su duración al histograma de su nombre. Si hay una traza activa
+(`with metrics.trace() as t:`), también queda registrado en `t.spans` con su
+profundidad, para mostrar el desglose de una solicitud concreta.
+
+Exportación (ambas opcionales, por variables de entorno):
+    METRICS_PORT=9108         -> texto Prometheus en http://0.0.0.0:9108/metrics
+    METRICS_LOG=spans.jsonl   -> una línea JSON por span terminado
+"""
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+METRICS_PREFIX = "pandastore"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+METRICS_LOG = os.getenv("METRICS_LOG") or None
+
+# Límites superiores de los buckets, en segundos (de 1 ms a 30 s)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = {}    # (nombre, etiquetas) -> valor
+_histograms = {}  # (nombre, etiquetas) -> Histogram
+_gauges = {}      # (nombre, etiquetas) -> último valor
+_log_file = None
+
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+_depth = contextvars.ContextVar("metrics_depth", default=0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # El último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Trace:
+    """Spans de una solicitud, en orden de inicio."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def _add(self, name, start, seconds, depth, labels):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 2),
+            "ms": round(seconds * 1000, 2),
+            "depth": depth,
+            "labels": labels,
+        })
+
+    def sorted_spans(self):
+        return sorted(self.spans, key=lambda s: (s["start_ms"], s["depth"]))
+
+    @property
+    def total_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Suma `value` al contador `name`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Fija el valor actual del indicador `name` (p. ej. el estado de un circuito)."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, seconds, **labels):
+    """Registra una duración (en segundos) en el histograma `name`."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def _log_span(name, seconds, depth, labels):
+    global _log_file
+    line = json.dumps({"ts": round(time.time(), 3), "span": name, "ms": round(seconds * 1000, 3),
+                       "depth": depth, **labels}, ensure_ascii=False)
+    with _lock:
+        try:
+            if _log_file is None:
+                _log_file = open(METRICS_LOG, "a", encoding="utf-8", buffering=1)
+            _log_file.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️ No se pudo escribir en {METRICS_LOG}: {e}")
+
+
+@contextmanager
+def span(name, **labels):
+    """Mide el bloque: histograma `name` y, si hay traza activa, una entrada en ella."""
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc(f"{name}.errors", **labels)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        _depth.reset(token)
+        observe(name, seconds, **labels)
+        trace = _trace.get()
+        if trace is not None:
+            trace._add(name, start, seconds, depth, labels)
+        if METRICS_LOG:
+            _log_span(name, seconds, depth, labels)
+
+
+@contextmanager
+def trace():
+    """Recolecta los spans del bloque (en este hilo) en un Trace."""
+    current = Trace()
+    token = _trace.set(current)
+    depth_token = _depth.set(0)
+    try:
+        yield current
+    finally:
+        _depth.reset(depth_token)
+        _trace.reset(token)
+
+
+def snapshot():
+    """Copia de las métricas: {'counters': {...}, 'gauges': {...}, 'histograms': {...}}."""
+    with _lock:
+        counters = {k: v for k, v in _counters.items()}
+        gauges = dict(_gauges)
+        histograms = {k: (list(h.counts), h.sum, h.count) for k, h in _histograms.items()}
+    return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+# ==========================================
+# EXPORTACIÓN PROMETHEUS
+# ==========================================
+
+def _metric_name(name, suffix):
+    clean = "".join(ch if ch.isalnum() else "_" for ch in name)
+    return f"{METRICS_PREFIX}_{clean}_{suffix}"
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus():
+    """Métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    data = snapshot()
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(data["counters"].items()):
+        metric = _metric_name(name, "total")
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for (name, labels), value in sorted(data["gauges"].items()):
+        metric = _metric_name(name, "value")
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for (name, labels), (counts, total, count) in sorted(data["histograms"].items()):
+        metric = _metric_name(name, "seconds")
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _make_server(host, port):
+    # http.server se importa aquí: la mayoría de los procesos nunca abre el puerto
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Prometheus consulta seguido; no llenar la consola
+
+    return ThreadingHTTPServer((host, port), MetricsHandler)
+
+
+_server = None
+
+
+def start_http_server(port=None, host="0.0.0.0"):
+    """
+    Sirve /metrics en un hilo de fondo. Idempotente: Streamlit vuelve a ejecutar el
+    script en cada interacción y sólo el primer llamado abre el puerto.
+    Sin `port` usa METRICS_PORT; si no está definido no hace nada.
+    """
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            try:
+                _server = _make_server(host, port)
+            except OSError as e:
+                print(f"❌ No se pudo abrir el puerto de métricas {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
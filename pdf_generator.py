@@ -1,11 +1,21 @@
 import io
+import queue
+import threading
+from itertools import accumulate
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import Table, TableStyle, Image as PlatypusImage, Paragraph
 from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import getFont
 from constants import PANDA_STORE_INFO
+from image_cache import normalize_image, content_hash
+from blob_store import item_image
+from lru import LRUCache
+from pdf_stream import PDFStreamWriter
+import metrics
 
 # --- COLORES DEL DISEÑO ---
 COLOR_PRIMARY = colors.HexColor("#005b82")     # Azul Oscuro
@@ -15,302 +25,766 @@ COLOR_TEXT = colors.HexColor("#333333")        # Gris oscuro
 COLOR_GRAY_LIGHT = colors.HexColor("#dddddd")  # Líneas sutiles
 COLOR_BORDER_BOX = colors.HexColor("#cccccc")  # Gris claro para bordes
 
-def generate_pdf_file(invoice_data, filename, logo_bytes=None):
-    c = canvas.Canvas(filename, pagesize=A4)
-    width, height = A4
-    styles = getSampleStyleSheet()
-    
-    # --- SISTEMA DE GRILLA (ALINEACIÓN PERFECTA) ---
-    MARGIN = 40                          # Margen izquierdo y derecho
-    CONTENT_WIDTH = width - (MARGIN * 2) # Ancho útil de la página (515.27 pts)
-    GAP = 20                             # Espacio entre columnas
-    HALF_WIDTH = (CONTENT_WIDTH - GAP) / 2 # Ancho exacto de cada bloque azul (247.6 pts)
-
-    # Estilos
-    style_desc = ParagraphStyle('Desc', parent=styles['Normal'], fontSize=9, leading=11, textColor=COLOR_TEXT)
-    style_block = ParagraphStyle('Block', parent=styles['Normal'], fontSize=9, leading=11, textColor=COLOR_TEXT)
-
-    # ==========================================
-    # 1. ENCABEZADO
-    # ==========================================
-    # Título alineado estrictamente a la IZQUIERDA (MARGIN)
-    c.setFont("Helvetica", 28)
-    c.setFillColor(COLOR_PRIMARY)
-    c.drawString(MARGIN, height - 50, "Factura")
-    
-    c.setFont("Helvetica-Bold", 10)
-    c.setFillColor(colors.black)
-    c.drawString(MARGIN, height - 80, "Factura No #")
-    c.drawString(MARGIN, height - 95, "Fecha:")
-    
-    c.setFont("Helvetica", 10)
-    # Alineamos los valores un poco más a la derecha pero consistentes
-    c.drawString(MARGIN + 80, height - 80, f"{invoice_data['number']}")
-    c.drawString(MARGIN + 80, height - 95, f"{invoice_data['date']}")
-
-    # Logo alineado estrictamente a la DERECHA (width - MARGIN)
-    if logo_bytes:
-        try:
-            logo_stream = io.BytesIO(logo_bytes)
-            logo_img = ImageReader(logo_stream)
-            logo_width = 120
-            logo_height = 80
-            # Posición X = Ancho total - Margen - Ancho del logo
-            logo_x = width - MARGIN - logo_width
-            c.drawImage(logo_img, logo_x, height - 100, width=logo_width, height=logo_height, preserveAspectRatio=True, mask='auto')
-        except Exception as e:
-            print(f"Error dibujando logo: {e}")
-
-    # ==========================================
-    # 2. BLOQUES DE INFORMACIÓN (ALINEADOS)
-    # ==========================================
-    y_blocks = height - 130
-    block_height = 145
-    
-    # --- Bloque Izquierdo ---
-    # X = MARGIN
-    # Ancho = HALF_WIDTH
-    c.setFillColor(COLOR_BG_BLOCK)
-    c.rect(MARGIN, y_blocks - block_height, HALF_WIDTH, block_height, fill=1, stroke=0)
-    
-    text_x_left = MARGIN + 10 # Padding interno de 10px
-    current_y = y_blocks - 20 
-    
-    c.setFont("Helvetica-Bold", 11)
-    c.setFillColor(COLOR_ACCENT_TEXT)
-    c.drawString(text_x_left, current_y, "Facturado Por:")
-    current_y -= 20 
-    
-    c.setFont("Helvetica-Bold", 10)
-    c.setFillColor(colors.black)
-    c.drawString(text_x_left, current_y, PANDA_STORE_INFO["name"])
-    current_y -= 15 
-    
-    c.setFont("Helvetica", 9) 
-    c.setFillColor(COLOR_TEXT)
-    for line in PANDA_STORE_INFO["address"]:
-        c.drawString(text_x_left, current_y, line)
+# --- SISTEMA DE GRILLA (ALINEACIÓN PERFECTA) ---
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 40                               # Margen izquierdo y derecho
+CONTENT_WIDTH = PAGE_WIDTH - (MARGIN * 2) # Ancho útil de la página (515.27 pts)
+GAP = 20                                  # Espacio entre columnas
+HALF_WIDTH = (CONTENT_WIDTH - GAP) / 2    # Ancho exacto de cada bloque azul (247.6 pts)
+
+# DEFINICIÓN DE ANCHOS DE COLUMNA PARA QUE SUMEN EXACTAMENTE 'CONTENT_WIDTH'
+# CONTENT_WIDTH es aprox 515 pts.
+# 225 + 50 + 80 + 70 + 90 = 515. ¡Exacto!
+COL_WIDTHS = [225, 50, 80, 70, 90] # Ajustado para cuadrar con los márgenes
+TABLE_HEADERS = ['Artículo', 'Cantidad', 'Monto', 'Dolares', 'Total']
+COL_POSITIONS = [0] + list(accumulate(COL_WIDTHS))  # Bordes de columna relativos a MARGIN
+
+# Celdas de la tabla (deben coincidir con table_style; ver _draw_table)
+CELL_PADDING = 6           # Padding horizontal por defecto de Platypus
+CELL_TOP_PADDING = 3
+HEADER_PADDING = 10        # LEFTPADDING de la fila de títulos
+HEADER_TOP_PADDING = 8
+BODY_FONT_SIZE = 9
+HEADER_FONT_SIZE = 10
+DESC_LEADING = 11          # Leading de style_desc
+
+# Ancho máximo de una foto de producto: columna "Artículo" (225) menos el padding de la celda
+IMAGE_MAX_WIDTH = 213
+
+LOGO_WIDTH = 120
+LOGO_HEIGHT = 80
+
+# --- PAGINACIÓN ---
+FIRST_PAGE_TABLE_TOP = PAGE_HEIGHT - 130 - 145 - 40  # Debajo de los bloques de información
+CONTINUATION_TABLE_TOP = PAGE_HEIGHT - 75            # Debajo del encabezado corto de las páginas 2+
+TABLE_BOTTOM = 185                                   # El pie empieza en y=160 (+ alto del título "Pago")
+TOTALS_HEIGHT = 75                                   # Alto de los totales bajo el inicio de la sección
+ROWS_PER_CHUNK = 60                                  # Filas armadas a la vez (más de las que caben en una página)
+
+# Subir cuando cambie el diseño del PDF: invalida los PDFs guardados en render_cache
+RENDERER_VERSION = 3
+
+# Tamaño de los bloques que entrega iter_pdf_chunks, y cuántos pueden esperar a
+# que los lea el consumidor antes de frenar el render
+PDF_CHUNK_SIZE = 64 * 1024
+PDF_CHUNK_QUEUE = 4
+
+# Streams binarios sin ASCII85: el PDF sigue siendo válido y las imágenes/páginas
+# comprimidas ocupan ~25% menos.
+rl_config.useA85 = 0
+
+# Renderizadores ya construidos, por hash del logo (ver get_renderer)
+_renderers = LRUCache(max_entries=4)
+
+# Métricas de las fuentes de la tabla, buscadas una vez (stringWidth las busca por nombre en cada llamada)
+_FONT_BODY = getFont("Helvetica")
+_FONT_BODY_BOLD = getFont("Helvetica-Bold")
+
+
+def _row_positions(heights):
+    """
+    Bordes de las filas desde arriba (alto total primero, 0 al final), sumados como
+    Table._calc: de abajo hacia arriba y con suma compensada. Así las posiciones
+    coinciden bit a bit con las de Platypus.
+    """
+    positions = []
+    height = compensation = 0
+    for row_height in reversed(heights):
+        positions.append(height)
+        y = row_height - compensation
+        t = height + y
+        compensation = (t - height) - y
+        height = t
+    positions.append(height)
+    positions.reverse()
+    return positions
+
+
+class InvoiceRenderer:
+    """
+    Renderizador de facturas reutilizable.
+
+    Se construye una vez con los datos de la tienda y el logo: los estilos, el
+    TableStyle y el logo normalizado quedan listos, y todo el contenido fijo de la
+    página (encabezado, bloque "Facturado Por", pie de pago/garantía) se graba como
+    Form XObject. Cada factura sólo dibuja sus propios datos y referencia esos forms.
+    Es de sólo lectura después de __init__, así que puede compartirse entre hilos.
+    """
+
+    FORM_HEADER = "PandaStaticHeader"
+    FORM_FOOTER = "PandaStaticFooter"
+
+    def __init__(self, store_info=PANDA_STORE_INFO, logo_bytes=None):
+        self.store_info = store_info
+
+        # Estilos
+        styles = getSampleStyleSheet()
+        self.style_desc = ParagraphStyle('Desc', parent=styles['Normal'], fontSize=9, leading=11, textColor=COLOR_TEXT)
+        self.style_block = ParagraphStyle('Block', parent=styles['Normal'], fontSize=9, leading=11, textColor=COLOR_TEXT)
+
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), COLOR_PRIMARY),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('ALIGN', (0,0), (-1,0), 'LEFT'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,0), 10),
+            ('BOTTOMPADDING', (0,0), (-1,0), 8),
+            ('TOPPADDING', (0,0), (-1,0), 8),
+            ('LEFTPADDING', (0,0), (-1,0), 10),
+
+            ('ALIGN', (1,1), (-1,-1), 'CENTER'),
+            ('ALIGN', (2,1), (-1,-1), 'RIGHT'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('TEXTCOLOR', (0,1), (-1,-1), COLOR_TEXT),
+            ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
+            ('FONTSIZE', (0,1), (-1,-1), 9),
+            ('LINEBELOW', (0,0), (-1,-1), 0.5, COLOR_GRAY_LIGHT),
+        ])
+        # Las filas con foto o con descripción de varias líneas se arman como una tabla
+        # de una fila con el mismo estilo que el cuerpo de table_style
+        self.row_style = TableStyle([
+            ('ALIGN', (1,0), (-1,-1), 'CENTER'),
+            ('ALIGN', (2,0), (-1,-1), 'RIGHT'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('TEXTCOLOR', (0,0), (-1,-1), COLOR_TEXT),
+            ('FONTNAME', (0,0), (-1,-1), 'Helvetica'),
+            ('FONTSIZE', (0,0), (-1,-1), 9),
+            ('LINEBELOW', (0,0), (-1,-1), 0.5, COLOR_GRAY_LIGHT),
+        ])
+        # Altos de la fila de títulos y de una fila simple, medidos con Platypus una sola vez
+        sample = Table([TABLE_HEADERS, [[Paragraph("<b>X</b>", self.style_desc)], "1", "C$ 1.00", "$ 1.00", "C$ 1.00"]],
+                       colWidths=COL_WIDTHS, style=self.table_style)
+        sample.wrap(CONTENT_WIDTH, PAGE_HEIGHT)
+        self.header_height, self.plain_row_height = sample._rowHeights
+
+        # Logo normalizado una sola vez; el ImageReader se crea por documento
+        # porque comparte un puntero de archivo y no es seguro entre hilos.
+        self.logo_data = None
+        if logo_bytes:
+            try:
+                self.logo_data = normalize_image(logo_bytes, LOGO_WIDTH, LOGO_HEIGHT).data
+            except Exception as e:
+                print(f"Error dibujando logo: {e}")
+
+    # ------------------------------------------
+    # Contenido fijo (se graba una vez por documento)
+    # ------------------------------------------
+    def _define_static_forms(self, c):
+        if not c.hasForm(self.FORM_HEADER):
+            c.beginForm(self.FORM_HEADER)
+            self._draw_static_header(c)
+            c.endForm()
+        if not c.hasForm(self.FORM_FOOTER):
+            c.beginForm(self.FORM_FOOTER)
+            self._draw_static_footer(c)
+            c.endForm()
+
+    def _draw_static_header(self, c):
+        width, height = PAGE_WIDTH, PAGE_HEIGHT
+        store = self.store_info
+
+        # ==========================================
+        # 1. ENCABEZADO
+        # ==========================================
+        # Título alineado estrictamente a la IZQUIERDA (MARGIN)
+        c.setFont("Helvetica", 28)
+        c.setFillColor(COLOR_PRIMARY)
+        c.drawString(MARGIN, height - 50, "Factura")
+
+        c.setFont("Helvetica-Bold", 10)
+        c.setFillColor(colors.black)
+        c.drawString(MARGIN, height - 80, "Factura No #")
+        c.drawString(MARGIN, height - 95, "Fecha:")
+
+        # Logo alineado estrictamente a la DERECHA (width - MARGIN)
+        if self.logo_data:
+            try:
+                logo_img = ImageReader(io.BytesIO(self.logo_data))
+                # Posición X = Ancho total - Margen - Ancho del logo
+                logo_x = width - MARGIN - LOGO_WIDTH
+                c.drawImage(logo_img, logo_x, height - 100, width=LOGO_WIDTH, height=LOGO_HEIGHT, preserveAspectRatio=True, mask='auto')
+                # Con un JPEG, ImageReader asigna en la instancia jpeg_fh = self._jpeg_fh: ese
+                # ciclo retendría la imagen decodificada y sus bytes RGB hasta que pase el
+                # recolector de ciclos. drawImage ya copió el JPEG al documento, así que se
+                # quita y queda el jpeg_fh de la clase. Verificado con la ReportLab fijada en
+                # requirements.txt; benchmark_pdf.py falla si el logo vuelve a dejar ciclos.
+                if "jpeg_fh" in vars(logo_img):
+                    del logo_img.jpeg_fh
+                del logo_img
+            except Exception as e:
+                print(f"Error dibujando logo: {e}")
+
+        # ==========================================
+        # 2. BLOQUES DE INFORMACIÓN (ALINEADOS)
+        # ==========================================
+        y_blocks = height - 130
+        block_height = 145
+
+        # --- Bloque Izquierdo ---
+        # X = MARGIN
+        # Ancho = HALF_WIDTH
+        c.setFillColor(COLOR_BG_BLOCK)
+        c.rect(MARGIN, y_blocks - block_height, HALF_WIDTH, block_height, fill=1, stroke=0)
+
+        text_x_left = MARGIN + 10 # Padding interno de 10px
+        current_y = y_blocks - 20
+
+        c.setFont("Helvetica-Bold", 11)
+        c.setFillColor(COLOR_ACCENT_TEXT)
+        c.drawString(text_x_left, current_y, "Facturado Por:")
+        current_y -= 20
+
+        c.setFont("Helvetica-Bold", 10)
+        c.setFillColor(colors.black)
+        c.drawString(text_x_left, current_y, store["name"])
+        current_y -= 15
+
+        c.setFont("Helvetica", 9)
+        c.setFillColor(COLOR_TEXT)
+        for line in store["address"]:
+            c.drawString(text_x_left, current_y, line)
+            current_y -= 12
+        c.drawString(text_x_left, current_y, f"Correo: {store['email']}")
         current_y -= 12
-    c.drawString(text_x_left, current_y, f"Correo: {PANDA_STORE_INFO['email']}")
-    current_y -= 12
-    c.drawString(text_x_left, current_y, f"Telefono: {PANDA_STORE_INFO['phone']}")
-
-    # --- Bloque Derecho ---
-    # X = MARGIN + HALF_WIDTH + GAP
-    # El borde derecho caerá exactamente en (width - MARGIN)
-    right_block_x = MARGIN + HALF_WIDTH + GAP
-    
-    c.setFillColor(COLOR_BG_BLOCK)
-    c.rect(right_block_x, y_blocks - block_height, HALF_WIDTH, block_height, fill=1, stroke=0)
-    
-    text_x_right = right_block_x + 10
-    current_y_right = y_blocks - 20
-    
-    c.setFont("Helvetica-Bold", 11)
-    c.setFillColor(COLOR_ACCENT_TEXT)
-    c.drawString(text_x_right, current_y_right, "Facturado a:")
-    current_y_right -= 20
-    
-    client = invoice_data['client']
-    c.setFont("Helvetica-Bold", 10)
-    c.setFillColor(colors.black)
-    c.drawString(text_x_right, current_y_right, client.get('fullName', 'Cliente General').upper())
-    current_y_right -= 15
-    
-    # Dirección
-    addr = client.get('address', '')
-    p_addr = Paragraph(f"Dirección: {addr}", style_block)
-    # Ancho disponible dentro del bloque = HALF_WIDTH - 20 (padding)
-    w_addr, h_addr = p_addr.wrap(HALF_WIDTH - 20, 1000)
-    p_addr.drawOn(c, text_x_right, current_y_right - h_addr + 2)
-    current_y_right -= (h_addr + 8) 
-    
-    # Teléfono
-    c.setFont("Helvetica", 9)
-    c.setFillColor(COLOR_TEXT)
-    c.drawString(text_x_right, current_y_right, f"{client.get('phone', '')}")
-    current_y_right -= 20 
-    
-    # Transporte
-    if client.get('transportProvider'):
-        c.setFont("Helvetica-Bold", 9)
+        c.drawString(text_x_left, current_y, f"Telefono: {store['phone']}")
+
+        # --- Bloque Derecho (sólo el fondo y el título; los datos del cliente son por factura) ---
+        # X = MARGIN + HALF_WIDTH + GAP
+        # El borde derecho caerá exactamente en (width - MARGIN)
+        right_block_x = MARGIN + HALF_WIDTH + GAP
+
+        c.setFillColor(COLOR_BG_BLOCK)
+        c.rect(right_block_x, y_blocks - block_height, HALF_WIDTH, block_height, fill=1, stroke=0)
+
+        c.setFont("Helvetica-Bold", 11)
+        c.setFillColor(COLOR_ACCENT_TEXT)
+        c.drawString(right_block_x + 10, y_blocks - 20, "Facturado a:")
+
+    def _draw_static_footer(self, c):
+        width = PAGE_WIDTH
+
+        # ==========================================
+        # 5. FOOTER (Alineado a MARGIN)
+        # ==========================================
+        footer_y = 160
+
+        c.setFont("Helvetica-Bold", 11)
+        c.setFillColor(COLOR_ACCENT_TEXT)
+        c.drawString(MARGIN, footer_y, "Pago")
+
+        c.setFont("Helvetica", 8)
         c.setFillColor(COLOR_TEXT)
-        c.drawString(text_x_right, current_y_right, "Proveedor de Transporte:")
-        
-        # Cajita blanca con borde gris claro
-        c.setFillColor(colors.white)
-        c.setStrokeColor(COLOR_BORDER_BOX)
-        c.setLineWidth(1)
-        c.roundRect(text_x_right + 115, current_y_right - 2, 80, 13, 3, fill=1, stroke=1)
-        
+        c.drawString(MARGIN, footer_y - 15, "1. El pago debe realizarse en su totalidad en el momento de la compra, a menos que se haya acordado un plazo de crédito por escrito.")
+        c.drawString(MARGIN, footer_y - 28, "2. Los métodos de pago aceptados son transferencia bancaria, efectivo y pago mediante Tarjeta de Credito/Debito")
+
+        c.setFont("Helvetica-Bold", 11)
+        c.setFillColor(COLOR_ACCENT_TEXT)
+        c.drawString(MARGIN, footer_y - 55, "Garantía")
+
+        c.setFont("Helvetica", 8)
+        c.setFillColor(COLOR_TEXT)
+        c.drawString(MARGIN, footer_y - 70, "1. Los productos vendidos por Panda Store tienen una garantía de [3] meses a partir de la fecha de compra.")
+        c.drawString(MARGIN, footer_y - 83, "2. La garantía cubre defectos de fabricación y no incluye daños causados por mal uso o accidentes.")
+
+        c.setFont("Helvetica", 9)
+        c.setFillColor(colors.HexColor("#8E44AD"))
+        c.drawCentredString(width/2, 40, "Powered By Refrens.com")
+
+        c.setFont("Helvetica", 7)
+        c.setFillColor(colors.grey)
+        c.drawCentredString(width/2, 28, "This is an electronically generated document, no signature is required.")
+
+    # ------------------------------------------
+    # Contenido por factura
+    # ------------------------------------------
+    def draw_invoice(self, c, invoice_data):
+        """
+        Dibuja una factura a partir de la página actual del canvas `c`.
+        La tabla se pagina: cada página lleva el pie y, desde la segunda, un encabezado
+        corto y la fila de títulos repetida. Deja la última página abierta (no llama a
+        showPage) para que el llamador decida si sigue otra factura o guarda.
+        """
+        with metrics.span("pdf.header"):
+            self._define_static_forms(c)
+        with metrics.span("pdf.blocks"):
+            self._draw_first_page(c, invoice_data)
+        page = 1
+
+        # ==========================================
+        # 3. TABLA DE PRODUCTOS (ALINEACIÓN EXACTA)
+        # ==========================================
+        totals = {"amount": 0}
+        rows = self._iter_rows(invoice_data['items'], totals)
+        pending = []
+        top = FIRST_PAGE_TABLE_TOP
+        y_table = top
+
+        while True:
+            # Sólo se arman las filas de una página a la vez (memoria acotada)
+            with metrics.span("pdf.rows"):  # Incluye normalizar las fotos
+                for row in rows:
+                    pending.append(row)
+                    if len(pending) >= ROWS_PER_CHUNK:
+                        break
+            if not pending:
+                break
+
+            with metrics.span("pdf.table_wrap"):
+                # Mismo corte que Table.split: las filas que caben enteras bajo los títulos
+                count, h = 0, self.header_height
+                for row_height, _, _ in pending:
+                    if h + row_height > top - TABLE_BOTTOM:
+                        break
+                    h += row_height
+                    count += 1
+                if not count and top == CONTINUATION_TABLE_TOP:
+                    # Una sola fila más alta que una página entera: se dibuja igual
+                    count = 1
+            if not count:
+                page = self._next_page(c, invoice_data, page)
+                top = y_table = CONTINUATION_TABLE_TOP
+                continue
+
+            # Dibujamos la tabla en MARGIN (40), alineada con los bloques
+            with metrics.span("pdf.table_draw"):
+                y_table = self._draw_table(c, pending[:count], top)
+            del pending[:count]
+
+            # Un bloque completo nunca cabe en una página (ROWS_PER_CHUNK filas de 17pt
+            # superan el alto útil), así que si quedó todo dibujado no hay más filas.
+            if not pending:
+                break
+            page = self._next_page(c, invoice_data, page)
+            top = CONTINUATION_TABLE_TOP
+
+        # ==========================================
+        # 4. NOTAS Y TOTALES
+        # ==========================================
+        with metrics.span("pdf.totals"):
+            p_note = None
+            note_box_height = 0
+            if invoice_data['note']:
+                note_content = invoice_data['note'].replace('\n', '<br/>')
+                p_note = Paragraph(note_content, self.style_desc)
+                # Ancho de la caja de notas = HALF_WIDTH (mitad de la página, alineado al bloque izq)
+                w, h_text = p_note.wrap(HALF_WIDTH - 20, 1000)
+                note_box_height = max(60, h_text + 25)
+
+            # Si notas y totales no caben sobre el pie, pasan a una página nueva
+            y_section = y_table - 20
+            if y_section - max(TOTALS_HEIGHT, note_box_height) < TABLE_BOTTOM:
+                page = self._next_page(c, invoice_data, page)
+                y_section = CONTINUATION_TABLE_TOP
+
+            if p_note is not None:
+                self._draw_note(c, p_note, y_section, note_box_height)
+            self._draw_totals(c, invoice_data, totals["amount"], y_section)
+
+        # ==========================================
+        # 5. FOOTER
+        # ==========================================
+        c.doForm(self.FORM_FOOTER)
+
+    def _draw_first_page(self, c, invoice_data):
+        width, height = PAGE_WIDTH, PAGE_HEIGHT
+        c.doForm(self.FORM_HEADER)
+
+        # ==========================================
+        # 1. ENCABEZADO
+        # ==========================================
+        c.setFont("Helvetica", 10)
+        c.setFillColor(colors.black)
+        # Alineamos los valores un poco más a la derecha pero consistentes
+        c.drawString(MARGIN + 80, height - 80, f"{invoice_data['number']}")
+        c.drawString(MARGIN + 80, height - 95, f"{invoice_data['date']}")
+
+        # ==========================================
+        # 2. BLOQUES DE INFORMACIÓN (ALINEADOS)
+        # ==========================================
+        y_blocks = height - 130
+
+        # --- Bloque Derecho ---
+        right_block_x = MARGIN + HALF_WIDTH + GAP
+        text_x_right = right_block_x + 10
+        current_y_right = y_blocks - 40
+
+        client = invoice_data['client']
+        c.setFont("Helvetica-Bold", 10)
         c.setFillColor(colors.black)
+        c.drawString(text_x_right, current_y_right, client.get('fullName', 'Cliente General').upper())
+        current_y_right -= 15
+
+        # Dirección
+        addr = client.get('address', '')
+        p_addr = Paragraph(f"Dirección: {addr}", self.style_block)
+        # Ancho disponible dentro del bloque = HALF_WIDTH - 20 (padding)
+        w_addr, h_addr = p_addr.wrap(HALF_WIDTH - 20, 1000)
+        p_addr.drawOn(c, text_x_right, current_y_right - h_addr + 2)
+        current_y_right -= (h_addr + 8)
+
+        # Teléfono
         c.setFont("Helvetica", 9)
-        c.drawCentredString(text_x_right + 155, current_y_right + 1, client.get('transportProvider'))
-
-    # ==========================================
-    # 3. TABLA DE PRODUCTOS (ALINEACIÓN EXACTA)
-    # ==========================================
-    headers = ['Artículo', 'Cantidad', 'Monto', 'Dolares', 'Total']
-    table_data = [headers]
-    
-    total_amount = 0
-    
-    for item in invoice_data['items']:
-        sub = item['priceCordobas'] * item['quantity']
-        total_amount += sub
-        
-        desc_paragraph = Paragraph(f"<b>{item['product']['description']}</b>", style_desc)
-        cell_content = [desc_paragraph]
-        
-        if item.get('custom_image_data'):
-            try:
-                img_stream = io.BytesIO(item['custom_image_data'])
-                img = PlatypusImage(img_stream)
-                max_height = 45
-                aspect = img.imageWidth / img.imageHeight
-                img.drawHeight = max_height
-                img.drawWidth = max_height * aspect
-                cell_content.append(img)
-            except:
-                pass
-        
-        table_data.append([
-            cell_content,
-            str(item['quantity']),
-            f"C$ {item['priceCordobas']:,.2f}",
-            f"$ {item['priceDollars']:,.2f}",
-            f"C$ {sub:,.2f}"
-        ])
+        c.setFillColor(COLOR_TEXT)
+        c.drawString(text_x_right, current_y_right, f"{client.get('phone', '')}")
+        current_y_right -= 20
+
+        # Transporte
+        if client.get('transportProvider'):
+            c.setFont("Helvetica-Bold", 9)
+            c.setFillColor(COLOR_TEXT)
+            c.drawString(text_x_right, current_y_right, "Proveedor de Transporte:")
+
+            # Cajita blanca con borde gris claro
+            c.setFillColor(colors.white)
+            c.setStrokeColor(COLOR_BORDER_BOX)
+            c.setLineWidth(1)
+            c.roundRect(text_x_right + 115, current_y_right - 2, 80, 13, 3, fill=1, stroke=1)
+
+            c.setFillColor(colors.black)
+            c.setFont("Helvetica", 9)
+            c.drawCentredString(text_x_right + 155, current_y_right + 1, client.get('transportProvider'))
+
+    def _next_page(self, c, invoice_data, page):
+        """Cierra la página actual (con su pie) y abre la siguiente con un encabezado corto."""
+        c.doForm(self.FORM_FOOTER)
+        c.showPage()
+        page += 1
+
+        width, height = PAGE_WIDTH, PAGE_HEIGHT
+        c.setFont("Helvetica-Bold", 10)
+        c.setFillColor(COLOR_PRIMARY)
+        c.drawString(MARGIN, height - 50, f"Factura No # {invoice_data['number']}")
+        c.setFont("Helvetica", 9)
+        c.setFillColor(COLOR_TEXT)
+        c.drawRightString(width - MARGIN, height - 50, f"Página {page}")
+        c.setStrokeColor(COLOR_GRAY_LIGHT)
+        c.setLineWidth(0.5)
+        c.line(MARGIN, height - 58, width - MARGIN, height - 58)
+        return page
+
+    def _iter_rows(self, items, totals):
+        """
+        Genera las filas de la tabla una a una, acumulando el monto en `totals`.
+        Cada fila es (alto, tabla, celdas): las filas simples (sin foto y con la
+        descripción en una línea) no arman nada de Platypus y tabla es None; las demás
+        traen su tabla de una fila ya medida.
+        """
+        style_desc = self.style_desc
+        for item in items:
+            sub = item['priceCordobas'] * item['quantity']
+            totals["amount"] += sub
+
+            description = item['product']['description']
+            cells = [
+                description,
+                str(item['quantity']),
+                f"C$ {item['priceCordobas']:,.2f}",
+                f"$ {item['priceDollars']:,.2f}",
+                f"C$ {sub:,.2f}"
+            ]
+            has_image = item.get('custom_image_data') or item.get('custom_image_ref')
+            if not has_image and self._is_plain(description):
+                yield self.plain_row_height, None, cells
+                continue
+
+            desc_paragraph = Paragraph(f"<b>{description}</b>", style_desc)
+            cell_content = [desc_paragraph]
 
-    # DEFINICIÓN DE ANCHOS DE COLUMNA PARA QUE SUMEN EXACTAMENTE 'CONTENT_WIDTH'
-    # CONTENT_WIDTH es aprox 515 pts.
-    # 225 + 50 + 80 + 70 + 90 = 515. ¡Exacto!
-    col_widths = [225, 50, 80, 70, 90] # Ajustado para cuadrar con los márgenes
-    
-    table = Table(table_data, colWidths=col_widths)
-    
-    style = TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), COLOR_PRIMARY),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,0), 'LEFT'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 10),
-        ('BOTTOMPADDING', (0,0), (-1,0), 8),
-        ('TOPPADDING', (0,0), (-1,0), 8),
-        ('LEFTPADDING', (0,0), (-1,0), 10),
-        
-        ('ALIGN', (1,1), (-1,-1), 'CENTER'),
-        ('ALIGN', (2,1), (-1,-1), 'RIGHT'),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('TEXTCOLOR', (0,1), (-1,-1), COLOR_TEXT),
-        ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
-        ('FONTSIZE', (0,1), (-1,-1), 9),
-        ('LINEBELOW', (0,0), (-1,-1), 0.5, COLOR_GRAY_LIGHT),
-    ])
-    table.setStyle(style)
-    
-    table.wrapOn(c, width, height)
-    table_height = table._height
-    y_table = y_blocks - block_height - 40 - table_height
-    
-    # Dibujamos la tabla en MARGIN (40), alineada con los bloques
-    table.drawOn(c, MARGIN, y_table)
-
-    # ==========================================
-    # 4. NOTAS Y TOTALES
-    # ==========================================
-    y_section = y_table - 20
-    
-    # --- Nota (Alineada a la Izquierda - MARGIN) ---
-    if invoice_data['note']:
-        note_content = invoice_data['note'].replace('\n', '<br/>')
-        p_note = Paragraph(note_content, style_desc)
-        
-        # Ancho de la caja de notas = HALF_WIDTH (mitad de la página, alineado al bloque izq)
+            if has_image:
+                try:
+                    max_height = 45
+                    # Foto normalizada a la caja de la celda: sin metadatos y a la resolución de impresión
+                    # (bytes del item o blob del almacén, ver blob_store.item_image)
+                    image_data, image_key = item_image(item)
+                    norm = normalize_image(image_data, IMAGE_MAX_WIDTH, max_height, key=image_key)
+                    aspect = norm.width / norm.height
+                    draw_h = min(max_height, IMAGE_MAX_WIDTH / aspect)
+                    img = PlatypusImage(io.BytesIO(norm.data), width=draw_h * aspect, height=draw_h)
+                    cell_content.append(img)
+                except Exception as e:
+                    # La fila sale sin foto, pero que quede registro de por qué
+                    print(f"⚠️ Foto omitida en '{description}': {e}")
+
+            table = Table([[cell_content] + cells[1:]], colWidths=COL_WIDTHS, style=self.row_style)
+            w, h = table.wrap(CONTENT_WIDTH, PAGE_HEIGHT)
+            yield h, table, cells
+
+    @staticmethod
+    def _is_plain(description):
+        """La descripción se puede dibujar directo: cabe en una línea y el Paragraph no la cambiaría."""
+        if not description or "<" in description or ">" in description or "&" in description:
+            return False  # Marcado (o entidades) que interpretaría el Paragraph
+        if " ".join(description.split()) != description:
+            return False  # El Paragraph colapsa los espacios
+        max_width = COL_WIDTHS[0] - 2 * CELL_PADDING
+        return _FONT_BODY_BOLD.stringWidth(description, BODY_FONT_SIZE) < max_width
+
+    def _draw_table(self, c, rows, top):
+        """
+        Dibuja los títulos y `rows` (ver _iter_rows) desde `top` hacia abajo y retorna
+        el borde inferior de la tabla. Reproduce lo que haría Table.drawOn con
+        table_style: mismas posiciones y la misma aritmética, para que el PDF se vea
+        idéntico (el orden del texto extraído sí cambia: montos antes que descripciones).
+        Las filas simples van directo al canvas sin armar Paragraph ni Table; las demás
+        dibujan su tabla de una fila con drawOn en la posición que les toca.
+        """
+        heights = [self.header_height] + [row[0] for row in rows]
+        positions = _row_positions(heights)
+        y_table = top - positions[0]
+
+        c.saveState()
+        c.translate(MARGIN, y_table)
+        c.setFillColor(COLOR_PRIMARY)
+        c.rect(0, positions[0], COL_POSITIONS[-1], positions[1] - positions[0], fill=1, stroke=0)
+
+        text = c.beginText()
+        text.setFont("Helvetica-Bold", HEADER_FONT_SIZE)
+        text.setFillColor(colors.white)
+        baseline = positions[1] + heights[0] - HEADER_TOP_PADDING - HEADER_FONT_SIZE
+        for title, col in zip(TABLE_HEADERS, COL_POSITIONS):
+            text.setTextOrigin(col + HEADER_PADDING, baseline)
+            text.textOut(title)
+
+        plain = []
+        lines = [positions[1]]  # Bajo los títulos y bajo cada fila simple
+        for (row_height, table, cells), row_bottom in zip(rows, positions[2:]):
+            if table is None:
+                plain.append((row_bottom + row_height - CELL_TOP_PADDING, cells))
+                lines.append(row_bottom)
+            else:
+                # Tabla de una fila: se dibuja entera (con su LINEBELOW) donde le toca
+                table.drawOn(c, 0, row_bottom)
+
+        # Números de todas las filas simples en el mismo objeto de texto que los títulos
+        text.setFont("Helvetica", BODY_FONT_SIZE)
+        text.setFillColor(COLOR_TEXT)
+        center = COL_POSITIONS[1] + COL_WIDTHS[1] * 0.5
+        for top, cells in plain:
+            baseline = top - BODY_FONT_SIZE
+            text.setTextOrigin(center - _FONT_BODY.stringWidth(cells[1], BODY_FONT_SIZE) * 0.5, baseline)
+            text.textOut(cells[1])
+            for col in (2, 3, 4):
+                x = COL_POSITIONS[col] + COL_WIDTHS[col] - CELL_PADDING
+                text.setTextOrigin(x - _FONT_BODY.stringWidth(cells[col], BODY_FONT_SIZE), baseline)
+                text.textOut(cells[col])
+        c.drawText(text)
+
+        # Descripciones como las dibuja el Paragraph de una línea (origen en su borde
+        # inferior, texto a leading - fontSize): la misma transformación da el mismo raster
+        c.setFont("Helvetica-Bold", BODY_FONT_SIZE, DESC_LEADING)
+        c.setFillColor(COLOR_TEXT)
+        for top, cells in plain:
+            c.saveState()
+            c.translate(CELL_PADDING, top - DESC_LEADING)
+            c.drawString(0, DESC_LEADING - BODY_FONT_SIZE, cells[0])
+            c.restoreState()
+
+        # LINEBELOW de los títulos y de las filas simples, encima de las celdas
+        c.setLineCap(1)
+        c.setLineJoin(1)
+        c.setStrokeColor(COLOR_GRAY_LIGHT)
+        c.setLineWidth(0.5)
+        path = c.beginPath()
+        for line_y in lines:
+            path.moveTo(0, line_y)
+            path.lineTo(COL_POSITIONS[-1], line_y)
+        c.drawPath(path, stroke=1, fill=0)
+        c.restoreState()
+        return y_table
+
+    def _draw_note(self, c, p_note, y_section, box_height):
+        # --- Nota (Alineada a la Izquierda - MARGIN) ---
         note_box_width = HALF_WIDTH
-        w, h_text = p_note.wrap(note_box_width - 20, 1000)
-        
-        box_height = h_text + 25 
-        if box_height < 60: box_height = 60 
-        
+
         c.setFillColor(colors.HexColor("#f9f9f9"))
         c.setStrokeColor(colors.transparent)
         box_y_start = y_section - box_height
-        
+
         # Dibujar en MARGIN
         c.rect(MARGIN, box_y_start, note_box_width, box_height, fill=1, stroke=0)
-        
+
         c.setFillColor(colors.darkgrey)
         c.setFont("Helvetica-Bold", 8)
         c.drawString(MARGIN + 10, box_y_start + box_height - 12, "Nota")
-        
+
         p_note.drawOn(c, MARGIN + 10, box_y_start + 8)
 
-    # --- Totales (Alineados a la Derecha - width - MARGIN) ---
-    final_shipping = invoice_data['shippingCost']
-    final_discount = invoice_data['discount']
-    grand_total = total_amount + final_shipping - final_discount
-    
-    # Coordenadas alineadas a la derecha
-    x_val = width - MARGIN      # Borde derecho exacto
-    x_lbl = width - MARGIN - 100 # Etiquetas 100pts a la izquierda
-    current_y_total = y_section - 10
-    
-    c.setFont("Helvetica", 10)
-    c.setFillColor(COLOR_TEXT)
-    
-    c.drawRightString(x_lbl, current_y_total, "Monto")
-    c.drawRightString(x_val, current_y_total, f"C$ {total_amount:,.2f}")
-    current_y_total -= 18
-    
-    c.drawRightString(x_lbl, current_y_total, "Delivery")
-    c.drawRightString(x_val, current_y_total, f"C$ {final_shipping:,.2f}")
-    current_y_total -= 18
-    
-    c.setFillColor(colors.red)
-    c.drawRightString(x_lbl, current_y_total, "Descuentos")
-    c.drawRightString(x_val, current_y_total, f"C$ {final_discount:,.2f}")
-    current_y_total -= 25
-    
-    c.setStrokeColor(colors.black)
-    c.setLineWidth(1)
-    # Línea de total alineada
-    c.line(x_lbl - 20, current_y_total + 15, x_val, current_y_total + 15)
-    
-    c.setFillColor(colors.black)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawRightString(x_lbl, current_y_total, "Total (C$)")
-    c.drawRightString(x_val, current_y_total, f"C$ {grand_total:,.2f}")
-
-    # ==========================================
-    # 5. FOOTER (Alineado a MARGIN)
-    # ==========================================
-    footer_y = 160
-    
-    c.setFont("Helvetica-Bold", 11)
-    c.setFillColor(COLOR_ACCENT_TEXT)
-    c.drawString(MARGIN, footer_y, "Pago")
-    
-    c.setFont("Helvetica", 8)
-    c.setFillColor(COLOR_TEXT)
-    c.drawString(MARGIN, footer_y - 15, "1. El pago debe realizarse en su totalidad en el momento de la compra, a menos que se haya acordado un plazo de crédito por escrito.")
-    c.drawString(MARGIN, footer_y - 28, "2. Los métodos de pago aceptados son transferencia bancaria, efectivo y pago mediante Tarjeta de Credito/Debito")
-
-    c.setFont("Helvetica-Bold", 11)
-    c.setFillColor(COLOR_ACCENT_TEXT)
-    c.drawString(MARGIN, footer_y - 55, "Garantía")
-    
-    c.setFont("Helvetica", 8)
-    c.setFillColor(COLOR_TEXT)
-    c.drawString(MARGIN, footer_y - 70, "1. Los productos vendidos por Panda Store tienen una garantía de [3] meses a partir de la fecha de compra.")
-    c.drawString(MARGIN, footer_y - 83, "2. La garantía cubre defectos de fabricación y no incluye daños causados por mal uso o accidentes.")
-
-    c.setFont("Helvetica", 9)
-    c.setFillColor(colors.HexColor("#8E44AD"))
-    c.drawCentredString(width/2, 40, "Powered By Refrens.com")
-    
-    c.setFont("Helvetica", 7)
-    c.setFillColor(colors.grey)
-    c.drawCentredString(width/2, 28, "This is an electronically generated document, no signature is required.")
-
-    c.save()
\ No newline at end of file
+    def _draw_totals(self, c, invoice_data, total_amount, y_section):
+        # --- Totales (Alineados a la Derecha - width - MARGIN) ---
+        width = PAGE_WIDTH
+        final_shipping = invoice_data['shippingCost']
+        final_discount = invoice_data['discount']
+        grand_total = total_amount + final_shipping - final_discount
+
+        # Coordenadas alineadas a la derecha
+        x_val = width - MARGIN      # Borde derecho exacto
+        x_lbl = width - MARGIN - 100 # Etiquetas 100pts a la izquierda
+        current_y_total = y_section - 10
+
+        c.setFont("Helvetica", 10)
+        c.setFillColor(COLOR_TEXT)
+
+        c.drawRightString(x_lbl, current_y_total, "Monto")
+        c.drawRightString(x_val, current_y_total, f"C$ {total_amount:,.2f}")
+        current_y_total -= 18
+
+        c.drawRightString(x_lbl, current_y_total, "Delivery")
+        c.drawRightString(x_val, current_y_total, f"C$ {final_shipping:,.2f}")
+        current_y_total -= 18
+
+        c.setFillColor(colors.red)
+        c.drawRightString(x_lbl, current_y_total, "Descuentos")
+        c.drawRightString(x_val, current_y_total, f"C$ {final_discount:,.2f}")
+        current_y_total -= 25
+
+        c.setStrokeColor(colors.black)
+        c.setLineWidth(1)
+        # Línea de total alineada
+        c.line(x_lbl - 20, current_y_total + 15, x_val, current_y_total + 15)
+
+        c.setFillColor(colors.black)
+        c.setFont("Helvetica-Bold", 12)
+        c.drawRightString(x_lbl, current_y_total, "Total (C$)")
+        c.drawRightString(x_val, current_y_total, f"C$ {grand_total:,.2f}")
+
+    def render(self, invoice_data, output):
+        """Renderiza la factura en `output` (ruta o stream binario con .write())."""
+        with metrics.span("pdf.render"):
+            c = canvas.Canvas(output, pagesize=A4)
+            self.draw_invoice(c, invoice_data)
+            with metrics.span("pdf.save"):
+                c.save()
+
+    def render_many(self, invoices, output):
+        """
+        Renderiza varias facturas en un solo PDF (`output`: ruta o stream binario).
+        Los forms fijos y el logo se escriben una vez para todo el documento, igual que
+        las fotos repetidas; cada página se escribe en `output` apenas se cierra, así que
+        `invoices` puede ser un generador y la memoria no crece con el largo de la corrida.
+        Retorna la cantidad de facturas.
+        """
+        count = 0
+        with metrics.span("pdf.render_many"):
+            c = canvas.Canvas(output, pagesize=A4)
+            writer = PDFStreamWriter(c, output)
+
+            def flush_page(page_number):
+                with metrics.span("pdf.flush"):
+                    writer.flush()
+
+            c.setPageCallBack(flush_page)
+            for invoice_data in invoices:
+                if count:
+                    c.showPage()
+                self.draw_invoice(c, invoice_data)
+                count += 1
+            with metrics.span("pdf.save"):
+                writer.finish()
+        return count
+
+    def render_bytes(self, invoice_data):
+        """Renderiza la factura en memoria y retorna los bytes del PDF."""
+        buffer = io.BytesIO()
+        self.render(invoice_data, buffer)
+        return buffer.getvalue()
+
+
+def get_renderer(logo_bytes=None):
+    """Retorna un InvoiceRenderer ya construido para este logo (se crea una vez por proceso)."""
+    key = content_hash(logo_bytes) if logo_bytes else None
+    renderer = _renderers.get(key)
+    if renderer is None:
+        renderer = InvoiceRenderer(PANDA_STORE_INFO, logo_bytes=logo_bytes)
+        _renderers.put(key, renderer)
+    return renderer
+
+def render_pdf_bytes(invoice_data, logo_bytes=None):
+    """Renderiza la factura completamente en memoria y retorna los bytes del PDF."""
+    return get_renderer(logo_bytes).render_bytes(invoice_data)
+
+class _ChunkSink:
+    """Stream de escritura que pasa el PDF en bloques de `chunk_size` a una cola acotada."""
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(PDF_CHUNK_QUEUE)
+        self.cancelled = threading.Event()
+        self._buffer = bytearray()
+
+    def put(self, item):
+        """Encola `item` esperando lugar; retorna False si el consumidor ya no lee."""
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            chunk = bytes(self._buffer[:self.chunk_size])
+            del self._buffer[:self.chunk_size]
+            if not self.put(chunk):
+                raise _RenderCancelled()
+
+    def flush(self):
+        # PDFStreamWriter.finish lo llama al final: sale el último bloque, aunque sea corto
+        if self._buffer:
+            chunk, self._buffer = bytes(self._buffer), bytearray()
+            if not self.put(chunk):
+                raise _RenderCancelled()
+
+
+class _RenderCancelled(Exception):
+    pass
+
+
+_CHUNKS_DONE = object()
+
+
+def iter_pdf_chunks(invoice_data, logo_bytes=None, chunk_size=PDF_CHUNK_SIZE):
+    """
+    Entrega el PDF de la factura en bloques mientras se renderiza (para respuestas en
+    streaming): cada página sale por PDFStreamWriter apenas se cierra, así el primer
+    bloque llega antes de que termine el render y nunca está el PDF entero en memoria.
+    El render corre en un hilo aparte; si el consumidor deja de leer, se cancela.
+    """
+    renderer = get_renderer(logo_bytes)
+    sink = _ChunkSink(chunk_size)
+
+    def produce():
+        try:
+            renderer.render_many([invoice_data], sink)
+            sink.put(_CHUNKS_DONE)
+        except _RenderCancelled:
+            pass
+        except Exception as e:
+            sink.put(e)
+
+    threading.Thread(target=produce, name="pdf-chunks", daemon=True).start()
+    try:
+        while True:
+            item = sink.chunks.get()
+            if item is _CHUNKS_DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        sink.cancelled.set()
+
+def generate_pdf_file(invoice_data, filename, logo_bytes=None):
+    """
+    Dibuja la factura en `filename`, que puede ser una ruta o cualquier
+    stream binario con .write() (por ejemplo io.BytesIO).
+    """
+    get_renderer(logo_bytes).render(invoice_data, filename)
+
+def generate_combined_pdf_file(invoices, filename, logo_bytes=None):
+    """
+    Dibuja todas las facturas de `invoices` en un solo PDF de varias páginas
+    (por ejemplo, la corrida de impresión del día). Retorna la cantidad de facturas.
+    """
+    return get_renderer(logo_bytes).render_many(invoices, filename)
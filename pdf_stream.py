@@ -0,0 +1,124 @@
+"""
+Escritura incremental de un documento de ReportLab.
+
+ReportLab guarda todas las páginas en memoria y escribe el PDF completo en
+canvas.save(). Para corridas largas (todas las facturas del día en un solo PDF)
+PDFStreamWriter escribe las páginas terminadas, sus imágenes y sus forms apenas se
+cierran, y los reemplaza por un marcador liviano: la memoria queda acotada a la
+página en curso (más unos pocos bytes de índice por objeto). Los objetos que
+cambian hasta el final (catálogo, árbol de páginas, diccionario de fuentes, info)
+se escriben en finish(), junto con la tabla xref.
+
+    c = canvas.Canvas("salida.pdf", pagesize=A4)   # No se llama a c.save()
+    writer = PDFStreamWriter(c, "salida.pdf")
+    ...dibujar, c.showPage(), writer.flush()...
+    writer.finish()
+
+Usa la API interna de pdfdoc de ReportLab (probado con 4.4).
+"""
+from reportlab.pdfbase import pdfdoc
+
+# Objetos que no cambian una vez registrados en el documento
+_FLUSHABLE = (pdfdoc.PDFPage, pdfdoc.PDFStream, pdfdoc.PDFFormXObject, pdfdoc.PDFImageXObject)
+
+
+class _Written(pdfdoc.PDFObject):
+    """Ocupa el lugar de un objeto ya escrito: conserva el nombre (hasForm, referencias)."""
+
+    def format(self, document):
+        raise RuntimeError("El objeto ya se escribió en el PDF")
+
+
+_WRITTEN = _Written()
+
+
+class _WrittenImage(_Written):
+    """Imagen ya escrita: canvas.drawImage lee su tamaño cada vez que se reutiliza."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+
+class PDFStreamWriter:
+    def __init__(self, c, output):
+        self.canvas = c
+        self.doc = c._doc
+        if hasattr(output, "write"):
+            self._file, self._owns_file = output, False
+        else:
+            self._file, self._owns_file = open(output, "wb"), True
+        self.offset = 0
+        self._offsets = {}     # id interno -> posición en el archivo
+        self._next_number = 1  # Primer número de objeto sin revisar
+        self._pages_done = 0   # Páginas del árbol ya reemplazadas por referencias
+        self.doc.encrypt.prepare(self.doc)
+        self._emit(pdfdoc.PDFFile(self.doc._pdfVersion).format(self.doc))
+
+    def _emit(self, data):
+        self._file.write(data)
+        self.offset += len(data)
+
+    def _write_object(self, oid):
+        doc = self.doc
+        self._offsets[oid] = self.offset
+        obj = doc.idToObject[oid]
+        self._emit(pdfdoc.PDFIndirectObject(oid, obj).format(doc))
+        if isinstance(obj, pdfdoc.PDFImageXObject):
+            doc.idToObject[oid] = _WrittenImage(obj.width, obj.height)
+        else:
+            doc.idToObject[oid] = _WRITTEN
+
+    def flush(self):
+        """Escribe las páginas cerradas (después de showPage) y lo que sólo ellas usan."""
+        doc = self.doc
+        # Formatear una página registra su stream de contenido: el while lo alcanza
+        while self._next_number <= len(doc.numberToId):
+            oid = doc.numberToId[self._next_number]
+            if isinstance(doc.idToObject[oid], _FLUSHABLE):
+                self._write_object(oid)
+            self._next_number += 1
+
+        pages = doc.Pages.pages
+        for i in range(self._pages_done, len(pages)):
+            pages[i] = pdfdoc.PDFObjectReference(pages[i].__InternalName__)
+        self._pages_done = len(pages)
+
+    def finish(self):
+        """Escribe lo pendiente, la tabla xref y el trailer. El canvas no se puede seguir usando."""
+        c, doc = self.canvas, self.doc
+        if len(c._code):
+            c.showPage()
+        self.flush()
+
+        # Lo mismo que PDFDocument.GetPDFData antes de formatear
+        for font in doc.delayedFonts:
+            font.addObjects(doc)
+        doc.info.invariant = doc.invariant
+        doc.info.digest(doc.signature)
+        catalog = doc.Reference(doc.Catalog)
+        info = doc.Reference(doc.info)
+        doc.Outlines.prepare(doc, c)
+        if doc.Outlines.ready < 0:
+            doc.Catalog.Outlines = None
+
+        number = 1
+        while number <= len(doc.numberToId):
+            oid = doc.numberToId[number]
+            if oid not in self._offsets:
+                self._write_object(oid)
+            number += 1
+
+        ids = [doc.numberToId[n] for n in range(1, len(doc.numberToId) + 1)]
+        doc.idToOffset.update(self._offsets)
+        xref = pdfdoc.PDFCrossReferenceTable()
+        xref.addsection(0, ids)
+        start_xref = self.offset
+        self._emit(xref.format(doc))
+        trailer = pdfdoc.PDFTrailer(startxref=start_xref, Size=len(ids) + 1, Root=catalog, Info=info, ID=doc.ID())
+        self._emit(trailer.format(doc))
+
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
@@ -0,0 +1,144 @@
+"""
+Pre-renderizado especulativo del PDF mientras se edita la factura.
+
+La interfaz llama a schedule() cada vez que cambia el estado (items, cliente,
+totales); tras PRERENDER_DEBOUNCE_MS sin cambios la factura se renderiza en un hilo
+de fondo con render_pdf_cached. Al hacer clic en "Generar PDF", result() entrega los
+bytes ya listos. Todo pasa por render_key (hash exacto de la factura y el logo), así
+que nunca se sirve el PDF de un estado anterior: si no coincide, se renderiza ahí.
+
+Un estado nuevo reemplaza al pendiente, que no llega a renderizarse. Un render ya
+en curso no se puede interrumpir (ReportLab no tiene puntos de corte): termina y queda
+en la caché con su propia clave, y el estado nuevo espera a que libere el lugar. Así
+cada sesión tiene a lo sumo un render en curso y uno pendiente.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from render_cache import render_key, render_pdf_cached, is_cached
+
+PRERENDER_DEBOUNCE_MS = int(os.getenv("PRERENDER_DEBOUNCE_MS", "400"))
+PRERENDER_WORKERS = int(os.getenv("PRERENDER_WORKERS", "2"))
+
+
+def _snapshot(invoice_data):
+    """Copia de lo que la interfaz sigue modificando en su lugar (lista de items, cliente)."""
+    data = dict(invoice_data)
+    data["client"] = dict(invoice_data.get("client") or {})
+    data["items"] = [dict(item) for item in invoice_data.get("items", [])]
+    return data
+
+
+class _Job:
+    def __init__(self, key, invoice_data, logo_bytes, due):
+        self.key = key
+        self.invoice_data = invoice_data
+        self.logo_bytes = logo_bytes
+        self.due = due
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Prerenderer:
+    def __init__(self, workers=PRERENDER_WORKERS, debounce=PRERENDER_DEBOUNCE_MS / 1000):
+        self.debounce = debounce
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prerender")
+        self._cond = threading.Condition()
+        self._pending = {}  # sesión -> _Job esperando el debounce
+        self._running = {}  # sesión -> _Job en el pool
+        threading.Thread(target=self._dispatch, name="prerender-dispatch", daemon=True).start()
+
+    def schedule(self, owner, invoice_data, logo_bytes=None):
+        """Programa el render de este estado para la sesión `owner`. Retorna su clave."""
+        invoice_data = _snapshot(invoice_data)
+        key = render_key(invoice_data, logo_bytes)
+        with self._cond:
+            running = self._running.get(owner)
+            pending = self._pending.get(owner)
+            if (running is not None and running.key == key) or (pending is not None and pending.key == key):
+                return key
+            if pending is not None:
+                del self._pending[owner]
+                metrics.inc("prerender.superseded")
+            if is_cached(key):
+                return key
+            self._pending[owner] = _Job(key, invoice_data, logo_bytes, time.monotonic() + self.debounce)
+            metrics.inc("prerender.scheduled")
+            self._cond.notify()
+        return key
+
+    def result(self, owner, invoice_data, logo_bytes=None, timeout=None):
+        """
+        PDF de exactamente esta factura. Usa el pre-render si ya terminó o si está en
+        curso (espera hasta `timeout`); si no, renderiza en el hilo que llama.
+        """
+        key = render_key(invoice_data, logo_bytes)
+        job = None
+        with self._cond:
+            running = self._running.get(owner)
+            pending = self._pending.pop(owner, None)
+            if running is not None and running.key == key:
+                job = running
+            elif pending is not None and pending.key == key and running is None:
+                # Se necesita ya: no se espera el debounce
+                job = pending
+                self._start(owner, job)
+            elif pending is not None:
+                metrics.inc("prerender.superseded")
+
+        if job is not None and job.done.wait(timeout) and job.error is None:
+            metrics.inc("prerender.result", outcome="waited")
+            return job.result
+        metrics.inc("prerender.result", outcome="ready" if is_cached(key) else "miss")
+        return render_pdf_cached(invoice_data, logo_bytes=logo_bytes)
+
+    def _start(self, owner, job):
+        # Con self._cond tomado
+        self._running[owner] = job
+        self._pool.submit(self._run, owner, job)
+
+    def _run(self, owner, job):
+        try:
+            with metrics.span("prerender.render"):
+                job.result = render_pdf_cached(job.invoice_data, logo_bytes=job.logo_bytes)
+        except Exception as e:
+            job.error = e
+            print(f"⚠️ Falló el pre-render de la factura {job.invoice_data.get('number')}: {e}")
+        finally:
+            job.invoice_data = job.logo_bytes = None
+            job.done.set()
+            with self._cond:
+                if self._running.get(owner) is job:
+                    del self._running[owner]
+                self._cond.notify()
+
+    def _dispatch(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = None
+                for owner, job in list(self._pending.items()):
+                    if owner in self._running:
+                        continue  # Espera a que termine el render anterior de la sesión
+                    if job.due <= now:
+                        del self._pending[owner]
+                        self._start(owner, job)
+                    else:
+                        wait = job.due - now if wait is None else min(wait, job.due - now)
+                self._cond.wait(wait)
+
+
+_prerenderer = None
+_prerenderer_lock = threading.Lock()
+
+
+def get_prerenderer():
+    """Pre-renderizador compartido por el proceso (todas las sesiones de Streamlit)."""
+    global _prerenderer
+    with _prerenderer_lock:
+        if _prerenderer is None:
+            _prerenderer = Prerenderer()
+        return _prerenderer
@@ -0,0 +1,169 @@
+"""
+Caché de PDFs ya renderizados, direccionada por contenido.
+
+La clave es un hash canónico de `invoice_data` (las fotos se representan por su
+hash), del logo y de la versión del renderizador; si nada cambió, el PDF se sirve
+sin volver a dibujarlo. Nivel 1 en memoria (LRU acotada por bytes) y nivel 2
+opcional en disco (RENDER_CACHE_DIR).
+"""
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from lru import LRUCache
+
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR") or None
+RENDER_CACHE_DISK_MAX_BYTES = int(os.getenv("RENDER_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Cada cuántas escrituras en disco se revisa el tamaño total del directorio
+_PRUNE_EVERY = 32
+
+_memory = LRUCache(max_bytes=RENDER_CACHE_MAX_BYTES)
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+_disk_writes = 0
+
+
+def _canonical(value):
+    """Convierte invoice_data a una estructura JSON estable (bytes -> hash)."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def render_key(invoice_data, logo_bytes=None):
+    """Clave de caché: hash de los datos de la factura, el logo y la versión del renderizador."""
+    from pdf_generator import RENDERER_VERSION
+
+    payload = json.dumps(
+        {
+            "renderer": RENDERER_VERSION,
+            "logo": hashlib.sha256(logo_bytes).hexdigest() if logo_bytes else None,
+            "invoice": _canonical(invoice_data),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _disk_path(key):
+    return os.path.join(RENDER_CACHE_DIR, key[:2], f"{key}.pdf")
+
+
+def _disk_get(key):
+    path = _disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # Marca de uso para prune_disk (atime no es confiable)
+        return data
+    except OSError:
+        return None
+
+
+def _disk_put(key, pdf_bytes):
+    global _disk_writes
+    path = _disk_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: otro proceso nunca ve un PDF a medio escribir
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el PDF en la caché de disco: {e}")
+        return
+    with _stats_lock:
+        _disk_writes += 1
+        prune = _disk_writes % _PRUNE_EVERY == 0
+    if prune:
+        prune_disk()
+
+
+def prune_disk(max_bytes=None):
+    """Borra los PDFs menos usados del disco hasta quedar bajo `max_bytes`."""
+    if not RENDER_CACHE_DIR:
+        return
+    max_bytes = RENDER_CACHE_DISK_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for root, _, files in os.walk(RENDER_CACHE_DIR):
+        for name in files:
+            if name.endswith(".pdf"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def get_cached(key):
+    """PDF en caché para la clave (memoria y luego disco) o None."""
+    pdf_bytes = _memory.get(key)
+    if pdf_bytes is not None:
+        _count("hits")
+        return pdf_bytes
+    if RENDER_CACHE_DIR:
+        pdf_bytes = _disk_get(key)
+        if pdf_bytes is not None:
+            _memory.put(key, pdf_bytes)
+            _count("hits")
+            _count("disk_hits")
+            return pdf_bytes
+    _count("misses")
+    return None
+
+
+def is_cached(key):
+    """True si el PDF ya está en memoria (no cuenta como acierto ni fallo)."""
+    return key in _memory
+
+
+def put_cached(key, pdf_bytes):
+    _memory.put(key, pdf_bytes)
+    if RENDER_CACHE_DIR:
+        _disk_put(key, pdf_bytes)
+
+
+def render_pdf_cached(invoice_data, logo_bytes=None):
+    """Como pdf_generator.render_pdf_bytes, pero sirve desde la caché si la factura no cambió."""
+    key = render_key(invoice_data, logo_bytes)
+    pdf_bytes = get_cached(key)
+    if pdf_bytes is None:
+        from pdf_generator import render_pdf_bytes
+
+        pdf_bytes = render_pdf_bytes(invoice_data, logo_bytes=logo_bytes)
+        put_cached(key, pdf_bytes)
+    return pdf_bytes
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update(entries=len(_memory), bytes=_memory.total_bytes)
+    return stats
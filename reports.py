@@ -0,0 +1,188 @@
+"""
+Reportes de ventas sobre el archivo Parquet (ver sales_archive.py).
+
+Las agregaciones corren en Arrow (vectorizadas, sin pasar fila por fila por Python)
+y sólo se leen las columnas y los meses que la consulta necesita.
+
+Uso:
+    python reports.py productos --desde 2024-05-01 --hasta 2024-05-31
+    python reports.py productos --producto 1059
+    python reports.py clientes --cliente "ana"
+    python reports.py meses --desde 2023-01-01
+"""
+import sys
+import argparse
+import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from ledger import client_key
+from sales_archive import SALES_ARCHIVE_DIR, SCHEMA, list_files, latest_versions, drop_superseded
+
+_PARTITION_SCHEMA = pa.schema([("month", pa.string())])
+_PARTITIONING = ds.partitioning(_PARTITION_SCHEMA, flavor="hive")
+_DATASET_SCHEMA = pa.unify_schemas([SCHEMA, _PARTITION_SCHEMA])
+
+# Columnas de salida de las agregaciones
+TOTAL_COLUMNS = ["quantity", "invoices", "total_cordobas", "total_dollars",
+                 "avg_price_cordobas", "avg_price_dollars"]
+
+
+def _to_date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def _filter(start, end, product_id, client):
+    """Expresión de filtro de Arrow; el filtro por mes descarta particiones enteras."""
+    start, end = _to_date(start), _to_date(end)
+    condition = None
+
+    def add(expr):
+        nonlocal condition
+        condition = expr if condition is None else condition & expr
+
+    if start:
+        add(ds.field("month") >= start.strftime("%Y-%m"))
+        add(ds.field("date") >= pa.scalar(start, pa.date32()))
+    if end:
+        add(ds.field("month") <= end.strftime("%Y-%m"))
+        add(ds.field("date") <= pa.scalar(end, pa.date32()))
+    if product_id is not None:
+        ids = [str(p) for p in product_id] if isinstance(product_id, (list, tuple, set)) else [str(product_id)]
+        add(ds.field("product_id").isin(ids))
+    if client:
+        key = client_key(client)
+        add((ds.field("client_key") >= key) & (ds.field("client_key") < key + "￿"))
+    return condition
+
+
+def load_table(start=None, end=None, product_id=None, client=None, columns=None, root=None):
+    """
+    Líneas de venta (tabla Arrow) entre `start` y `end` inclusive, sólo con la versión
+    vigente de cada factura. `product_id` acepta un id o una lista; `client` filtra por
+    prefijo del nombre (sin tildes ni mayúsculas). `columns` limita lo que se lee.
+    """
+    root = root or SALES_ARCHIVE_DIR
+    compacted, loose = list_files(root)
+    columns = list(columns or _DATASET_SCHEMA.names)
+    if not compacted and not loose:
+        return _DATASET_SCHEMA.empty_table().select(columns)
+
+    dataset = ds.dataset(compacted + loose, format="parquet", schema=_DATASET_SCHEMA,
+                         partitioning=_PARTITIONING, partition_base_dir=root)
+    read_columns = list(dict.fromkeys(columns + ["number", "recorded_at"]))
+    table = dataset.to_table(columns=read_columns, filter=_filter(start, end, product_id, client))
+
+    # Los compactados no repiten facturas: sólo hay que desempatar las que tienen
+    # una versión en archivos sueltos (facturas recientes o regeneradas).
+    if loose:
+        numbers = pa.concat_tables([pq.read_table(f, columns=["number"]) for f in loose])["number"].unique()
+        versions = dataset.to_table(columns=["number", "recorded_at"], filter=ds.field("number").isin(numbers))
+        table = drop_superseded(table, latest_versions(versions))
+    return table.select(columns)
+
+
+def load_sales(start=None, end=None, product_id=None, client=None, root=None):
+    """Como load_table, pero como DataFrame de pandas (para análisis ad hoc)."""
+    return load_table(start, end, product_id, client, root=root).to_pandas()
+
+
+def _aggregate(table, key, label=None):
+    aggregations = [
+        ("quantity", "sum"),
+        ("number", "count_distinct"),
+        ("total_cordobas", "sum"),
+        ("total_dollars", "sum"),
+    ]
+    if label:
+        aggregations.append((label, "max"))
+    grouped = table.group_by(key).aggregate(aggregations)
+    # Precio promedio ponderado por cantidad (lo que efectivamente se cobró por unidad)
+    quantity = pc.cast(grouped["quantity_sum"], pa.float64())
+    result = pa.table({
+        key: grouped[key],
+        **({label: grouped[f"{label}_max"]} if label else {}),
+        "quantity": grouped["quantity_sum"],
+        "invoices": grouped["number_count_distinct"],
+        "total_cordobas": grouped["total_cordobas_sum"],
+        "total_dollars": grouped["total_dollars_sum"],
+        "avg_price_cordobas": pc.divide(grouped["total_cordobas_sum"], quantity),
+        "avg_price_dollars": pc.divide(grouped["total_dollars_sum"], quantity),
+    })
+    return result.to_pandas().set_index(key)
+
+
+_AGG_COLUMNS = ["number", "quantity", "total_cordobas", "total_dollars"]
+
+
+def sales_by_product(start=None, end=None, product_id=None, client=None, root=None):
+    """Cantidad, facturas, totales y precio promedio por producto (de más a menos vendido)."""
+    table = load_table(start, end, product_id, client, _AGG_COLUMNS + ["product_id", "description"], root)
+    return _aggregate(table, "product_id", "description").sort_values("quantity", ascending=False)
+
+
+def sales_by_client(start=None, end=None, product_id=None, client=None, root=None):
+    """Compras por cliente (agrupado por nombre normalizado), de mayor a menor total."""
+    table = load_table(start, end, product_id, client, _AGG_COLUMNS + ["client_key", "client_name"], root)
+    return _aggregate(table, "client_key", "client_name").sort_values("total_cordobas", ascending=False)
+
+
+def sales_by_month(start=None, end=None, product_id=None, client=None, root=None):
+    """Totales por mes calendario (AAAA-MM)."""
+    table = load_table(start, end, product_id, client, _AGG_COLUMNS + ["month"], root)
+    return _aggregate(table, "month").sort_index()
+
+
+def product_summary(product_id, start=None, end=None, root=None):
+    """Resumen de un producto en el rango: cantidad, facturas y precio promedio en C$ y USD."""
+    report = sales_by_product(start, end, product_id=product_id, root=root)
+    if report.empty:
+        return {"product_id": str(product_id), "description": "", "quantity": 0, "invoices": 0,
+                "total_cordobas": 0.0, "total_dollars": 0.0,
+                "avg_price_cordobas": None, "avg_price_dollars": None}
+    row = report.iloc[0]
+    return {
+        "product_id": str(product_id),
+        "description": row["description"],
+        "quantity": int(row["quantity"]),
+        "invoices": int(row["invoices"]),
+        "total_cordobas": float(row["total_cordobas"]),
+        "total_dollars": float(row["total_dollars"]),
+        "avg_price_cordobas": float(row["avg_price_cordobas"]),
+        "avg_price_dollars": float(row["avg_price_dollars"]),
+    }
+
+
+REPORTS = {"productos": sales_by_product, "clientes": sales_by_client, "meses": sales_by_month}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reportes de ventas del archivo Parquet.")
+    parser.add_argument("report", choices=sorted(REPORTS))
+    parser.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (inclusive)")
+    parser.add_argument("--hasta", help="Fecha final AAAA-MM-DD (inclusive)")
+    parser.add_argument("--producto", action="append", help="Id de producto (se puede repetir)")
+    parser.add_argument("--cliente", help="Prefijo del nombre del cliente")
+    parser.add_argument("--dir", default=SALES_ARCHIVE_DIR)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    try:
+        report = REPORTS[args.report](args.desde, args.hasta, product_id=args.producto,
+                                      client=args.cliente, root=args.dir)
+    except ValueError as e:
+        parser.error(str(e))
+    if report.empty:
+        print("Sin ventas para esos filtros.")
+        return 0
+    with pd.option_context("display.width", 160, "display.max_columns", 20, "display.float_format", "{:,.2f}".format):
+        print(report.head(args.limit).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Llamadas resistentes a un servicio externo lento o inestable (la API de Gemini).
+
+    caller = ResilientCaller("gemini", deadline=20, attempt_timeout=10, is_transient=...)
+    value = caller.call(lambda timeout: hacer_solicitud(timeout=timeout))
+
+Cada llamada tiene un plazo total (`deadline`) y cada intento el suyo
+(`attempt_timeout`, que se pasa a `fn` para que lo aplique el cliente HTTP). Los
+errores transitorios (según `is_transient`) se reintentan hasta `max_attempts` veces
+con espera exponencial y jitter completo; los demás se propagan enseguida.
+
+Con `hedge=True`, si un intento tarda más que el percentil `hedge_percentile` de las
+latencias recientes, se lanza un segundo intento igual y gana el primero que
+responda (el otro sigue hasta su propio timeout, pero ya nadie lo espera).
+
+El circuito (CircuitBreaker) se abre tras `failure_threshold` fallos transitorios
+seguidos: mientras está abierto las llamadas fallan al instante con CircuitOpenError,
+para que quien llama use su alternativa sin IA. Pasado `reset_timeout` deja pasar
+una sola llamada de prueba (semiabierto): si responde se cierra, si no vuelve a abrirse.
+
+Métricas (prefijo = nombre del caller): contadores "<n>.attempts", "<n>.retries"
+(por motivo), "<n>.hedges" (por resultado), "<n>.breaker.rejected",
+"<n>.breaker.transitions" (por estado) y el indicador "<n>.breaker.state"
+(0 cerrado, 1 semiabierto, 2 abierto).
+"""
+import time
+import queue
+import random
+import threading
+from collections import deque
+import metrics
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: no se intentó la llamada."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Se agotó el plazo de la llamada o del intento."""
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0        # Fallos transitorios seguidos
+        self._opened_at = 0.0
+        self._probing = False     # Hay una llamada de prueba en curso (semiabierto)
+        self.rejected = 0
+        metrics.set_gauge(f"{name}.breaker.state", 0)
+
+    def _set_state(self, state):
+        # Con self._lock tomado
+        if state != self._state:
+            self._state = state
+            metrics.inc(f"{self.name}.breaker.transitions", state=state)
+            metrics.set_gauge(f"{self.name}.breaker.state", self._GAUGE[state])
+            if state == self.OPEN:
+                print(f"⚠️ Circuito {self.name} abierto tras {self._failures} fallos seguidos")
+            elif state == self.CLOSED:
+                print(f"✅ Circuito {self.name} cerrado de nuevo")
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """¿Se puede intentar una llamada? En semiabierto sólo una a la vez."""
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.CLOSED or (self._state == self.HALF_OPEN and not self._probing):
+                self._probing = self._state == self.HALF_OPEN
+                return True
+            self.rejected += 1
+        metrics.inc(f"{self.name}.breaker.rejected")
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._set_state(self.OPEN)
+
+    def release(self):
+        """Fin de una llamada permitida (si no registró éxito ni fallo, libera la prueba)."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures, "rejected": self.rejected}
+
+
+class LatencyWindow:
+    """Latencias de las últimas `size` respuestas exitosas, para calcular percentiles."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        """Percentil `p` en segundos, o None si todavía hay pocas muestras."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class ResilientCaller:
+    def __init__(self, name, deadline=20.0, attempt_timeout=10.0, max_attempts=3,
+                 backoff_base=0.5, backoff_cap=4.0, hedge=False, hedge_percentile=95,
+                 is_transient=lambda e: isinstance(e, (TimeoutError, ConnectionError)),
+                 breaker=None):
+        self.name = name
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.is_transient = is_transient
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def call(self, fn):
+        """
+        Ejecuta fn(timeout) con reintentos, hedging y circuito. Retorna su valor o lanza
+        CircuitOpenError, DeadlineExceededError o el último error de fn.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Servicio {self.name} no disponible (circuito abierto)")
+        self._count("calls")
+        end = time.monotonic() + self.deadline
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    value = self._attempt(fn, end)
+                except Exception as e:
+                    if not self.is_transient(e):
+                        raise
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+                    if attempt == self.max_attempts or time.monotonic() + delay >= end:
+                        self.breaker.record_failure()
+                        raise
+                    self._count("retries")
+                    metrics.inc(f"{self.name}.retries", reason=type(e).__name__)
+                    time.sleep(delay)
+                else:
+                    self.breaker.record_success()
+                    return value
+        finally:
+            # Libera la llamada de prueba si terminó sin decir nada de la salud del servicio
+            self.breaker.release()
+
+    def _attempt(self, fn, end):
+        """Un intento (más su eventual réplica) antes de `end`; retorna el primer éxito."""
+        results = queue.Queue()
+        timeout = min(self.attempt_timeout, end - time.monotonic())
+        if timeout <= 0:
+            raise DeadlineExceededError(f"Plazo agotado para {self.name}")
+        attempt_end = time.monotonic() + timeout
+
+        def run(index, timeout):
+            start = time.perf_counter()
+            try:
+                results.put((index, True, fn(timeout), time.perf_counter() - start))
+            except Exception as e:
+                results.put((index, False, e, time.perf_counter() - start))
+
+        def launch(index):
+            self._count("attempts")
+            metrics.inc(f"{self.name}.attempts")
+            # Hilo propio: si se vence el plazo, el intento se abandona sin bloquear a quien llama
+            threading.Thread(target=run, args=(index, attempt_end - time.monotonic()),
+                             name=f"{self.name}-attempt", daemon=True).start()
+
+        hedge_at = None
+        if self.hedge and self.breaker.state == CircuitBreaker.CLOSED:
+            p = self.latency.percentile(self.hedge_percentile)
+            if p is not None:
+                hedge_at = time.monotonic() + p
+        launch(0)
+        in_flight, hedged, error = 1, False, None
+        while in_flight:
+            now = time.monotonic()
+            wake = attempt_end if hedge_at is None or hedged else min(attempt_end, hedge_at)
+            try:
+                index, ok, value, seconds = results.get(timeout=max(0.0, wake - now))
+            except queue.Empty:
+                if time.monotonic() >= attempt_end:
+                    raise DeadlineExceededError(f"{self.name} no respondió en {timeout:.1f} s")
+                hedged = True
+                in_flight += 1
+                self._count("hedges")
+                launch(1)
+                continue
+            in_flight -= 1
+            if ok:
+                self.latency.add(seconds)
+                if hedged:
+                    if index == 1:
+                        self._count("hedge_wins")
+                    metrics.inc(f"{self.name}.hedges", winner="hedge" if index == 1 else "original")
+                return value
+            error = value
+            if not hedged:
+                break  # Falló antes de la réplica: lo decide el ciclo de reintentos
+        raise error
+
+    def stats(self):
+        """Estado del circuito, contadores y percentil de latencia actual (para monitoreo)."""
+        p = self.latency.percentile(self.hedge_percentile)
+        with self._lock:
+            counts = dict(self._counts)
+        return {**self.breaker.stats(), **counts,
+                f"p{self.hedge_percentile}_ms": round(p * 1000, 1) if p is not None else None}
@@ -0,0 +1,236 @@
+"""
+Archivo de ventas en Parquet: una fila por línea de producto de cada factura emitida.
+
+Estructura (particionado por mes, formato Hive):
+    ventas/month=2024-05/A001197.parquet          <- una factura recién emitida
+    ventas/month=2024-05/compacted-<ts>.parquet   <- facturas ya compactadas
+
+Escribir es idempotente por número de factura: volver a generar una factura escribe
+sus filas de nuevo y al leer sólo cuenta la versión más reciente (recorded_at).
+`compact()` junta los archivos sueltos en un archivo por mes y borra las versiones
+reemplazadas, así los compactados nunca repiten una factura y las consultas sólo
+tienen que desempatar las facturas de los archivos sueltos.
+
+Uso:
+    python sales_archive.py backfill     # carga las facturas ya registradas en el ledger
+    python sales_archive.py compact
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+import datetime
+import tempfile
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from ledger import client_key
+
+SALES_ARCHIVE_DIR = os.getenv("SALES_ARCHIVE_DIR", "ventas")
+COMPACTED_PREFIX = "compacted-"
+
+SCHEMA = pa.schema([
+    ("number", pa.string()),
+    ("date", pa.date32()),
+    ("client_name", pa.string()),
+    ("client_key", pa.string()),
+    ("line", pa.int32()),
+    ("product_id", pa.string()),
+    ("description", pa.string()),
+    ("quantity", pa.int32()),
+    ("price_cordobas", pa.float64()),
+    ("price_dollars", pa.float64()),
+    ("total_cordobas", pa.float64()),
+    ("total_dollars", pa.float64()),
+    ("recorded_at", pa.timestamp("us")),
+])
+
+_UNSAFE_RE = re.compile(r"[^0-9A-Za-z_.-]")
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        raise ValueError(f"Fecha de factura inválida: {value!r} (se espera AAAA-MM-DD)")
+
+
+def invoice_table(invoice_data, recorded_at=None):
+    """Filas de las líneas de la factura como tabla Arrow (esquema SCHEMA)."""
+    number = str(invoice_data["number"]).strip()
+    date = _parse_date(invoice_data.get("date"))
+    client_name = (invoice_data.get("client") or {}).get("fullName", "")
+    recorded_at = recorded_at or datetime.datetime.now()
+
+    columns = {name: [] for name in SCHEMA.names}
+    for line, item in enumerate(invoice_data.get("items", []), start=1):
+        quantity = int(item["quantity"])
+        price_c = float(item["priceCordobas"])
+        price_d = float(item["priceDollars"])
+        columns["line"].append(line)
+        columns["product_id"].append(str(item["product"].get("id", "")))
+        columns["description"].append(item["product"].get("description", ""))
+        columns["quantity"].append(quantity)
+        columns["price_cordobas"].append(price_c)
+        columns["price_dollars"].append(price_d)
+        columns["total_cordobas"].append(price_c * quantity)
+        columns["total_dollars"].append(price_d * quantity)
+    rows = len(columns["line"])
+    columns.update(
+        number=[number] * rows,
+        date=[date] * rows,
+        client_name=[client_name] * rows,
+        client_key=[client_key(client_name)] * rows,
+        recorded_at=[recorded_at] * rows,
+    )
+    return pa.table(columns, schema=SCHEMA)
+
+
+def _month_dir(root, month):
+    return os.path.join(root, f"month={month}")
+
+
+def _month_of(path):
+    return os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+
+
+def list_files(root=None):
+    """(compactados, sueltos): rutas de los archivos Parquet del archivo de ventas."""
+    files = sorted(glob.glob(os.path.join(root or SALES_ARCHIVE_DIR, "month=*", "*.parquet")))
+    compacted = [f for f in files if os.path.basename(f).startswith(COMPACTED_PREFIX)]
+    loose = [f for f in files if not os.path.basename(f).startswith(COMPACTED_PREFIX)]
+    return compacted, loose
+
+
+def _write_atomic(table, path):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def archive_invoice(invoice_data, root=None):
+    """
+    Agrega (o reemplaza) las líneas de la factura en el archivo de ventas.
+    Retorna la ruta escrita. Lanza ValueError si la fecha no es válida.
+    """
+    root = root or SALES_ARCHIVE_DIR
+    table = invoice_table(invoice_data)
+    if table.num_rows == 0:
+        return None
+    month = table["date"][0].as_py().strftime("%Y-%m")
+    filename = _UNSAFE_RE.sub("_", table["number"][0].as_py()) + ".parquet"
+    path = os.path.join(_month_dir(root, month), filename)
+    _write_atomic(table, path)
+    return path
+
+
+def record_sale(invoice_data, root=None):
+    """Como archive_invoice, pero nunca lanza: una falla del archivo no debe impedir entregar la factura."""
+    try:
+        return archive_invoice(invoice_data, root)
+    except (OSError, ValueError, KeyError, TypeError, pa.ArrowException) as e:
+        print(f"⚠️ No se pudo archivar la venta de la factura {invoice_data.get('number')}: {e}")
+        return None
+
+
+def latest_versions(table):
+    """Tabla (number, latest_at) con la fecha de registro más reciente de cada factura."""
+    latest = table.select(["number", "recorded_at"]).group_by("number").aggregate([("recorded_at", "max")])
+    return latest.rename_columns(["number", "latest_at"])
+
+
+def drop_superseded(table, latest):
+    """
+    Quita de `table` las filas de versiones reemplazadas según `latest` (ver
+    latest_versions). Sólo las facturas presentes en `latest` pasan por el join,
+    así el costo depende de cuántas hay en archivos sueltos y no del archivo entero.
+    """
+    if table.num_rows == 0 or latest.num_rows == 0:
+        return table
+    columns = table.column_names
+    mask = pc.is_in(table["number"], value_set=latest["number"])
+    untouched = table.filter(pc.invert(mask))
+    candidates = table.filter(mask).join(latest, "number")
+    current = candidates.filter(pc.greater_equal(candidates["recorded_at"], candidates["latest_at"]))
+    return pa.concat_tables([untouched, current.select(columns)])
+
+
+def compact(root=None):
+    """
+    Junta los archivos sueltos en un archivo compactado por mes, sin versiones viejas.
+    También reescribe los meses ya compactados que tengan una versión vieja de una
+    factura suelta (regenerada con otra fecha). Sólo borra los archivos que leyó: una
+    factura escrita durante la compactación queda suelta para la próxima.
+    Retorna los meses reescritos.
+    """
+    root = root or SALES_ARCHIVE_DIR
+    compacted, loose = list_files(root)
+    if not loose:
+        return []
+    latest = latest_versions(pa.concat_tables([pq.read_table(f, schema=SCHEMA) for f in loose]))
+
+    months = {_month_of(f) for f in loose}
+    for path in compacted:
+        if _month_of(path) not in months:
+            numbers = pq.read_table(path, columns=["number"])["number"]
+            if pc.any(pc.is_in(numbers, value_set=latest["number"])).as_py():
+                months.add(_month_of(path))
+
+    for month in sorted(months):
+        files = [f for f in compacted + loose if _month_of(f) == month]
+        table = pa.concat_tables([pq.read_table(f, schema=SCHEMA) for f in files])
+        table = drop_superseded(table, latest)
+        if table.num_rows:
+            table = table.sort_by([("date", "ascending"), ("number", "ascending"), ("line", "ascending")])
+            _write_atomic(table, os.path.join(_month_dir(root, month), f"{COMPACTED_PREFIX}{time.time_ns()}.parquet"))
+        for f in files:
+            os.remove(f)
+    return sorted(months)
+
+
+def backfill(root=None):
+    """Archiva todas las facturas guardadas en el ledger. Retorna (archivadas, con error)."""
+    from ledger import get_ledger
+
+    ok = failed = 0
+    for invoice_data in get_ledger().iter_invoices():
+        try:
+            archive_invoice(invoice_data, root)
+            ok += 1
+        except (ValueError, KeyError, TypeError) as e:
+            failed += 1
+            print(f"❌ Factura {invoice_data.get('number')}: {e}", file=sys.stderr)
+    return ok, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del archivo de ventas en Parquet.")
+    parser.add_argument("command", choices=["backfill", "compact"])
+    parser.add_argument("--dir", default=SALES_ARCHIVE_DIR, help=f"Carpeta del archivo (default: {SALES_ARCHIVE_DIR})")
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        ok, failed = backfill(args.dir)
+        print(f"✅ Archivadas: {ok}   ❌ Con error: {failed}")
+        return 1 if failed else 0
+    months = compact(args.dir)
+    print(f"✅ Meses compactados: {', '.join(months) or 'ninguno'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
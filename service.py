@@ -0,0 +1,530 @@
+"""
+Servicio HTTP sin interfaz para que otros sistemas (bot de pedidos, hoja contable)
+generen facturas sin pasar por la app de Streamlit.
+
+Endpoints:
+    POST /invoices          invoice_data en JSON -> PDF (application/pdf)
+    POST /client-info       {"text": "..."} -> datos del cliente en JSON
+    POST /jobs              {"invoices": [...]} -> 202 {"job_id": ...} (lotes grandes)
+    GET  /jobs/<id>         estado del lote
+    GET  /jobs/<id>/<n>     PDF de la factura n del lote (desde 0)
+    GET  /healthz           estado del pool
+    GET  /metrics           métricas Prometheus de este proceso
+
+Las facturas usan el mismo formato que batch_cli en JSONL (ver invoice_io.normalize_invoice);
+las fotos van en base64 en "custom_image_b64". Si falta "number" se asigna el siguiente
+consecutivo del registro, y toda factura generada queda registrada como en main.py.
+Un "number" explícito que ya está registrado se rechaza con 409 (no se reemite).
+
+Los renders corren en un pool de procesos acotado. Cuando el pool y su cola están
+llenos se responde 429 con Retry-After en lugar de acumular solicitudes.
+
+Uso:
+    python service.py --port 8080 -w 4 --queue 16
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import datetime
+import threading
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import metrics
+from invoice_io import normalize_invoice, build_invoice_filename
+from ledger import get_ledger, InvoiceNumberTaken
+from sales_archive import record_sale
+
+DEFAULT_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+DEFAULT_QUEUE_SIZE = 16        # Renders en espera además de los que están corriendo
+AI_CONCURRENCY = 8             # Extracciones simultáneas (limitadas por la cuota de Gemini)
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_JOB_INVOICES = 1000
+MAX_ACTIVE_JOBS = 8
+JOB_TTL_SECONDS = 3600         # Los resultados de un lote terminado se guardan 1 hora
+RETRY_AFTER_SECONDS = 1
+
+DEFAULT_LOGO = "logo.jpeg"
+
+# Logo cargado una sola vez por proceso de trabajo (ver _init_worker)
+_worker_logo = None
+
+
+def _init_worker(logo_bytes):
+    global _worker_logo
+    _worker_logo = logo_bytes
+
+
+def _render_in_worker(invoice_data):
+    """Corre en el proceso de trabajo; usa la caché de renders (en disco si RENDER_CACHE_DIR)."""
+    from render_cache import render_pdf_cached
+
+    return render_pdf_cached(invoice_data, logo_bytes=_worker_logo)
+
+
+class RenderPool:
+    """
+    Pool de procesos con admisión acotada: a lo sumo `workers + queue_size` renders
+    entre corriendo y en espera. Antes de submit hay que reservar lugar con
+    try_reserve (sin esperar) o reserve (esperando).
+
+    Si un proceso de trabajo muere (p. ej. lo mata el sistema por falta de memoria)
+    el ProcessPoolExecutor queda roto para siempre: submit lo reemplaza por uno nuevo.
+    Los renders que estaban en el pool roto fallan con BrokenProcessPool.
+    """
+
+    def __init__(self, workers, queue_size, logo_bytes=None):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._logo_bytes = logo_bytes
+        self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self._logo_bytes,))
+
+    def _restart(self, broken):
+        """Reemplaza el executor roto (una sola vez aunque varios hilos lo detecten)."""
+        with self._lock:
+            if self._executor is broken:
+                print("⚠️ Un proceso de render murió; se reinicia el pool", file=sys.stderr)
+                metrics.inc("service.pool_restarts")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+            return self._executor
+
+    def try_reserve(self):
+        return self._slots.acquire(blocking=False)
+
+    def reserve(self):
+        self._slots.acquire()
+
+    def unreserve(self):
+        """Devuelve un lugar reservado que al final no se usó."""
+        self._slots.release()
+
+    def submit(self, invoice_data):
+        """Envía al pool una factura con lugar reservado. Si falla, el lugar se devuelve."""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            executor = self._executor
+            try:
+                future = executor.submit(_render_in_worker, invoice_data)
+            except BrokenProcessPool:
+                future = self._restart(executor).submit(_render_in_worker, invoice_data)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def prepare_invoice(raw):
+    """
+    Valida el registro y retorna (invoice_data, necesita_número). Si falta "number"
+    queda vacío: se asigna con assign_number sólo cuando la factura ya tiene lugar en
+    el pool, para no gastar consecutivos en solicitudes rechazadas.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Se esperaba un objeto JSON con la factura")
+    raw = dict(raw)
+    needs_number = not str(raw.get("number") or "").strip()
+    if needs_number:
+        raw["number"] = "-"  # normalize_invoice exige un número
+    if not raw.get("date"):
+        raw["date"] = str(datetime.date.today())
+    invoice_data = normalize_invoice(raw)
+    if needs_number:
+        invoice_data["number"] = ""
+    return invoice_data, needs_number
+
+
+def assign_number(invoice_data):
+    invoice_data["number"] = get_ledger().allocate_number()
+    return invoice_data
+
+
+def check_number_free(invoice_data):
+    """
+    Un número explícito que ya está registrado no se vuelve a emitir: se rechaza antes
+    de renderizar (record_invoice lo vuelve a comprobar al registrar, por si hay carreras).
+    """
+    if get_ledger().is_issued(invoice_data["number"]):
+        raise InvoiceNumberTaken(f"La factura {invoice_data['number']} ya fue emitida")
+
+
+# ==========================================
+# LOTES ASÍNCRONOS
+# ==========================================
+
+class Job:
+    def __init__(self, total):
+        self.id = uuid.uuid4().hex
+        self.created = time.time()
+        self.finished = None
+        self.results = [None] * total   # bytes del PDF o {"error": ...}
+        self.numbers = [None] * total
+        self.filenames = [None] * total
+        self.done = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    @property
+    def status(self):
+        return "done" if self.finished else "running"
+
+    def summary(self):
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "total": len(self.results),
+                "done": self.done,
+                "failed": self.failed,
+                "invoices": [
+                    {"index": i, "number": n,
+                     "status": "pending" if r is None else ("error" if isinstance(r, dict) else "done"),
+                     **(r if isinstance(r, dict) else {})}
+                    for i, (n, r) in enumerate(zip(self.numbers, self.results))
+                ],
+            }
+
+
+class JobManager:
+    def __init__(self, pool):
+        self.pool = pool
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Los lotes ocupan como máximo la mitad de los procesos: las solicitudes
+        # interactivas (POST /invoices) siguen teniendo lugar.
+        self._job_slots = threading.BoundedSemaphore(max(1, pool.workers // 2))
+        # El registro (SQLite y Parquet) de cada factura terminada corre aquí y no en el
+        # callback del future: ese corre en el hilo que reparte los resultados del pool
+        # de procesos, y una escritura lenta demoraría la entrega de todos los demás.
+        self._recorder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-record")
+
+    def _purge(self):
+        limit = time.time() - JOB_TTL_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < limit]:
+            del self._jobs[job_id]
+
+    def create(self, raw_invoices):
+        """Crea y arranca un lote; retorna None si ya hay demasiados lotes activos."""
+        with self._lock:
+            self._purge()
+            if sum(1 for j in self._jobs.values() if not j.finished) >= MAX_ACTIVE_JOBS:
+                return None
+            job = Job(len(raw_invoices))
+            self._jobs[job.id] = job
+        threading.Thread(target=self._run, args=(job, raw_invoices), name=f"job-{job.id[:8]}", daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _finish_one(self, job, index, result):
+        with job.lock:
+            job.results[index] = result
+            job.done += 1
+            if isinstance(result, dict):
+                job.failed += 1
+            if job.done == len(job.results):
+                job.finished = time.time()
+
+    def _fail_one(self, job, index, invoice_data, error):
+        print(f"❌ Lote {job.id[:8]}, factura {invoice_data['number'] or index}: {error}", file=sys.stderr)
+        self._finish_one(job, index, {"error": f"{type(error).__name__}: {error}"})
+
+    def _run(self, job, raw_invoices):
+        for index, raw in enumerate(raw_invoices):
+            try:
+                invoice_data, needs_number = prepare_invoice(raw)
+                if not needs_number:
+                    check_number_free(invoice_data)
+            except (ValueError, TypeError, AttributeError) as e:
+                self._finish_one(job, index, {"error": str(e)})
+                continue
+            # Los lotes esperan lugar en vez de recibir 429
+            self._job_slots.acquire()
+            self.pool.reserve()
+            try:
+                if needs_number:
+                    assign_number(invoice_data)
+                job.numbers[index] = invoice_data["number"]
+                job.filenames[index] = build_invoice_filename(invoice_data)
+            except Exception as e:
+                self.pool.unreserve()
+                self._job_slots.release()
+                self._fail_one(job, index, invoice_data, e)
+                continue
+            try:
+                future = self.pool.submit(invoice_data)  # Si falla ya devolvió su lugar en el pool
+            except Exception as e:
+                self._job_slots.release()
+                self._fail_one(job, index, invoice_data, e)
+                continue
+            future.add_done_callback(lambda f, i=index, d=invoice_data: self._rendered(job, i, d, f))
+
+    def _rendered(self, job, index, invoice_data, future):
+        # Hilo interno del pool de procesos: sólo libera el lugar y delega el registro
+        self._job_slots.release()
+        self._recorder.submit(self._collect, job, index, invoice_data, future)
+
+    def _collect(self, job, index, invoice_data, future):
+        try:
+            pdf_bytes = future.result()
+            get_ledger().record_invoice(invoice_data)
+            record_sale(invoice_data)
+        except Exception as e:
+            self._fail_one(job, index, invoice_data, e)
+            return
+        self._finish_one(job, index, pdf_bytes)
+
+
+# ==========================================
+# HTTP
+# ==========================================
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "PandaStoreInvoices/1.0"
+    # Asignados por make_server
+    pool = None
+    jobs = None
+    ai_slots = None
+
+    def log_message(self, format, *args):
+        pass  # El registro va por metrics (METRICS_LOG)
+
+    # --- Respuestas ---
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8", headers)
+
+    def _pdf(self, pdf_bytes, invoice_number, filename):
+        self._send(200, pdf_bytes, "application/pdf", {
+            # Nombre ASCII de respaldo más el nombre real en UTF-8 (RFC 6266): los encabezados son latin-1
+            "Content-Disposition": "attachment; filename=\"{}\"; filename*=UTF-8''{}".format(
+                filename.encode("ascii", "replace").decode("ascii").replace('"', "_"), quote(filename)),
+            "X-Invoice-Number": quote(invoice_number),
+        })
+
+    def _busy(self, endpoint):
+        metrics.inc("service.rejected", endpoint=endpoint)
+        self._json(429, {"error": "Servicio ocupado, intente de nuevo"}, {"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    def _read_json(self):
+        header = self.headers.get("Content-Length")
+        if header is None:
+            self._json(411, {"error": "Falta el encabezado Content-Length"})
+            return None
+        try:
+            length = int(header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Un largo negativo dejaría a rfile.read esperando hasta que el cliente cierre
+            self._json(400, {"error": f"Content-Length inválido: {header!r}"})
+            return None
+        if length > MAX_BODY_BYTES:
+            self._json(413, {"error": f"Cuerpo mayor a {MAX_BODY_BYTES // (1024 * 1024)} MB"})
+            return None
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self._json(400, {"error": f"JSON inválido: {e}"})
+            return None
+
+    # --- Rutas ---
+    def do_GET(self):
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        if parts == ["healthz"]:
+            self._json(200, {"status": "ok", "workers": self.pool.workers,
+                             "in_flight": self.pool.in_flight, "capacity": self.pool.capacity})
+        elif parts == ["metrics"]:
+            self._send(200, metrics.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            self._get_job(parts[1], parts[2] if len(parts) == 3 else None)
+        else:
+            self._json(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/invoices":
+            with metrics.span("service.invoice"):
+                self._post_invoice()
+        elif path == "/client-info":
+            with metrics.span("service.client_info"):
+                self._post_client_info()
+        elif path == "/jobs":
+            self._post_job()
+        else:
+            self._json(404, {"error": "Ruta no encontrada"})
+
+    def _post_invoice(self):
+        raw = self._read_json()
+        if raw is None:
+            return
+        try:
+            invoice_data, needs_number = prepare_invoice(raw)
+        except (ValueError, TypeError, AttributeError) as e:
+            self._json(400, {"error": str(e)})
+            return
+        try:
+            if not needs_number:
+                check_number_free(invoice_data)
+        except InvoiceNumberTaken as e:
+            self._json(409, {"error": str(e)})
+            return
+        if not self.pool.try_reserve():
+            self._busy("invoices")
+            return
+        try:
+            if needs_number:
+                assign_number(invoice_data)
+        except Exception as e:
+            self.pool.unreserve()
+            print(f"❌ No se pudo asignar el número de factura: {e}", file=sys.stderr)
+            self._json(500, {"error": f"Error asignando el número: {e}"})
+            return
+        try:
+            pdf_bytes = self.pool.submit(invoice_data).result()
+            get_ledger().record_invoice(invoice_data)
+            record_sale(invoice_data)
+        except InvoiceNumberTaken as e:
+            self._json(409, {"error": str(e)})
+            return
+        except Exception as e:
+            print(f"❌ Error generando la factura {invoice_data['number']}: {e}", file=sys.stderr)
+            self._json(500, {"error": f"Error PDF: {e}"})
+            return
+        self._pdf(pdf_bytes, invoice_data["number"], build_invoice_filename(invoice_data))
+
+    def _post_client_info(self):
+        payload = self._read_json()
+        if payload is None:
+            return
+        text = payload.get("text") if isinstance(payload, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            self._json(400, {"error": "Falta 'text'"})
+            return
+        if not self.ai_slots.acquire(blocking=False):
+            self._busy("client-info")
+            return
+        try:
+            from gemini_service import parse_client_info
+
+            result = parse_client_info(text)
+        finally:
+            self.ai_slots.release()
+        self._json(502 if "error" in result else 200, result)
+
+    def _post_job(self):
+        payload = self._read_json()
+        if payload is None:
+            return
+        invoices = payload.get("invoices") if isinstance(payload, dict) else None
+        if not isinstance(invoices, list) or not invoices:
+            self._json(400, {"error": "Falta 'invoices' (lista de facturas)"})
+            return
+        if len(invoices) > MAX_JOB_INVOICES:
+            self._json(413, {"error": f"Máximo {MAX_JOB_INVOICES} facturas por lote"})
+            return
+        job = self.jobs.create(invoices)
+        if job is None:
+            self._busy("jobs")
+            return
+        self._json(202, {"job_id": job.id, "status_url": f"/jobs/{job.id}", "total": len(invoices)},
+                   {"Location": f"/jobs/{job.id}"})
+
+    def _get_job(self, job_id, index):
+        job = self.jobs.get(job_id)
+        if job is None:
+            self._json(404, {"error": "Lote no encontrado (o expirado)"})
+            return
+        if index is None:
+            self._json(200, job.summary())
+            return
+        try:
+            index = int(index.removesuffix(".pdf"))
+            result = job.results[index]
+        except (ValueError, IndexError):
+            self._json(404, {"error": "Factura no encontrada en el lote"})
+            return
+        if result is None:
+            self._json(409, {"error": "La factura todavía se está generando"}, {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        elif isinstance(result, dict):
+            self._json(422, result)
+        else:
+            self._pdf(result, job.numbers[index], job.filenames[index])
+
+
+def make_server(host, port, workers, queue_size, logo_bytes=None):
+    pool = RenderPool(workers, queue_size, logo_bytes)
+    handler = type("Handler", (ServiceHandler,), {
+        "pool": pool,
+        "jobs": JobManager(pool),
+        "ai_slots": threading.BoundedSemaphore(AI_CONCURRENCY),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, pool
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de facturas PDF y extracción de clientes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos de render (default: núcleos del CPU)")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Renders en espera antes de responder 429 (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--logo", default=DEFAULT_LOGO, help=f"Logo a incluir (default: {DEFAULT_LOGO})")
+    args = parser.parse_args(argv)
+
+    logo_bytes = None
+    if args.logo and os.path.exists(args.logo):
+        with open(args.logo, "rb") as f:
+            logo_bytes = f.read()
+    elif args.logo != DEFAULT_LOGO:
+        parser.error(f"No se encontró el logo {args.logo}")
+
+    workers = args.workers or os.cpu_count() or 1
+    server, pool = make_server(args.host, args.port, workers, args.queue, logo_bytes)
+    print(f"✅ Servicio de facturas en http://{args.host}:{args.port} ({workers} procesos, cola {args.queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())